@@ -0,0 +1,158 @@
+import os
+import asyncio
+import collections
+
+import glib
+import glink
+import serial
+from gcom import gFrame, gPrompt
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+class gAsyncCom:
+    ''' asyncio serial client of the 'r <addr>' / 'w <addr> <data>' protocol
+        any number of read/write can be awaited at the same time, at most
+        <win> commands are in flight, answers are matched to them by addr
+    '''
+    def __init__(self, vname='com1', vbaud=921600, vwin=16):
+        self.ser  = glink.link(vname)   # serial.Serial or glink.gLink
+        self.ser.port     = vname
+        self.ser.baudrate = vbaud
+        self.ser.timeout  = 0       # non-blocking read
+        self.win  = vwin
+        self.sem  = None            # asyncio.Semaphore(win), by open
+        self.pend = collections.defaultdict(collections.deque)   # addr: deque of Future in flight
+        self.rxbuf = bytearray()
+        self.frame = gFrame(self.rxbuf)
+        self.task = None            # reader task when fd can not be watched
+        self.loop = None
+
+    async def open(self):
+        try:
+            if self.ser.is_open:
+                self.ser.close()
+            self.ser.open()
+            self.ser.reset_input_buffer()
+            self.ser.reset_output_buffer()
+        except serial.SerialException:
+            logger.error('ERROR: open <{}> failed'.format(self.ser.port))
+            return False
+        self.loop = asyncio.get_running_loop()
+        self.sem  = asyncio.Semaphore(self.win)
+        self.rxbuf.clear()
+        self.frame.reset()
+        if (os.name == 'posix') and not isinstance(self.ser, glink.gLinkMem):
+            self.loop.add_reader(self.ser.fileno(), self.on_readable)
+        else:
+            # no fd to watch (windows, memory link): blocking read in a thread
+            self.ser.timeout = 0.05
+            self.task = self.loop.create_task(self.read_loop())
+        return True
+
+    async def close(self):
+        if self.loop is not None:
+            if self.task is not None:
+                self.task.cancel()
+                self.task = None
+            elif self.ser.is_open:
+                self.loop.remove_reader(self.ser.fileno())
+        self.fail_all('closed')
+        try:
+            if self.ser.is_open:
+                self.ser.close()
+        except serial.SerialException:
+            logger.error('ERROR: close <{}> failed'.format(self.ser.port))
+        return self.ser.is_open
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def on_readable(self):
+        # loop callback: fd has bytes
+        try:
+            rstr = self.ser.read(self.ser.in_waiting or 1)
+        except serial.SerialException as err:
+            logger.warning('Exception in gacom.on_readable: {}'.format(repr(err)))
+            self.loop.remove_reader(self.ser.fileno())
+            self.fail_all(repr(err))
+            return
+        self.feed(rstr)
+
+    async def read_loop(self):
+        while True:
+            rstr = await self.loop.run_in_executor(None, lambda: self.ser.read(max(1, self.ser.in_waiting)))
+            self.feed(rstr)
+
+    def feed(self, vbytes):
+        # match the answer events of the whole lines to pending commands
+        self.rxbuf += vbytes
+        for kevt in self.frame.parse():
+            if type(kevt) is gPrompt:
+                continue
+            mque = self.pend.get(kevt.addr)
+            while mque:
+                mfut = mque.popleft()
+                if not mfut.done():
+                    mfut.set_result(kevt.data)
+                    break
+
+    def fail_all(self, verr):
+        for mque in self.pend.values():
+            for mfut in mque:
+                if not mfut.done():
+                    mfut.set_exception(ConnectionError(verr))
+        self.pend.clear()
+
+    async def command(self, vcmd, addr, maxt):
+        ''' send one command and wait for the answer of addr
+        :param vcmd: command without \\r\\n
+        :param addr: integer addr in the answer
+        :param maxt: timeout in seconds
+        :return: answered data, None when timeout or error
+        '''
+        if not self.ser.is_open:
+            return None
+        async with self.sem:
+            mfut = self.loop.create_future()
+            self.pend[addr].append(mfut)
+            try:
+                self.ser.write((vcmd + '\r\n').encode())
+                return await asyncio.wait_for(mfut, maxt)
+            except (asyncio.TimeoutError, ConnectionError, serial.SerialException) as err:
+                logger.warning('gacom: <{}> failed, {}'.format(vcmd, repr(err)))
+                if mfut in self.pend.get(addr, ()):
+                    self.pend[addr].remove(mfut)
+                return None
+
+    async def read(self, addr, maxt=3):
+        # read serial device, return data or None
+        if type(addr) is str:
+            addr = glib.str2int(addr, 10)
+        assert type(addr) is int
+        return await self.command('r {:x}'.format(addr), addr, maxt)
+
+    async def write(self, addr, data, maxt=3):
+        # write serial device: addr = data, return True when read back data
+        if type(addr) is str:
+            addr = glib.str2int(addr, 10)
+        if type(data) is str:
+            data = glib.str2int(data, 10)
+        assert type(addr) is int
+        assert type(data) is int
+        return await self.command('w {:x} {:x}'.format(addr, data), addr, maxt) == data
+
+    async def read_many(self, addrs, maxt=3):
+        # list of (data, err) by order of addrs
+        mlst = await asyncio.gather(*[self.read(x, maxt) for x in addrs])
+        return [(x, None if x is not None else 'failed') for x in mlst]
+
+    async def write_many(self, pairs, maxt=3):
+        # list of (ok, err) by order of pairs
+        mlst = await asyncio.gather(*[self.write(x, y, maxt) for (x, y) in pairs])
+        return [(x, None if x else 'failed') for x in mlst]
@@ -0,0 +1,1081 @@
+import os
+import re
+import sys
+import json
+import time
+import platform
+import random
+import tempfile
+import tracemalloc
+
+import gxml
+import gcom
+import gdev
+import gacom
+import gsession
+import gsnap
+import gshadow
+import gtrans
+import gwatch
+import glink
+import gboard
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+def make_tree(vpath, vmod=64, vreg=256, vbit=8, vseed=0, vcmt=0):
+    ''' generate a synthetic register tree under vpath
+        root.xml -> include module_xml/mod_<k>.xml + instance per module
+    :param vpath: output dir
+    :param vmod: module number
+    :param vreg: reg number per module
+    :param vbit: bits number per reg (32 bit reg split into vbit fields)
+    :param vcmt: <comment> text size per bits
+    :return: root xml file path
+    '''
+    mrand = random.Random(vseed)
+    mdir = os.path.join(vpath, 'module_xml')
+    os.makedirs(mdir, exist_ok=True)
+    mwid = 32 // vbit
+    lroot = ['<archive>']
+    for km in range(vmod):
+        mname = 'mod{}'.format(km)
+        mfile = 'mod_{}.xml'.format(km)
+        lroot.append('  <include file="{}"/>'.format(mfile))
+        lroot.append('  <instance address="{:08x}" type="{}"/>'.format(0x40000000 + km * 0x10000, mname.upper()))
+        lmod = ['<archive>', '  <module name="{}">'.format(mname)]
+        for kr in range(vreg):
+            lmod.append('    <reg name="{}_reg{}">'.format(mname, kr))
+            for kb in range(vbit):
+                lsb = kb * mwid
+                msb = lsb + mwid - 1
+                mpos = '{}:{}'.format(msb, lsb) if mwid > 1 else '{}'.format(lsb)
+                mrst = '0x{:x}'.format(mrand.randrange(1 << mwid))
+                if vcmt:
+                    lmod.append('      <bits name="{}_r{}_f{}" pos="{}" rst="{}">'.format(mname, kr, kb, mpos, mrst))
+                    lmod.append('        <comment>{}</comment>'.format('x' * vcmt))
+                    lmod.append('      </bits>')
+                else:
+                    lmod.append('      <bits name="{}_r{}_f{}" pos="{}" rst="{}"/>'.format(mname, kr, kb, mpos, mrst))
+            lmod.append('    </reg>')
+            if kr % 32 == 31:
+                lmod.append('    <hole size="64"/>')
+        lmod.append('  </module>')
+        lmod.append('</archive>')
+        with open(os.path.join(mdir, mfile), 'w') as fw:
+            fw.write('\n'.join(lmod))
+    lroot.append('</archive>')
+    mroot = os.path.join(vpath, 'root.xml')
+    with open(mroot, 'w') as fw:
+        fw.write('\n'.join(lroot))
+    return mroot
+
+
+def timeit(vfunc, vnum=1):
+    # return best time of vnum runs in second
+    mbest = None
+    for k in range(vnum):
+        tim0 = time.perf_counter()
+        vfunc()
+        dtim = time.perf_counter() - tim0
+        mbest = dtim if (mbest is None) or (dtim < mbest) else mbest
+    return mbest
+
+
+def index_of(vxml):
+    # comparable indexes of a loaded gXmlParser
+    vxml.wait()
+    return (vxml.name_idx, vxml.strs_num, vxml.addr_regs, vxml.addr_refs, vxml.addr_mods, vxml.addr_ends, vxml.addr_reach)
+
+
+def bench_load(vpath):
+    # cold (xml parse + save cache) vs warm (load cache) gXmlParser.load(),
+    # then the 1st lookups after a warm load: by addr unpickles one module,
+    # by name unpickles strs and the name index
+    mroot = make_tree(vpath)
+    mxml = gxml.gXmlParser(mroot)
+
+    def cold():
+        if os.path.exists(mxml.cache_file()):
+            os.remove(mxml.cache_file())
+        mxml.load()
+
+    tcold = timeit(cold, 3)
+    (mref, midx) = (dump(mxml), index_of(mxml))
+    mfind = (mxml.filter('r1_f'), mxml.fuzzy('m3r7'))
+    twarm = timeit(mxml.load, 3)
+    maddr = mxml.addr_regs[len(mxml.addr_regs) // 2]
+    tim0 = time.perf_counter()
+    (mod_name, reg_name) = mxml.get_modreg(maddr)
+    mxml.mods[mod_name].regs[reg_name].get()
+    taddr = time.perf_counter() - tim0
+    tim0 = time.perf_counter()
+    assert mxml.get_modreg(reg_name) == (mod_name, reg_name)
+    tname = time.perf_counter() - tim0
+    assert (dump(mxml) == mref) and (index_of(mxml) == midx)
+    assert mfind == (mxml.filter('r1_f'), mxml.fuzzy('m3r7'))
+    print('load: mods = {}, strs = {}, cache = {:.1f}MB'.format(len(mxml.mods), len(mxml.strs), os.path.getsize(mxml.cache_file()) / 2**20))
+    print('load: cold = {:.3f}s, warm = {:.3f}s, x{:.1f}'.format(tcold, twarm, tcold / twarm))
+    print('load: after warm, 1st addr lookup = {:.4f}s, 1st name lookup = {:.3f}s'.format(taddr, tname))
+    return {'cold': tcold, 'warm': twarm, 'addr': taddr, 'name': tname}
+
+
+def bench_find(vpath):
+    # gXmlParser.trav_modu_lst file lookup: one walk for all includes
+    mroot = make_tree(vpath, vmod=256, vreg=1, vbit=1)
+    for k in range(200):    # unrelated files make the tree walk expensive
+        mdir = os.path.join(vpath, 'other', 'd{}'.format(k))
+        os.makedirs(mdir)
+        for j in range(20):
+            open(os.path.join(mdir, 'f{}.txt'.format(j)), 'w').close()
+    mxml = gxml.gXmlParser(mroot)
+    mxml.parse_root_xml(mroot)
+
+    def find():
+        mxml.index_file()
+        for x in mxml.mods_file:
+            mxml.find_file(x)
+
+    print('find: includes = {}, walk once = {:.3f}s'.format(len(mxml.mods_file), timeit(find, 3)))
+
+
+def dump(vxml):
+    # comparable content of a loaded gXmlParser
+    vxml.wait()
+    mlst = []
+    for kmod in vxml.mods.values():
+        for kreg in kmod.regs.values():
+            mbits = [(x['name'], x['val'], x['pos'], x['msb'], x['lsb'], x['n']) for x in kreg.get_lst()]
+            mlst.append((kmod.name, kmod.addr, kreg.name, kreg.addr, kreg.val, mbits))
+    return mlst, vxml.strs
+
+
+def bench_lazy(vpath):
+    # time to the 1st module shown: eager load vs lazy load, same result after prefetch
+    mroot = make_tree(vpath, vmod=256, vreg=256, vbit=8)
+    # an include without reg: listed by the lazy load, an empty module on access
+    with open(os.path.join(vpath, 'module_xml', 'mod_255.xml'), 'w') as fw:
+        fw.write('<archive>\n  <module name="mod255">\n  </module>\n</archive>\n')
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    mxml.jobs = 0
+    tim0 = time.perf_counter()
+    mxml.load()
+    mname = mxml.get_lst()[0][0]
+    len(mxml.mods[mname].regs)
+    teager = time.perf_counter() - tim0
+    mref = dump(mxml)
+    assert 'mod255' not in mxml.mods
+    mxml.lazy = True
+    mdone = []
+    mxml.notify = lambda: mdone.append(mxml.prefetch)
+    tim0 = time.perf_counter()
+    mxml.load()
+    tlst = time.perf_counter() - tim0
+    assert ('mod255' in [x[0] for x in mxml.get_lst()]) and (mxml.mods['mod255'].regs == {})
+    mname = mxml.get_lst()[0][0]
+    len(mxml.mods[mname].regs)
+    tfirst = time.perf_counter() - tim0
+    maddr = mxml.mods[mname].get_lst()[-1][1]
+    assert mxml.get_modreg(maddr) == (mname, mxml.mods[mname].get_lst()[-1][0])
+    mxml.wait()
+    tall = time.perf_counter() - tim0
+    assert dump(mxml) == mref
+    assert mxml.find_reg(maddr) == mxml.get_modreg(maddr)
+    assert (mdone == [None]) and (mxml.get_mod('mod255').addr == mxml.mods_name['mod255'])
+    print('lazy: mods = {}, eager 1st module = {:.3f}s'.format(len(mxml.mods), teager))
+    print('lazy: list = {:.3f}s, 1st module = {:.3f}s (x{:.1f}), prefetch done = {:.3f}s'.format(
+        tlst, tfirst, teager / tfirst, tall))
+    return {'eager': teager, 'list': tlst, 'first': tfirst, 'prefetch': tall}
+
+
+def bench_reload(vpath):
+    # reparse the changed module xml only vs full load, same result as a fresh load
+    mroot = make_tree(vpath, vmod=256, vreg=256, vbit=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    tfull = timeit(mxml.load)
+    mfile = os.path.join(vpath, 'module_xml', 'mod_{}.xml')
+    mout = {'full': tfull}
+
+    def same():
+        mref = gxml.gXmlParser(mroot)
+        mref.cache_en = False
+        mref.load()
+        assert dump(mxml) == dump(mref)
+        assert (mxml.name_idx == mref.name_idx) and (mxml.addr_regs == mref.addr_regs) and (mxml.addr_refs == mref.addr_refs)
+        assert (mxml.addr_ends == mref.addr_ends) and (mxml.addr_reach == mref.addr_reach)
+        assert mxml.strs_num == mref.strs_num
+        # r1 then r1_f: the 2nd query narrows the result of the 1st
+        for kqry in ('_new$', 'r1', 'r1_f', 'mod0_reg7'):
+            assert mxml.filter(kqry) == mref.filter(kqry) and mxml.filter(kqry, 1000) == mref.filter(kqry, 1000)
+        for kqry in ('added', 'mod0_reg7', 'm9r5f'):
+            assert mxml.fuzzy(kqry) == mref.fuzzy(kqry)
+
+    for knum in (1, 4, 16):
+        for k in range(knum):
+            with open(mfile.format(k * 7)) as fr:
+                mtxt = fr.read()
+            # rename a reg, drop a field, add a reg at the end
+            mtxt = mtxt.replace('_reg1"', '_reg1_new"', 1).replace('_f0" pos', '_g0" pos', 1)
+            mtxt = mtxt.replace('  </module>', '    <reg name="mod{}_added{}"><bits name="mod{}_a{}" pos="31:0" rst="0x5"/></reg>\n  </module>'.format(k * 7, knum, k * 7, knum))
+            with open(mfile.format(k * 7), 'w') as fw:
+                fw.write(mtxt)
+        mwatch = gxml.gXmlWatch(mxml, vperiod=0.05).start()
+        tim0 = time.perf_counter()
+        while not mwatch.nfire:
+            time.sleep(0.01)
+        mwatch.stop()
+        tdet = time.perf_counter() - tim0
+        assert mxml.reload() == []     # done by the watch
+        same()
+        print('reload: files = {:2d}, watch fire = {:.3f}s, full load = {:.3f}s'.format(knum, tdet, tfull))
+        mout[knum] = {'watch': tdet}
+    # a deleted then added again file goes back to its place
+    mtxt = open(mfile.format(3)).read()
+    os.remove(mfile.format(3))
+    assert mxml.reload() == ['mod3']
+    with open(mfile.format(3), 'w') as fw:
+        fw.write(mtxt)
+    mxml.prints[mfile.format(3)] = (0, 0, '')
+    assert mxml.reload() == ['mod3']
+    same()
+    # time of reload() itself + the 1st search after it, by changed files:
+    # the 1st search indexes the changed modules only
+    for knum in (1, 4, 16):
+        for k in range(knum):
+            mxml.prints[mfile.format(k * 7)] = (0, 0, '')    # taken as changed
+        tim0 = time.perf_counter()
+        assert len(mxml.reload()) == knum
+        treload = time.perf_counter() - tim0
+        mxml.filter('reg1_')
+        tfind = time.perf_counter() - tim0
+        print('reload: files = {:2d}, same names, reload = {:.3f}s, + 1st search = {:.3f}s, x{:.1f}'.format(
+            knum, treload, tfind, tfull / tfind))
+        mout[knum]['reload'] = treload
+        mout[knum]['search'] = tfind
+    # a field named as a reg of another module ranks as a reg, until that reg is renamed
+    with open(mfile.format(9)) as fr:
+        mtxt = fr.read().replace('"mod9_r5_f1"', '"mod0_reg7"', 1)
+    with open(mfile.format(9), 'w') as fw:
+        fw.write(mtxt)
+    assert mxml.reload() == ['mod9']
+    same()
+    with open(mfile.format(0)) as fr:
+        mtxt = fr.read().replace('_reg2"', '_reg2_new"', 1).replace('_reg7"', '_reg7_new"', 1)
+    with open(mfile.format(0), 'w') as fw:
+        fw.write(mtxt)
+    tim0 = time.perf_counter()
+    mxml.reload()
+    treload = time.perf_counter() - tim0
+    mxml.filter('reg1_')
+    tfind = time.perf_counter() - tim0
+    same()
+    print('reload: files =  1, new names,  reload = {:.3f}s, + 1st search = {:.3f}s'.format(treload, tfind))
+    mout['rename'] = {'reload': treload, 'search': tfind}
+    return mout
+
+
+def bench_decode(vpath):
+    # field decode of a long trace and of a whole chip dump: numpy vs per value loop
+    import numpy as np
+    mroot = make_tree(vpath, vmod=64, vreg=256, vbit=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.load()
+    mmod = mxml.mods['mod0']
+    mreg = mmod.regs['mod0_reg0']
+    mlay = mreg.layout
+    mrand = np.random.default_rng(0)
+    mvals = mrand.integers(0, 1 << 32, 1 << 20, dtype=np.uint64).astype(np.uint32)
+    mbit = [(mreg.names[k], mlay.mask[k], mlay.lsb[k]) for k in range(len(mlay))]
+    mnum = 1 << 16
+    tloop = timeit(lambda: [{n: (y & m) >> l for n, m, l in mbit} for y in mvals[:mnum].tolist()]) * len(mvals) / mnum
+    mfld = {}
+    tvec = timeit(lambda: mfld.update(mreg.decode(mvals)), 3)
+    mlst = mvals[:1000].tolist()
+    for k, x in enumerate(mlst):
+        mreg.set(x)
+        assert all(y['val'] == mfld[y['name']][k] for y in mreg.get_lst())
+    tenc = timeit(lambda: mreg.encode(mfld), 3)
+    assert (mreg.encode(mfld) == mvals).all()
+    print('decode: trace of {} values x {} fields, loop = {:.3f}s (est), numpy = {:.3f}s, x{:.0f}, encode = {:.3f}s'.format(
+        len(mvals), len(mlay), tloop, tvec, tloop / tvec, tenc))
+    # whole chip dump, 100 samples: one decode per module vs one per reg,
+    # field names are unique per reg as in real trees
+    mdump = {x: mrand.integers(0, 1 << 32, (100, len(y.regs)), dtype=np.uint64).astype(np.uint32) for x, y in mxml.mods.items()}
+    mres = {}
+    tchip = timeit(lambda: mres.update({x: mxml.mods[x].decode(y) for x, y in mdump.items()}), 3)
+
+    def per_reg():
+        for (x, y) in mdump.items():
+            mregs = [mxml.mods[x].regs[z[0]] for z in mxml.mods[x].get_lst()]
+            {z.name: z.decode(y[:, k]) for k, z in enumerate(mregs)}
+
+    treg = timeit(per_reg, 3)
+    mback = mmod.encode(mres['mod0'])
+    assert all((mback[x[0]] == mdump['mod0'][:, k]).all() for k, x in enumerate(mmod.get_lst()))
+    mnum = sum(x.size for x in mdump.values())
+    print('decode: chip dump of {} regs x 100 samples ({} values), numpy = {:.3f}s, per reg = {:.3f}s, x{:.1f}'.format(
+        mnum // 100, mnum, tchip, treg, treg / tchip))
+    return {'trace': {'values': len(mvals), 'loop': tloop, 'numpy': tvec, 'encode': tenc},
+            'chip': {'values': mnum, 'numpy': tchip, 'per_reg': treg}}
+
+
+def bench_parallel(vpath):
+    # serial vs process pool trav_modu_lst, result must be identical
+    mroot = make_tree(vpath, vmod=256, vreg=256, vbit=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    mxml.jobs = 0
+    tser = timeit(mxml.load)
+    mref = dump(mxml)
+    print('parallel: mods = {}, strs = {}, serial = {:.3f}s'.format(len(mxml.mods), len(mxml.strs), tser))
+    for kjobs in (2, 4, 8, 16):
+        if kjobs > max(2, os.cpu_count()):
+            break
+        mxml.jobs = kjobs
+        tpar = timeit(mxml.load)
+        assert dump(mxml) == mref
+        print('parallel: jobs = {:2d}, {:.3f}s, x{:.1f}'.format(kjobs, tpar, tser / tpar))
+
+
+def bench_stream(vpath):
+    # peak memory of DOM vs iterparse: the parse of one module xml alone, then
+    # a whole load() and the database it keeps; each run has a new parser and
+    # no layout left by the run before, order dom, iter, iter, dom, the best
+    # of the 2 runs is kept; result must be identical
+    mroot = make_tree(vpath, vmod=4, vreg=2048, vbit=8, vcmt=256)
+    mfile = os.path.join(vpath, 'module_xml', 'mod_0.xml')
+    mout = {'dom': {}, 'iter': {}}
+    mdump = {}
+    for kstream in (False, True, True, False):
+        mname = ['dom', 'iter'][kstream]
+        mxml = gxml.gXmlParser(mroot)
+        mxml.cache_en = False
+        mxml.stream = kstream
+        mxml.parse_root_xml(mroot)
+        mparse = mxml.parse_modu_iter if kstream else mxml.parse_modu_xml
+        assert not len(gxml.gXmlLayout.pool)
+        tracemalloc.start()
+        mmod = mparse(mfile, mxml.mods_name)
+        (mkeep, mparse_peak) = tracemalloc.get_traced_memory()
+        del mmod
+        tracemalloc.reset_peak()
+        mbase = tracemalloc.get_traced_memory()[0]
+        tim0 = time.perf_counter()
+        mxml.load()
+        dtim = time.perf_counter() - tim0
+        (mcurr, mpeak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        mres = {'parse_peak': mparse_peak, 'parse_keep': mkeep, 'load_peak': mpeak - mbase, 'database': mcurr - mbase}
+        for (x, y) in mres.items():
+            mout[mname][x] = min(mout[mname].get(x, y), y)
+        mdump[kstream] = dump(mxml)
+        del mxml
+        print('stream: {:5s}, 1 module parse peak = {:6.1f}MB (keeps {:5.1f}MB), load peak = {:6.1f}MB, database = {:6.1f}MB, {:.3f}s'.format(
+            mname, mparse_peak / 2**20, mkeep / 2**20, (mpeak - mbase) / 2**20, (mcurr - mbase) / 2**20, dtim))
+    assert mdump[False] == mdump[True]
+    print('stream: best of 2, iter/dom, parse peak = {:.2f}, load peak = {:.2f}, database = {:.2f}'.format(
+        *[mout['iter'][x] / mout['dom'][x] for x in ('parse_peak', 'load_peak', 'database')]))
+    return mout
+
+
+def legacy_reg(vlstdict_bit):
+    # dict of dicts bits of a reg as gXmlReg.init built it before gXmlLayout
+    mbits = {}
+    for vdict_bit in vlstdict_bit:
+        (msb, lsb) = [int(x) for x in vdict_bit['pos'].split(':')]
+        mbits[vdict_bit['name']] = {'name': vdict_bit['name'], 'val': int(vdict_bit['rst'], 16),
+                                    'msb': msb, 'lsb': lsb, 'n': msb - lsb + 1,
+                                    'pos': '{:2d}:{:2d}'.format(msb, lsb)}
+    return mbits
+
+
+def bench_memory(vpath):
+    # memory of 128 modules x 256 regs x 8 fields, field names unique per reg
+    # as in real trees: the whole database of a real gXmlParser.load() (regs,
+    # strs and indexes), then the regs alone, legacy dicts vs gXmlLayout
+    mout = {}
+    mroot = make_tree(vpath, vmod=128, vreg=256, vbit=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    tracemalloc.start()
+    mxml.load()
+    mcurr = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    mnum = sum(len(x.regs) for x in mxml.mods.values())
+    mout['load'] = round(mcurr / mnum)
+    print('memory: load(), regs = {}, {:7.1f}MB, {:5.0f}B/reg, shared layouts = {}'.format(
+        mnum, mcurr / 2**20, mcurr / mnum, len(gxml.gXmlLayout.pool)))
+    del mxml
+    assert not len(gxml.gXmlLayout.pool)    # layouts go with their regs
+    for klegacy in (True, False):
+        tracemalloc.start()
+        mlst = []
+        for km in range(128):
+            for kr in range(256):
+                kbits = [{'name': 'mod{}_r{}_f{}'.format(km, kr, kb), 'pos': '{}:{}'.format(kb * 4 + 3, kb * 4),
+                          'rst': '0x{:x}'.format((kr + kb) & 0xf)} for kb in range(8)]
+                if klegacy:
+                    mlst.append(('mod{}_reg{}'.format(km, kr), km * 0x10000 + kr * 4, 0, legacy_reg(kbits)))
+                else:
+                    mreg = gxml.gXmlReg('mod{}_reg{}'.format(km, kr), km * 0x10000 + kr * 4)
+                    mreg.init(kbits)
+                    mlst.append(mreg)
+        mcurr = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        mname = ['layout', 'legacy'][klegacy]
+        mout[mname] = round(mcurr / len(mlst))
+        print('memory: {:6s}, regs = {}, {:7.1f}MB, {:5.0f}B/reg'.format(mname, len(mlst), mcurr / 2**20, mcurr / len(mlst)))
+        del mlst
+    return mout
+
+
+def bench_addr(vpath):
+    # gXmlParser.get_modreg(int): linear scan before the address index vs bisect
+    mroot = make_tree(vpath, vmod=256, vreg=256, vbit=2)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    mxml.load()
+    mrand = random.Random(0)
+    maddrs = [mrand.choice(mxml.addr_regs) for k in range(200)]
+
+    def scan():
+        for vaddr in maddrs:
+            for kmod in mxml.mods.values():
+                for kreg in kmod.regs.values():
+                    if vaddr == kreg.addr:
+                        break
+                else:
+                    continue
+                break
+
+    tscan = timeit(scan) / len(maddrs)
+    tidx = timeit(lambda: [mxml.get_modreg(x) for x in maddrs], 3) / len(maddrs)
+    print('addr: regs = {}, scan = {:.1f}us, index = {:.2f}us'.format(len(mxml.addr_regs), tscan * 1e6, tidx * 1e6))
+
+
+def bench_name(vpath):
+    # gXmlParser.get_modreg(str): linear scan before the name index vs dict
+    mroot = make_tree(vpath, vmod=256, vreg=256, vbit=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    mxml.load()
+    mrand = random.Random(0)
+    mnames = [mrand.choice(mxml.strs)[0] for k in range(50)]
+
+    def scan(vstr):
+        for kmod in mxml.mods.values():
+            if vstr in kmod.regs.keys():
+                return (kmod.name, vstr)
+            for kreg in kmod.regs.values():
+                if vstr in kreg.bits.keys():
+                    return (kmod.name, kreg.name)
+        return (None, None)
+
+    assert [scan(x) for x in mnames] == [mxml.get_modreg(x) for x in mnames]
+    tscan = timeit(lambda: [scan(x) for x in mnames]) / len(mnames)
+    tidx = timeit(lambda: [mxml.get_modreg(x) for x in mnames], 3) / len(mnames)
+    print('name: names = {}, scan = {:.1f}us, index = {:.2f}us'.format(len(mxml.name_idx), tscan * 1e6, tidx * 1e6))
+
+
+def bench_filter(vpath):
+    # gXmlParser.filter: re.search over all strs vs gSearch, typing queries key by key
+    mroot = make_tree(vpath, vmod=256, vreg=256, vbit=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    mxml.load()
+    tim0 = time.perf_counter()
+    mxml.finder.build()
+    print('filter: strs = {}, index build = {:.3f}s'.format(len(mxml.strs), time.perf_counter() - tim0))
+
+    def scan(vprtn):
+        return [x for x in mxml.strs if re.search(vprtn, x[0], re.I)]
+
+    mwork = {
+        'typing': [x[:k] for x in ('mod17_r', 'MOD2_R10_F3', 'reg200') for k in range(0, len(x) + 1)],
+        'rare'  : ['mod255_r255_f7', 'r128_f', 'nothing_here'],
+        'regex' : [r'mod1\d_r5$', r'^mod3_r1.*f7$', r'f[0-3]$'],
+    }
+    for kname, kqry in mwork.items():
+        assert [scan(x) for x in kqry] == [mxml.filter(x) for x in kqry]
+        assert [scan(x)[:1000] for x in kqry] == [mxml.filter(x, 1000) for x in kqry]
+        tscan = timeit(lambda: [scan(x) for x in kqry]) / len(kqry)
+        tidx = timeit(lambda: [mxml.filter(x) for x in kqry], 3) / len(kqry)
+        tcap = timeit(lambda: [mxml.filter(x, 1000) for x in kqry], 3) / len(kqry)
+        print('filter: {:6s} scan = {:7.1f}ms, index = {:6.1f}ms, cap 1000 = {:6.1f}ms'.format(
+            kname, tscan * 1e3, tidx * 1e3, tcap * 1e3))
+
+
+def bench_fuzzy(vpath):
+    # gXmlParser.fuzzy top-k latency, typing queries key by key
+    mroot = make_tree(vpath, vmod=256, vreg=256, vbit=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.cache_en = False
+    mxml.load()
+    tim0 = time.perf_counter()
+    mxml.finder.build()
+    mxml.finder.build_fuzzy()
+    print('fuzzy: strs = {}, index build = {:.3f}s'.format(len(mxml.strs), time.perf_counter() - tim0))
+    mqry = [x[:k] for x in ('mod17_reg3', 'm17r3f2', 'r1f7', 'MOD2_R10_F3') for k in range(1, len(x) + 1)]
+    mtim = []
+    for kqry in mqry:
+        mtim.append(timeit(lambda: mxml.fuzzy(kqry, 200)))
+    assert mxml.fuzzy('mod17_reg3', 1) == [('mod17_reg3', mxml.mods['mod17'].regs['mod17_reg3'].addr)]
+    mtim.sort()
+    print('fuzzy: queries = {}, top 200, p50 = {:.1f}ms, p90 = {:.1f}ms, max = {:.1f}ms'.format(
+        len(mtim), mtim[len(mtim) // 2] * 1e3, mtim[len(mtim) * 9 // 10] * 1e3, mtim[-1] * 1e3))
+
+
+def open_dev(vlat=0.002, vbaud=921600, **kwargs):
+    # a gDev and a gCom connected to it, kwargs: faults of gDev
+    mdev = gdev.gDev(vlat, vbaud, **kwargs)
+    mdev.open()
+    mcom = gcom.gCom()
+    mcom.set(mdev.port, vbaud or 921600, 1)
+    mcom.open()
+    return mdev, mcom
+
+
+def bench_batch(vpath):
+    # gCom.read/write one by one vs read_many/write_many, 921600 baud, 2ms link latency
+    (mdev, mcom) = open_dev()
+    try:
+        maddrs = [0x40000000 + k * 4 for k in range(2000)]
+        mone = maddrs[:100]
+        tim0 = time.perf_counter()
+        for x in mone:
+            assert mcom.write(x, x & 0xffff)
+        for x in mone:
+            assert mcom.read(x) == x & 0xffff
+        tone = (time.perf_counter() - tim0) / (2 * len(mone))
+        print('batch: single, {:6.0f} op/s'.format(1 / tone))
+        # line rate: 'r xxxxxxxx\r\n' echo + answer + prompt ~ 50 bytes per read
+        print('batch: line rate limit ~{:6.0f} op/s'.format(921600 / 10 / 50))
+        for kwin in (1, 4, 16, 64):
+            tim0 = time.perf_counter()
+            mres = mcom.write_many([(x, x ^ 0x5a5a) for x in maddrs], kwin)
+            twr = time.perf_counter() - tim0
+            assert all(x[0] for x in mres)
+            tim0 = time.perf_counter()
+            mres = mcom.read_many(maddrs, kwin)
+            trd = time.perf_counter() - tim0
+            assert [x[0] for x in mres] == [x ^ 0x5a5a for x in maddrs]
+            print('batch: window {:2d}, write {:6.0f} op/s, read {:6.0f} op/s'.format(
+                kwin, len(maddrs) / twr, len(maddrs) / trd))
+    finally:
+        mcom.close()
+        mdev.close()
+
+
+def legacy_readlines(vcom, maxt=1):
+    # gCom.readlines before the rx buffer: poll in_waiting per 0.01s, return
+    # when something is read and the rx stays empty 0.01s, or maxt timeout
+    tim0 = time.time()
+    dtim = 0
+    bstr = b''
+    rnum = vcom.ser.in_waiting
+    while (rnum > 0) or (not bstr and (dtim < float(maxt))):
+        if rnum:
+            bstr += vcom.ser.read(rnum)
+        time.sleep(0.01)
+        rnum = vcom.ser.in_waiting
+        dtim = time.time() - tim0
+    return bstr.decode()
+
+
+def legacy_wait(vcom, vstr, vnum=10):
+    # gCom.wait before the rx buffer: readlines until vstr, vnum times
+    mstr = ''
+    for k in range(vnum):
+        mstr += legacy_readlines(vcom)
+        if vstr in mstr.lower():
+            return mstr.lower()
+    return None
+
+
+def legacy_read(vcom, vaddr):
+    # gCom.read before the rx buffer
+    vcom.send('r {:x}'.format(vaddr))
+    mstr = legacy_wait(vcom, '[0x{:08x}] = 0x'.format(vaddr))
+    mch_obj = re.search(r' = 0x([a-f0-9]{8})', mstr or '')
+    return None if mch_obj is None else int(mch_obj.group(1), 16)
+
+
+def legacy_write(vcom, vaddr, vdata):
+    # gCom.write before the rx buffer
+    vcom.send('w {:x} {:x}'.format(vaddr, vdata))
+    return legacy_wait(vcom, ' = 0x{:08x}'.format(vdata), 3) is not None
+
+
+def bench_rtt(vpath):
+    # round trip time of one read/write, pty device without latency:
+    # legacy readline polling (10ms sleeps) vs gCom blocking reads into rxbuf
+    (mdev, mcom) = open_dev(0, None)
+    mout = {}
+    try:
+        mops = {
+            ('legacy', 'read') : lambda x: legacy_read(mcom, x),
+            ('legacy', 'write'): lambda x: legacy_write(mcom, x, 1) or None,
+            ('gCom', 'read')   : lambda x: mcom.read(x),
+            ('gCom', 'write')  : lambda x: mcom.write(x, 1) or None,
+        }
+        for ((kpath, kop), kfunc) in mops.items():
+            mtim = []
+            for k in range(300 if kpath == 'gCom' else 100):
+                tim0 = time.perf_counter()
+                assert kfunc(0x40000000 + k * 4) is not None
+                mtim.append(time.perf_counter() - tim0)
+            mtim.sort()
+            mout.setdefault(kpath, {})[kop] = {'p50_ms': round(percentile(mtim, 50) * 1e3, 3),
+                                               'p99_ms': round(percentile(mtim, 99) * 1e3, 3)}
+            print('rtt: {:6s} {:5s} n = {}, p50 = {:6.3f}ms, p99 = {:6.3f}ms'.format(
+                kpath, kop, len(mtim), percentile(mtim, 50) * 1e3, percentile(mtim, 99) * 1e3))
+    finally:
+        mcom.close()
+        mdev.close()
+    return mout
+
+
+def bench_async(vpath):
+    # gAsyncCom: reads of several boards overlapped on one event loop, 2ms latency
+    async def board(vdev, vnum):
+        async with gacom.gAsyncCom(vdev.port, 921600) as mcom:
+            mpairs = [(0x40000000 + k * 4, k) for k in range(vnum)]
+            assert all(x[0] for x in await mcom.write_many(mpairs))
+            assert [x[0] for x in await mcom.read_many([x[0] for x in mpairs])] == [x[1] for x in mpairs]
+
+    async def run(vdevs, vnum):
+        await asyncio.gather(*[board(x, vnum) for x in vdevs])
+
+    for kdev in (1, 2, 4, 8):
+        mdevs = [gdev.gDev(0.002, 921600) for k in range(kdev)]
+        for x in mdevs:
+            x.open()
+        try:
+            tim0 = time.perf_counter()
+            asyncio.run(run(mdevs, 500))
+            dtim = time.perf_counter() - tim0
+        finally:
+            for x in mdevs:
+                x.close()
+        print('async: boards = {}, {:6.0f} op/s'.format(kdev, kdev * 1000 / dtim))
+
+
+def bench_frame(vpath):
+    # framing cost of a long noisy console stream fed in small chunks:
+    # old gCom.wait rescan (concat + lower + find on each chunk) vs gFrame.parse
+    mrand = random.Random(0)
+    mlst = []
+    for k in range(5000):
+        addr = 0x40000000 + k * 4
+        mlst.append('aic> r {:x}\r\n'.format(addr))
+        for j in range(mrand.randrange(4)):
+            mlst.append('[{:8.3f}] wifi: noise line {} rssi={}\r\n'.format(k / 1e3, j, mrand.randrange(-90, 0)))
+        mlst.append('[0x{:08x}] = 0x{:08x}\r\n'.format(addr, k))
+    mstream = ''.join(mlst).encode() + b'aic> '
+    mchunk = []
+    k = 0
+    while k < len(mstream):
+        n = mrand.randrange(1, 64)
+        mchunk.append(mstream[k:k+n])
+        k += n
+    mlast = '[0x{:08x}] = 0x'.format(0x40000000 + 4999 * 4)
+
+    def old():
+        mstr = ''
+        for x in mchunk:
+            mstr += x.decode()
+            if mlast in mstr.lower():
+                return mstr.lower()
+
+    def new():
+        mframe = gcom.gFrame()
+        mevt = []
+        for x in mchunk:
+            mframe.buf += x
+            mevt.extend(mframe.parse())
+        return mevt
+
+    mevt = new()
+    assert sum(type(x) is gcom.gReadResult for x in mevt) == 5000
+    assert type(mevt[-1]) is gcom.gPrompt
+    told = timeit(old)
+    tnew = timeit(new, 3)
+    print('frame: {} bytes, {} chunks, rescan = {:.3f}s, gFrame = {:.3f}s ({:.1f}MB/s)'.format(
+        len(mstream), len(mchunk), told, tnew, len(mstream) / tnew / 2**20))
+
+
+def bench_snap(vpath):
+    # gSnap: capture one module from a device, diff / save / load of the whole chip
+    mroot = make_tree(vpath, vmod=128)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.load()
+    (mdev, mcom) = open_dev(0, None)
+    try:
+        tim0 = time.perf_counter()
+        msnap = gsnap.gSnap.capture(mcom, mxml, 'mod3')
+        tcap = time.perf_counter() - tim0
+        assert len(msnap) == len(mxml.mods['mod3'].regs) and all(msnap.oks)
+        print('snap: capture mod3, regs = {}, {:.3f}s'.format(len(msnap), tcap))
+    finally:
+        mcom.close()
+        mdev.close()
+    mrand = random.Random(0)
+    mold = gsnap.gSnap.reset(mxml)
+    mnew = gsnap.gSnap().set((x, y ^ (mrand.getrandbits(32) if mrand.random() < 0.1 else 0)) for x, y in mold.items())
+    mnew.oks[5] = 0
+    mdiff = []
+    tdiff = timeit(lambda: mdiff.append(mnew.diff(mold, mxml)), 3)
+    tloop = timeit(lambda: mdiff.append(mnew.diff_loop(mold, mxml)), 3)
+    assert mdiff[0] == mdiff[-1]
+    # few regs changed, as after one config step
+    mfew = gsnap.gSnap().set((x, y ^ (1 if mrand.random() < 0.002 else 0)) for x, y in mold.items())
+    mdfew = []
+    tfew = timeit(lambda: mdfew.append(mfew.diff(mold, mxml)), 3)
+    tfloop = timeit(lambda: mdfew.append(mfew.diff_loop(mold, mxml)), 3)
+    assert mdfew[0] == mdfew[-1]
+    treset = timeit(lambda: mnew.diff_reset(mxml), 3)
+    mfile = os.path.join(vpath, 'chip.snap')
+    mnew.name = 'after reset 50%'
+    tsave = timeit(lambda: mnew.save(mfile))
+    mload = []
+    tload = timeit(lambda: mload.append(gsnap.gSnap.load(mfile)))
+    assert (mload[0].items() == mnew.items()) and (mload[0].name == mnew.name)
+    print('snap: chip regs = {}, changed fields = {}'.format(len(mnew), len(mdiff[0])))
+    print('snap: diff = {:.3f}s (loop {:.3f}s), {} fields = {:.4f}s (loop {:.4f}s)'.format(
+        tdiff, tloop, len(mdfew[0]), tfew, tfloop))
+    print('snap: diff_reset = {:.3f}s, save = {:.3f}s, load = {:.3f}s'.format(treset, tsave, tload))
+
+
+def bench_shadow(vpath):
+    # field edits as the UI: read, write, read back; gCom vs gShadow, 2ms link latency
+    (mdev, mcom) = open_dev()
+    try:
+        mrand = random.Random(0)
+        mops = [(0x40000000 + mrand.randrange(20) * 4, mrand.randrange(1 << 16)) for k in range(300)]
+        mstat = None
+        for (kname, kcom) in (('gCom', mcom), ('gShadow', gshadow.gShadow(mcom))):
+            if kname == 'gShadow':
+                kcom.set_volatile(0x40000000)   # one status reg, always read
+            mcmd = mdev.ncmd
+            tim0 = time.perf_counter()
+            for (addr, data) in mops:
+                mval = kcom.read(addr)
+                assert kcom.write(addr, (mval & 0xffff0000) | data)
+                assert kcom.read(addr) == (mval & 0xffff0000) | data
+            dtim = time.perf_counter() - tim0
+            print('shadow: {:7s} edits = {}, serial cmds = {}, {:.3f}s'.format(kname, len(mops), mdev.ncmd - mcmd, dtim))
+            mstat = kcom.stats() if kname == 'gShadow' else mstat
+        print('shadow: reads = {reads}, hit = {hit}, miss = {miss}, volatile = {volatile}, ratio = {ratio:.2f}'.format(**mstat))
+    finally:
+        mcom.close()
+        mdev.close()
+
+
+def bench_trans(vpath):
+    # bring-up sequence, 800 field edits on 100 regs: one write per field vs gTrans
+    mroot = make_tree(vpath, vmod=4, vreg=256)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.load()
+    mrand = random.Random(0)
+    mregs = mrand.sample(list(mxml.mods['mod1'].regs.values()), 100)
+    medit = [(x, y['name'], mrand.randrange(1 << y['n'])) for k in range(8) for x in mregs for y in [x.get_lst()[k]]]
+    mrand.shuffle(medit)
+    (mdev, mcom) = open_dev()
+    try:
+        mcmd = mdev.ncmd
+        tim0 = time.perf_counter()
+        for (kreg, kname, kval) in medit:
+            kreg.set({kname: {'val': kval}})
+            assert mcom.write(kreg.addr, kreg.val)
+        tone = time.perf_counter() - tim0
+        print('trans: write per field, edits = {}, serial cmds = {}, {:.3f}s'.format(len(medit), mdev.ncmd - mcmd, tone))
+        for x in mregs:
+            x.set(x.rst)
+        mcmd = mdev.ncmd
+        tim0 = time.perf_counter()
+        with gtrans.gTrans(mcom, mxml) as mtr:
+            for (kreg, kname, kval) in medit:
+                mtr.set(kreg, {kname: kval})
+            mtr.set(mregs[0], mregs[0].val)     # no-op edits are dropped
+        assert not mtr.commit()
+        ttr = time.perf_counter() - tim0
+        print('trans: gTrans, edits = {}, serial cmds = {}, {:.3f}s'.format(len(medit), mdev.ncmd - mcmd, ttr))
+        tim0 = time.perf_counter()
+        mtr.begin()
+        for (kreg, kname, kval) in medit:
+            mtr.set(kreg, {kname: kval ^ 1})
+        assert not mtr.commit(True)
+        assert all(mdev.regs[x.addr] == x.val for x in mregs)
+        print('trans: gTrans with readback, {:.3f}s'.format(time.perf_counter() - tim0))
+    finally:
+        mcom.close()
+        mdev.close()
+
+
+def bench_watch(vpath):
+    # gWatch: 8 regs polled at several rates for 2s, 2ms latency, depth 256
+    mroot = make_tree(vpath, vmod=1, vreg=8)
+    mxml = gxml.gXmlParser(mroot)
+    mxml.load()
+    (mdev, mcom) = open_dev()
+    try:
+        for krate in (50, 200, 1000):
+            mwatch = gwatch.gWatch(mcom, mxml, krate, 256)
+            mwatch.add('mod0')
+            mreg = mxml.mods['mod0'].regs['mod0_reg0']
+            tracemalloc.start()
+            with mwatch:
+                for k in range(20):
+                    mdev.regs[mreg.addr] = k
+                    time.sleep(0.1)
+                    if k == 9:
+                        mmem = tracemalloc.get_traced_memory()[0]
+                mgrow = tracemalloc.get_traced_memory()[0] - mmem
+            tracemalloc.stop()
+            mstat = mwatch.stats()
+            assert len(mwatch.history(mreg.addr)) == min(256, mstat['samples'])
+            assert mwatch.fields(mreg.addr, 'mod0_r0_f0')[-1][1] == 19 & mreg.layout.mask[0]
+            print('watch: ask {:4d}/s, got {:6.1f}/s, dropped = {:4d}, changes kept = {:2d}, mem grow = {}B'.format(
+                krate, mstat['rate'], mstat['dropped'], len(mwatch.changes(mreg.addr)), mgrow))
+        # shared worker of the UI: through gSession, and gSession over gShadow
+        for kcom in (mcom, gshadow.gShadow(mcom, mxml)):
+            with gsession.gSession(kcom) as msess:
+                mwatch = gwatch.gWatch(msess, mxml, 50, 256)
+                mwatch.add('mod0')
+                mdev.regs[mreg.addr] = 7
+                with mwatch:
+                    time.sleep(0.5)
+            mstat = mwatch.stats()
+            assert mstat['samples'] and not mstat['failed'], mstat
+            assert mwatch.history(mreg.addr)[-1][1] == 7
+            print('watch: gSession over {}, samples = {}, failed = {}'.format(
+                type(kcom).__name__, mstat['samples'], mstat['failed']))
+    finally:
+        mcom.close()
+        mdev.close()
+
+
+def percentile(vlst, vpct):
+    # vpct percentile of a sorted list
+    return vlst[min(len(vlst) - 1, len(vlst) * vpct // 100)] if vlst else None
+
+
+def measure(vfunc, vnum, vops=1):
+    ''' run vfunc(k) vnum times
+    :param vops: register operations done by one call
+    :return: dict: n, tps (operations/s), p50_ms/p99_ms of one call, fail
+    '''
+    mtim = []
+    mfail = 0
+    tim0 = time.perf_counter()
+    for k in range(vnum):
+        tim1 = time.perf_counter()
+        mfail += vfunc(k)
+        mtim.append(time.perf_counter() - tim1)
+    dtim = time.perf_counter() - tim0
+    mtim.sort()
+    return {'n': vnum * vops, 'tps': round(vnum * vops / dtim, 1), 'fail': mfail,
+            'p50_ms': round(percentile(mtim, 50) * 1e3, 3), 'p99_ms': round(percentile(mtim, 99) * 1e3, 3)}
+
+
+def bench_serial(vpath):
+    # gCom on gDev scenarios: single / batched (16 per call) / bulk (2000 per call)
+    # operations, and the recovery time from a timeout to the next good answer
+    mscn = {
+        'clean':  dict(vlat=0.001),
+        'jitter': dict(vlat=0.001, vjit=0.002, vnoise=0.2),
+        'lossy':  dict(vlat=0.001, vjit=0.002, vnoise=0.2, vdrop=0.01),
+    }
+    mout = {}
+    for (kscn, kargs) in mscn.items():
+        (mdev, mcom) = open_dev(vbaud=921600, **kargs)
+        mres = mout[kscn] = {}
+        try:
+            mbase = 0x40000000
+            mres['single_write'] = measure(lambda k: not mcom.write(mbase + k * 4, k, 0.2), 200)
+            mres['single_read'] = measure(lambda k: mcom.read(mbase + k * 4, 0.2) is None, 200)
+            mres['batch_read'] = measure(lambda k: sum(x[1] is not None for x in mcom.read_many(
+                [mbase + (k * 16 + j) * 4 for j in range(16)], 16, 0.2)), 50, 16)
+            mres['bulk_write'] = measure(lambda k: sum(x[1] is not None for x in mcom.write_many(
+                [(mbase + j * 4, j) for j in range(2000)], 32, 0.2)), 1, 2000)
+            mres['bulk_read'] = measure(lambda k: sum(x[1] is not None for x in mcom.read_many(
+                [mbase + j * 4 for j in range(2000)], 32, 0.2)), 1, 2000)
+            # recovery: answers lost until the timeout, then the next read must be good
+            mrec = []
+            for k in range(10):
+                mdrop = mdev.drop
+                mdev.drop = 1.0
+                assert mcom.read(mbase, 0.2) is None
+                mdev.drop = 0.0
+                tim0 = time.perf_counter()
+                assert mcom.read(mbase + 4, 1) is not None
+                mrec.append(time.perf_counter() - tim0)
+                mdev.drop = mdrop
+            mrec.sort()
+            mres['recovery'] = {'n': len(mrec), 'timeout_ms': 200,
+                                'p50_ms': round(percentile(mrec, 50) * 1e3, 3), 'p99_ms': round(percentile(mrec, 99) * 1e3, 3)}
+            mres['dropped'] = mdev.ndrop
+        finally:
+            mcom.close()
+            mdev.close()
+        for (kop, kval) in mres.items():
+            if type(kval) is dict:
+                print('serial: {:6s} {:12s} n = {:5d}, tps = {:8.1f}, p50 = {:8.3f}ms, p99 = {:8.3f}ms, fail = {}'.format(
+                    kscn, kop, kval['n'], kval.get('tps', 0), kval['p50_ms'], kval['p99_ms'], kval.get('fail', 0)))
+    return {'baud': 921600, 'scenario': mscn, 'result': mout}
+
+
+def bench_link(vpath):
+    # gCom over each link to a gDev without latency: rtt, bulk read, and
+    # open + 1 read + close per script, without and with a glink.gLinkPool
+    mout = {}
+    for kname in ('serial', 'pty', 'tcp', 'mem'):
+        mdev = gdev.gDev(0, None, vlink='pty' if kname in ('serial', 'pty') else kname)
+        mdev.open()
+        mport = 'pty://' + mdev.port if kname == 'pty' else mdev.port
+        mres = mout[kname] = {}
+        try:
+            mcom = gcom.gCom()
+            mcom.set(mport, 921600, 1)
+            assert mcom.open()
+            mres['rtt'] = measure(lambda k: mcom.read(0x40000000 + k * 4, 1) is None, 300)
+            mres['bulk_read'] = measure(lambda k: sum(x[1] is not None for x in mcom.read_many(
+                [0x40000000 + j * 4 for j in range(2000)], 32)), 1, 2000)
+            mcom.close()
+            for kpool in (None, glink.gLinkPool()):
+                mcom = gcom.gCom(kpool)
+                mcom.set(mport, 921600, 1)
+
+                def script(k):
+                    mfail = not mcom.open()
+                    mfail = mfail or (mcom.read(0x40000000, 1) is None)
+                    mcom.close()
+                    return mfail
+                mres['script_pool' if kpool else 'script'] = measure(script, 50)
+                if kpool:
+                    assert (kpool.nopen, kpool.nreuse) == (1, 49)
+                    kpool.clear()
+        finally:
+            mdev.close()
+        for (kop, kval) in mres.items():
+            print('link: {:6s} {:11s} tps = {:8.1f}, p50 = {:7.3f}ms, p99 = {:7.3f}ms, fail = {}'.format(
+                kname, kop, kval['tps'], kval['p50_ms'], kval['p99_ms'], kval['fail']))
+    return mout
+
+
+def bench_boards(vpath):
+    # gBoards: broadcast write_many + gathered read_many of 500 regs per board,
+    # gDev 2ms latency 921600 baud each; then one board 100x slower with a deadline
+    mout = {}
+    maddrs = [0x40000000 + k * 4 for k in range(500)]
+    for kdev in (1, 2, 4, 8, 16, 32):
+        mdevs = [gdev.gDev(0.002, 921600) for k in range(kdev)]
+        for x in mdevs:
+            x.open()
+        try:
+            with gboard.gBoards([x.port for x in mdevs]) as mbrd:
+                assert len(mbrd.boards) == kdev
+                mres = mbrd.write_many([(x, x & 0xffff) for x in maddrs], 16)
+                assert all(y[1] is None and all(z[0] for z in y[0]) for y in mres.values())
+                mres = mbrd.read_many(maddrs, 16)
+                assert all(x == [x[0]] * kdev for x in gboard.gBoards.side(mres))
+                mout[kdev] = round(mbrd.throughput(), 1)
+        finally:
+            for x in mdevs:
+                x.close()
+        print('boards: {:2d}, {:8.0f} op/s'.format(kdev, mout[kdev]))
+    mdevs = [gdev.gDev(0.002 if k else 0.2, 921600) for k in range(4)]
+    for x in mdevs:
+        x.open()
+    try:
+        with gboard.gBoards([x.port for x in mdevs]) as mbrd:
+            tim0 = time.perf_counter()
+            mres = mbrd.read_many(maddrs[:200], 16, maxt=1.0)
+            dtim = time.perf_counter() - tim0
+            mlate = [x for x, y in mres.items() if y[1] == 'timeout']
+            print('boards: 1 slow of 4, deadline 1s, returned in {:.3f}s, timeout = {}'.format(dtim, len(mlate)))
+    finally:
+        for x in mdevs:
+            x.close()
+    return {'ops_per_s': mout}
+
+
+def bench_binary(vpath):
+    # ascii console vs gbin frames, gDev 1ms latency 921600 baud both ways:
+    # single read, scattered read_many, contiguous read/write of 4096 words
+    mout = {}
+    # line rate: a burst carries 4 bytes per word, 10 bits per byte
+    print('binary: line rate limit of a burst ~{:6.0f} words/s'.format(921600 / 10 / 4))
+    mrand = random.Random(0)
+    mline = [0x40000000 + k * 4 for k in range(4096)]
+    mscat = mrand.sample(mline, 1000)
+    for kmode in ('ascii', 'binary'):
+        (mdev, mcom) = open_dev(0.001, 921600)
+        mres = mout[kmode] = {}
+        try:
+            assert (kmode == 'ascii') or mcom.negotiate()
+            mres['single_read'] = measure(lambda k: mcom.read(mline[k], 1) is None, 200)
+            mres['scatter_read'] = measure(lambda k: sum(x[1] is not None for x in mcom.read_many(mscat, 16)), 1, len(mscat))
+            mres['burst_write'] = measure(lambda k: sum(not x[0] for x in mcom.write_burst(mline[0], mline, 16)), 1, len(mline))
+            mres['burst_read'] = measure(lambda k: sum(x[0] != y for x, y in zip(mcom.read_burst(mline[0], len(mline), 16), mline)), 1, len(mline))
+        finally:
+            mcom.close()
+            mdev.close()
+        for (kop, kval) in mres.items():
+            print('binary: {:6s} {:12s} tps = {:8.1f}, p50 = {:8.3f}ms, fail = {}'.format(
+                kmode, kop, kval['tps'], kval['p50_ms'], kval['fail']))
+    return mout
+
+
+BENCH = {
+    'load': bench_load,
+    'find': bench_find,
+    'lazy': bench_lazy,
+    'reload': bench_reload,
+    'decode': bench_decode,
+    'parallel': bench_parallel,
+    'stream': bench_stream,
+    'memory': bench_memory,
+    'addr': bench_addr,
+    'name': bench_name,
+    'filter': bench_filter,
+    'fuzzy': bench_fuzzy,
+    'batch': bench_batch,
+    'rtt': bench_rtt,
+    'async': bench_async,
+    'frame': bench_frame,
+    'snap': bench_snap,
+    'shadow': bench_shadow,
+    'trans': bench_trans,
+    'watch': bench_watch,
+    'serial': bench_serial,
+    'link': bench_link,
+    'boards': bench_boards,
+    'binary': bench_binary,
+}
+
+
+if __name__ == '__main__':
+    # python gbench.py [--json <file>] [name ...]
+    # benches returning a dict are saved to the json file, to track over time
+    mlst = sys.argv[1:]
+    mjson = None
+    if '--json' in mlst:
+        k = mlst.index('--json')
+        mjson = mlst[k+1]
+        del mlst[k:k+2]
+    mlst = mlst or list(BENCH.keys())
+    mout = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+            'host': platform.node(), 'bench': {}}
+    for kname in mlst:
+        with tempfile.TemporaryDirectory() as mpath:
+            mres = BENCH[kname](mpath)
+        if mres is not None:
+            mout['bench'][kname] = mres
+    if mjson:
+        with open(mjson, 'w') as fw:
+            json.dump(mout, fw, indent=2)
@@ -0,0 +1,199 @@
+import time
+import struct
+import binascii
+import collections
+
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+VERSION  = 1
+SOF_REQ  = 0xa5     # 1st byte of host -> device frame
+SOF_RSP  = 0x5a     # 1st byte of device -> host frame
+OP_HELLO = 0x01     # rsp data: version, max burst
+OP_READ  = 0x02     # req: cnt words from addr, rsp data: the words
+OP_WRITE = 0x03     # req data: cnt words to addr, rsp: no data
+OP_EXIT  = 0x04     # back to the ascii console after the rsp
+OP_NAK   = 0x0f     # rsp: request not done
+HEAD     = struct.Struct('<BBBIH')  # sof, op, seq, addr, cnt
+DATA_OPS = {(SOF_REQ, OP_WRITE), (SOF_RSP, OP_READ), (SOF_RSP, OP_HELLO)}   # frames with cnt data words
+MAX_CNT  = 1024
+
+gBinFrame = collections.namedtuple('gBinFrame', 'op seq addr cnt data')
+
+
+def pack(vsof, vop, vseq, vaddr, vcnt, vdata=()):
+    ''' one frame: head, data words (little endian), crc16-ccitt of head + data
+    :param vdata: words, only for DATA_OPS
+    :return: bytes
+    '''
+    mbyte = HEAD.pack(vsof, vop, vseq & 0xff, vaddr & 0xffffffff, vcnt)
+    if vdata:
+        mbyte += struct.pack('<{}I'.format(len(vdata)), *vdata)
+    return mbyte + struct.pack('<H', binascii.crc_hqx(mbyte, 0xffff))
+
+
+def unpack(vbuf, vsof):
+    ''' consume the whole frames at the start of vbuf
+    bytes before a SOF and frames with a bad crc are dropped (resync)
+    :param vbuf: bytearray, consumed in place
+    :param vsof: SOF_REQ / SOF_RSP
+    :return: (list of gBinFrame, number of bytes dropped)
+    '''
+    mlst = []
+    mpos = 0
+    mbad = 0
+    mlen = len(vbuf)
+    while True:
+        k = vbuf.find(vsof, mpos)
+        if k < 0:
+            mbad += mlen - mpos
+            mpos = mlen
+            break
+        mbad += k - mpos
+        mpos = k
+        if mlen - mpos < HEAD.size:
+            break
+        (null, op, seq, addr, cnt) = HEAD.unpack_from(vbuf, mpos)
+        nword = cnt if (vsof, op) in DATA_OPS else 0
+        if cnt > MAX_CNT:
+            (mpos, mbad) = (mpos + 1, mbad + 1)
+            continue
+        mend = mpos + HEAD.size + 4 * nword + 2
+        if mlen < mend:
+            break
+        if binascii.crc_hqx(vbuf[mpos:mend-2], 0xffff) != struct.unpack_from('<H', vbuf, mend - 2)[0]:
+            (mpos, mbad) = (mpos + 1, mbad + 1)
+            continue
+        mdata = struct.unpack_from('<{}I'.format(nword), vbuf, mpos + HEAD.size) if nword else ()
+        mlst.append(gBinFrame(op, seq, addr, cnt, mdata))
+        mpos = mend
+    del vbuf[:mpos]
+    return mlst, mbad
+
+
+def runs(vaddrs, vmax):
+    ''' split addrs to bursts of contiguous words
+    :param vaddrs: list of integer addr
+    :param vmax: max words of a burst
+    :return: list of (start addr, list of index in vaddrs)
+    '''
+    mlst = []
+    for k, addr in enumerate(vaddrs):
+        if mlst and (len(mlst[-1][1]) < vmax) and (addr == mlst[-1][0] + 4 * len(mlst[-1][1])):
+            mlst[-1][1].append(k)
+        else:
+            mlst.append((addr, [k]))
+    return mlst
+
+
+class gBin:
+    ''' host side of the binary protocol over a gCom
+        select it by hello(), which falls back (returns None) when the
+        device does not answer the ascii command 'bin <version>'
+    requests are pipelined, at most <win> frames in flight, answers are
+    matched by sequence number; a write is acked, without read back data
+    '''
+    def __init__(self, vcom, vburst=256):
+        self.com   = vcom
+        self.burst = vburst     # max words of a burst, from the device
+        self.seq   = 0
+        self.nbad  = 0          # bytes dropped by resync
+
+    @classmethod
+    def hello(cls, vcom, maxt=0.5):
+        ''' ask the device to switch to binary frames
+        :param vcom: open gCom in the ascii console
+        :param maxt: seconds to wait the answer
+        :return: gBin, or None when not supported
+        '''
+        vcom.send('bin {}'.format(VERSION))
+        tim0 = time.time()
+        while time.time() - tim0 < maxt:
+            mline = vcom.readline(maxt - (time.time() - tim0)).strip()
+            if mline.startswith('bin ok'):
+                # 'bin ok <version> <max burst>'
+                mitem = mline.split()
+                logger.info('gBin.hello: {}'.format(mline))
+                return cls(vcom, int(mitem[3]) if len(mitem) > 3 else 1)
+            if 'unknown' in mline:
+                break
+        logger.info('gBin.hello: not supported, ascii')
+        return None
+
+    def transact(self, vreqs, vwin=8, maxt=3):
+        ''' send requests and match the answers by sequence number
+        :param vreqs: list of (op, addr, cnt, data words)
+        :param vwin: max frames sent but not answered
+        :param maxt: fail the frames in flight when nothing answered in maxt seconds
+        :return: list of (gBinFrame answer, err) by order of vreqs
+        '''
+        mres = [(None, 'not open')] * len(vreqs)
+        mcom = self.com
+        if not mcom.ser.is_open:
+            return mres
+        mpend = {}      # seq: index in vreqs
+        (knext, ndone) = (0, 0)
+        tim0 = time.time()
+        try:
+            while ndone < len(vreqs):
+                mout = []
+                while (knext < len(vreqs)) and (len(mpend) < vwin):
+                    (op, addr, cnt, data) = vreqs[knext]
+                    self.seq = (self.seq + 1) & 0xff
+                    mpend[self.seq] = knext
+                    mout.append(pack(SOF_REQ, op, self.seq, addr, cnt, data))
+                    knext += 1
+                if mout:
+                    mcom.ser.write(b''.join(mout))
+                mcom.fill(min(1, maxt))
+                (mfrm, mbad) = unpack(mcom.rxbuf, SOF_RSP)
+                self.nbad += mbad
+                for kfrm in mfrm:
+                    kidx = mpend.pop(kfrm.seq, None)
+                    if kidx is None:
+                        continue    # not ours, or already timeout
+                    mres[kidx] = (kfrm, None) if kfrm.op != OP_NAK else (kfrm, 'nak')
+                    ndone += 1
+                    tim0 = time.time()
+                if mpend and (time.time() - tim0 > maxt):
+                    logger.warning('gBin: {} frames timeout'.format(len(mpend)))
+                    for kidx in mpend.values():
+                        mres[kidx] = (None, 'timeout')
+                    ndone += len(mpend)
+                    mpend.clear()
+                    tim0 = time.time()
+        except Exception as err:
+            logger.warning('Exception in gbin.transact: {}'.format(repr(err), exc_info=True))
+            for kidx in list(mpend.values()) + list(range(knext, len(vreqs))):
+                mres[kidx] = (None, repr(err))
+        return mres
+
+    def read_many(self, addrs, vwin=8, maxt=3):
+        # contiguous addrs in one burst: list of (data, err) by order of addrs
+        mres = [(None, 'failed')] * len(addrs)
+        mrun = runs(addrs, self.burst)
+        for (addr, kidx), (kfrm, err) in zip(mrun, self.transact([(OP_READ, x, len(y), ()) for x, y in mrun], vwin, maxt)):
+            for j, k in enumerate(kidx):
+                mres[k] = (kfrm.data[j], None) if err is None else (None, err)
+        return mres
+
+    def write_many(self, pairs, vwin=8, maxt=3):
+        # contiguous addrs in one burst: list of (ok, err) by order of pairs
+        mres = [(False, 'failed')] * len(pairs)
+        mrun = runs([x[0] for x in pairs], self.burst)
+        mreq = [(OP_WRITE, x, len(y), tuple(pairs[k][1] for k in y)) for x, y in mrun]
+        for (addr, kidx), (kfrm, err) in zip(mrun, self.transact(mreq, vwin, maxt)):
+            for k in kidx:
+                mres[k] = (err is None, err)
+        return mres
+
+    def read(self, addr, maxt=10):
+        return self.read_many([addr], 1, maxt)[0][0]
+
+    def write(self, addr, data, maxt=3):
+        return self.write_many([(addr, data)], 1, maxt)[0][0]
+
+    def exit(self, maxt=0.5):
+        # device back to the ascii console
+        return self.transact([(OP_EXIT, 0, 0, ())], 1, maxt)[0][1] is None
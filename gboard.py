@@ -0,0 +1,136 @@
+import time
+import concurrent.futures
+
+import gcom
+import gsession
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+class gBoards:
+    ''' the same register access on many boards in parallel
+        coms : dict <key> port name <val> gCom
+        sess : dict <key> port name <val> gSession, one worker per board,
+               so the boards run in parallel and each port is used by one thread
+        fail : dict <key> port name <val> error of open
+    every gathered operation returns dict <key> port name <val> (result, err),
+    a board not done in maxt seconds gets (None, 'timeout') and does not
+    hold up the others, its operation still finishes in its worker
+    '''
+    def __init__(self, vnames=None, vbaud=921600, vto=1, vpool=None):
+        ''' boards to open
+        :param vnames: list of port names, None: all ports of gCom.detect()
+        :param vpool: glink.gLinkPool shared by the gCom of boards, or None
+        '''
+        if vnames is None:
+            vnames = gcom.gCom().detect()
+        self.names = list(vnames)
+        self.baud  = vbaud
+        self.to    = vto
+        self.pool  = vpool
+        self.coms  = {}
+        self.sess  = {}
+        self.fail  = {}
+        self.nops  = 0      # register operations done, all boards
+        self.tops  = 0.0    # seconds spent in gathered operations
+
+    def open(self):
+        ''' open all ports at the same time
+        :return: dict <key> port name <val> True / False
+        '''
+        for kname in self.names:
+            mcom = gcom.gCom(self.pool)
+            mcom.set(kname, self.baud, self.to)
+            self.coms[kname] = mcom
+            self.sess[kname] = gsession.gSession(mcom).start()
+        mres = self.gather({x: self.sess[x].submit(self.coms[x].open) for x in self.names}, None)
+        self.fail = {x: y[1] or 'open failed' for x, y in mres.items() if not y[0]}
+        for kname in self.fail:
+            logger.warning('gBoards: open <{}> failed, {}'.format(kname, self.fail[kname]))
+            self.sess.pop(kname).stop()
+        return {x: bool(y[0]) for x, y in mres.items()}
+
+    def close(self):
+        for kname in list(self.sess.keys()):
+            self.sess[kname].submit(self.coms[kname].close).result()
+            self.sess.pop(kname).stop()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def boards(self):
+        # port names opened
+        return [x for x in self.names if x in self.sess]
+
+    @staticmethod
+    def gather(vfuts, maxt):
+        ''' wait the futures of boards
+        :param vfuts: dict <key> port name <val> Future
+        :param maxt: seconds to wait all, None: no limit
+        :return: dict <key> port name <val> (result, err)
+        '''
+        (mdone, null) = concurrent.futures.wait(vfuts.values(), maxt)
+        mres = {}
+        for (kname, kfut) in vfuts.items():
+            if kfut not in mdone:
+                mres[kname] = (None, 'timeout')
+            elif kfut.cancelled():
+                mres[kname] = (None, 'cancelled')
+            elif kfut.exception() is not None:
+                mres[kname] = (None, repr(kfut.exception()))
+            else:
+                mres[kname] = (kfut.result(), None)
+        return mres
+
+    def run(self, vfunc, *args, vnum=1, maxt=None, vpri=gsession.PRI_BULK):
+        ''' run vfunc(com, *args) on every board in parallel
+        :param vfunc: callable, 1st param is the gCom of a board
+        :param vnum: register operations of one call, for throughput()
+        :param maxt: seconds to wait all boards, None: no limit
+        :return: dict <key> port name <val> (result, err)
+        '''
+        tim0 = time.perf_counter()
+        mfuts = {x: self.sess[x].submit(vfunc, self.coms[x], *args, vpri=vpri) for x in self.boards}
+        mres = self.gather(mfuts, maxt)
+        self.tops += time.perf_counter() - tim0
+        self.nops += vnum * sum(1 for x in mres.values() if x[1] is None)
+        return mres
+
+    def read(self, addr, maxt=None):
+        # gathered read: {name: (data, err)}
+        mres = self.run(lambda x: x.read(addr), maxt=maxt)
+        return {x: (y[0], y[1] or (None if y[0] is not None else 'failed')) for x, y in mres.items()}
+
+    def write(self, addr, data, maxt=None):
+        # broadcast write: {name: (ok, err)}
+        mres = self.run(lambda x: x.write(addr, data), maxt=maxt)
+        return {x: (bool(y[0]), y[1] or (None if y[0] else 'failed')) for x, y in mres.items()}
+
+    def read_many(self, addrs, vwin=8, maxt=None):
+        # gathered read_many: {name: (list of (data, err), err)}
+        return self.run(lambda x: x.read_many(addrs, vwin=vwin), vnum=len(addrs), maxt=maxt)
+
+    def write_many(self, pairs, vwin=8, maxt=None):
+        # broadcast write_many: {name: (list of (ok, err), err)}
+        return self.run(lambda x: x.write_many(pairs, vwin=vwin), vnum=len(pairs), maxt=maxt)
+
+    @staticmethod
+    def side(vres):
+        ''' gathered read_many by addr, boards side by side
+        :param vres: return of read_many
+        :return: list of row: [data of board 0, data of board 1, ...] by
+            order of vres, data None when failed
+        '''
+        mcol = [x[0] if x[1] is None else None for x in vres.values()]
+        mnum = max((len(x) for x in mcol if x is not None), default=0)
+        return [[None if x is None else x[k][0] for x in mcol] for k in range(mnum)]
+
+    def throughput(self):
+        # register operations per second of gathered operations, all boards
+        return self.nops / self.tops if self.tops else 0.0
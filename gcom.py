@@ -1,21 +1,108 @@
 import re
 import time
+import collections
 import traceback
 
 import glib
+import gbin
+import glink
 import serial
 from serial.tools import list_ports
 import logging
 
 logger = logging.getLogger(__name__)    # logger for inner thread message
 
+RE_DATA = re.compile(rb'\[0x([0-9a-fA-F]{8})\] = 0x([0-9a-fA-F]{8})')    # answer of r/w command
+RE_ECHO = re.compile(rb'(?:^|[\s>])([rw])\s+([0-9a-fA-F]+)(?:\s+([0-9a-fA-F]+))?\s*$')  # echo of r/w command
+
+FILL_TO = 0.02  # ser.timeout of fill(), set once: setting it reconfigures a serial port
+
+gReadResult = collections.namedtuple('gReadResult', 'addr data')    # answer of 'r'
+gWriteAck   = collections.namedtuple('gWriteAck', 'addr data')      # answer of 'w', data read back
+gPrompt     = collections.namedtuple('gPrompt', 'text')             # console prompt, waiting input
+
+
+class gFrame:
+    ''' incremental line parser of the console output
+        parse() consumes the whole lines of <buf> (and a trailing prompt),
+        each byte is scanned once, and returns typed events:
+            '[0x<addr>] = 0x<data>' -> gWriteAck if the echo before it is
+                                       'w <addr> ..', else gReadResult
+        a new echo of an addr drops the older one, whose answer was lost
+            '<name>> '              -> gPrompt
+        other lines (noise, echo) are dropped
+    '''
+    def __init__(self, vbuf=None, vprompt=rb'[\w\-]*> ?$'):
+        self.buf    = vbuf if vbuf is not None else bytearray()
+        self.scan   = 0     # buf[0:scan] has no \n
+        self.echo   = collections.deque(maxlen=256)    # (kind, addr) echoed but not answered
+        self.prompt = re.compile(vprompt)
+
+    def reset(self):
+        # buf consumed by others: rescan it
+        self.scan = 0
+
+    def parse(self):
+        ''' consume the whole lines in <self.buf>
+        :return: list of gReadResult / gWriteAck / gPrompt
+        '''
+        mbuf = self.buf
+        mevt = []
+        mpos = 0
+        k = mbuf.find(b'\n', self.scan)
+        while k >= 0:
+            self.line(mbuf[mpos:k], mevt)
+            mpos = k + 1
+            k = mbuf.find(b'\n', mpos)
+        if mpos:
+            del mbuf[:mpos]
+        self.scan = len(mbuf)
+        if mbuf and (len(mbuf) < 64) and self.prompt.match(mbuf):
+            mevt.append(gPrompt(mbuf.decode(errors='replace')))
+            mbuf.clear()
+            self.scan = 0
+        return mevt
+
+    def line(self, vline, vevt):
+        # classify one line without \n, append its event to vevt
+        mch_obj = RE_DATA.search(vline)
+        if mch_obj:
+            addr = int(mch_obj.group(1), 16)
+            data = int(mch_obj.group(2), 16)
+            for k, (kind, kaddr) in enumerate(self.echo):
+                if kaddr == addr:
+                    del self.echo[k]
+                    if kind == b'w':
+                        vevt.append(gWriteAck(addr, data))
+                        return
+                    break
+            vevt.append(gReadResult(addr, data))
+            return
+        mch_obj = RE_ECHO.search(vline)
+        if mch_obj:
+            addr = int(mch_obj.group(2), 16)
+            # the device answers in order: an older echo of addr lost its answer
+            for k in [k for k, x in enumerate(self.echo) if x[1] == addr][::-1]:
+                del self.echo[k]
+            self.echo.append((mch_obj.group(1), addr))
+
 
 class gCom:
     ''' serial operation for read/write
+        ser is a serial.Serial or a glink.gLink by the port name set():
+            tcp://<host>:<port>, pty://<path>, mem://<name>, else serial port
+        with a pool (glink.gLinkPool) open() reuses an idle link of the
+        same port and close() gives the link back to the pool
+        after negotiate(), read/write run on the binary frames of gbin when
+        the device supports them, else on the ascii console as before
     '''
-    def __init__(self):
+    def __init__(self, vpool=None):
         self.ser = serial.Serial()
         self.lst = []
+        self.rxbuf = bytearray()    # received but not consumed bytes
+        self.frame = gFrame(self.rxbuf)
+        self.pool  = vpool
+        self.bin   = None           # gbin.gBin when negotiate() switched to binary
 
     def detect(self):
         # detect the serial list plug in this computer
@@ -27,6 +114,9 @@ class gCom:
         return self.lst
 
     def set(self, vname='com1', vbaud=921600, vto=1):
+        if vname != self.ser.port:
+            self.close()
+            self.ser = glink.link(vname)
         self.ser.port       = vname
         self.ser.baudrate   = vbaud
         self.ser.timeout    = vto
@@ -34,11 +124,19 @@ class gCom:
 
     def open(self):
         try:
-            if self.ser.is_open:
-                self.ser.close()
-            self.ser.open()
+            if self.pool is not None:
+                self.close()
+                self.ser = self.pool.get(self.ser.port, self.ser.baudrate, self.ser.timeout)
+            else:
+                if self.ser.is_open:
+                    self.ser.close()
+                self.ser.open()
             self.ser.reset_input_buffer()   # flush input buffer
             self.ser.reset_output_buffer()  # flush output buffer
+            self.rxbuf.clear()
+            self.frame.reset()
+            self.frame.echo.clear()
+            self.bin = None
             #self.ser.write(b'')
         except serial.SerialException:
             logger.error('ERROR: open <{}> failed'.format(self.ser.port))
@@ -47,60 +145,147 @@ class gCom:
     def close(self):
         try:
             if self.ser.is_open:
+                if self.bin is not None:
+                    # leave the device in the ascii console for the next open
+                    self.bin.exit()
+                    self.bin = None
                 self.ser.reset_input_buffer()
                 self.ser.reset_output_buffer()
-                self.ser.close()
+                if self.pool is not None:
+                    # keep it open in the pool, self.ser is a closed one of the same settings
+                    self.pool.put(self.ser)
+                    mlink = glink.link(self.ser.port)
+                    (mlink.baudrate, mlink.timeout) = (self.ser.baudrate, self.ser.timeout)
+                    self.ser = mlink
+                else:
+                    self.ser.close()
         except serial.SerialException:
             logger.error('ERROR: close <{}> failed'.format(self.ser.port))
         return self.ser.is_open
 
+    def negotiate(self, maxt=0.5):
+        ''' switch to the binary protocol when the device supports it
+        :param maxt: seconds to wait the answer of the capability query
+        :return: True: binary, False: ascii console
+        '''
+        if (self.bin is None) and self.ser.is_open:
+            try:
+                self.bin = gbin.gBin.hello(self, maxt)
+            except Exception as err:
+                logger.warning('Exception in gcom.negotiate: {}'.format(repr(err), exc_info=True))
+        return self.bin is not None
+
     def send(self, vstr):
         vstr += '\r\n'
         self.ser.write(vstr.encode())
 
-    def readlines(self, maxt=1):
-        # check com.rx_buffer per 0.01s, return when:
-        # 1. already read out something and rx_buffer keep empty 0.01s
-        # 2. read out nothing and maxt timeout
+    def fill(self, maxt=1):
+        ''' block until some bytes received or maxt timeout,
+        append all received bytes to <self.rxbuf>
+        :param maxt: timeout in seconds
+        :return: number of bytes received
+        '''
+        if self.ser.timeout != FILL_TO:
+            self.ser.timeout = FILL_TO
         tim0 = time.time()
-        dtim = 0
-        if True:
-            bstr = b''
-            rnum = self.ser.in_waiting
-            k = 0
-            # rnum > 0: com.rx_buffer is not empty
-            # not bstr: received_buff is empty
-            # dtim < maxt: this function not timeout
-            while (rnum > 0) or (not bstr and (dtim < float(maxt))):
-                if rnum:
-                    rstr = self.ser.read(rnum)
-                    bstr += rstr
-                    logger.info('readlines {}-{}: <{}>'.format(k, rnum, rstr.decode()))
-                time.sleep(0.01)
-                rnum = self.ser.in_waiting
-                k += 1
-                dtim = time.time() - tim0
-            mstr = bstr.decode()
-        else:
-            blst = self.ser.readlines()
-            slst = [x.decode() for x in blst]
-            mstr = ''.join(slst)
-            logger.info('readlines: <{}>'.format(mstr))
+        while True:
+            # read returns at the 1st byte, the deadline is kept here
+            rstr = self.ser.read(max(1, self.ser.in_waiting))
+            if rstr or (time.time() - tim0 >= maxt):
+                break
+        if rstr:
+            self.rxbuf += rstr
+            logger.debug('fill {}: <{}>'.format(len(rstr), rstr))
+        return len(rstr)
+
+    def take(self, vnum):
+        # consume and decode the first vnum bytes of <self.rxbuf>
+        mstr = self.rxbuf[:vnum].decode(errors='replace')
+        del self.rxbuf[:vnum]
+        self.frame.reset()
         return mstr
 
+    def readlines(self, maxt=1):
+        # return all received bytes when:
+        # 1. already received something, return at once
+        # 2. received nothing, wait until something received or maxt timeout
+        if not self.rxbuf:
+            self.fill(maxt)
+        while self.ser.in_waiting:
+            self.fill(maxt)
+        return self.take(len(self.rxbuf))
+
+    def readline(self, maxt=1):
+        # return one line with \n, or '' when no whole line in maxt
+        tim0 = time.time()
+        k = self.rxbuf.find(b'\n')
+        while k < 0:
+            dtim = time.time() - tim0
+            if dtim >= maxt:
+                return ''
+            mpos = len(self.rxbuf)
+            self.fill(maxt - dtim)
+            k = self.rxbuf.find(b'\n', mpos)
+        return self.take(k + 1)
+
+    def find(self, vstr, maxt=3, vcase=True):
+        ''' receive until <vstr> in <self.rxbuf>, each byte is checked once
+        :param vstr: string to find
+        :param maxt: timeout in seconds
+        :param vcase: False: case insensitive, vstr must be lower case
+        :return: end position of the line with vstr in <self.rxbuf>, or -1
+        '''
+        mkey = vstr.encode()
+        tim0 = time.time()
+        (mpos, mend) = (0, -1)    # mend: end of vstr when found
+        while True:
+            if mend < 0:
+                if vcase:
+                    k = self.rxbuf.find(mkey, mpos)
+                else:
+                    k = self.rxbuf[mpos:].lower().find(mkey)
+                    k = k if k < 0 else k + mpos
+                if k >= 0:
+                    (mpos, mend) = (k + len(mkey), k + len(mkey))
+                else:
+                    mpos = max(0, len(self.rxbuf) - len(mkey) + 1)
+            if mend >= 0:
+                # found, wait for the end of its line
+                k = self.rxbuf.find(b'\n', mpos)
+                if k >= 0:
+                    return k + 1
+                mpos = len(self.rxbuf)
+            dtim = time.time() - tim0
+            if dtim >= maxt:
+                return -1 if mend < 0 else len(self.rxbuf)
+            self.fill(maxt - dtim)
+
     def recv(self, vstr='', maxt=3):
         # receive until [vstr] or only current recv-buffer
         # <readlines> not always end with \n: rx-ongoing when timeout
+        if not vstr:
+            return self.readlines()
+        k = self.find(vstr, maxt)
+        return self.take(len(self.rxbuf) if k < 0 else k)
+
+    def event(self, vfunc, maxt=3):
+        ''' receive and parse until an event for which vfunc(event) is True
+        :param vfunc: event filter
+        :param maxt: timeout in seconds
+        :return: the event, or None when timeout
+        '''
         tim0 = time.time()
-        dtim = 0
-        mstr = self.readlines()
-        while((vstr not in mstr) and (dtim < float(maxt))):
-            mstr += self.readlines()
+        while True:
+            for kevt in self.frame.parse():
+                if vfunc(kevt):
+                    return kevt
             dtim = time.time() - tim0
-        return mstr
+            if dtim >= maxt:
+                return None
+            self.fill(maxt - dtim)
 
-    def write(self, addr, data):
-        # write serial device: addr = data
+    def write(self, addr, data, maxt=3):
+        # write serial device: addr = data, fail when no answer in maxt seconds
         if type(addr) is str:
             addr = glib.str2int(addr, 10)
         if type(data) is str:
@@ -111,18 +296,20 @@ class gCom:
         # write serial device
         if not self.ser.is_open:
             return False
+        if self.bin is not None:
+            return self.bin.write(addr, data, maxt)
         try:
             self.send(mstr)
-            # wait [write] done
-            #. rstr = self.wait('[0x{:08x}] = 0x'.format(addr)) # boot/aic diff
-            rstr = self.wait(' = 0x{:08x}'.format(data), 3) # boot/aic diff
-            return rstr is not None
+            # wait [write] done, data read back
+            mevt = self.event(lambda x: (type(x) is not gPrompt) and (x.addr == addr), maxt)
+            return (mevt is not None) and (mevt.data == data)
         except Exception as err:
             #. traceback.print_exc()
             logger.warning('Exception in gcom.write: {}'.format(repr(err), exc_info=True))
             return False
 
-    def read(self, addr):
+    def read(self, addr, maxt=10):
+        # read serial device, None when no answer in maxt seconds
         if type(addr) is str:
             addr = glib.str2int(addr, 10)
         assert type(addr) is int
@@ -130,52 +317,128 @@ class gCom:
         # read serial device
         if not self.ser.is_open:
             return None
+        if self.bin is not None:
+            return self.bin.read(addr, maxt)
         try:
             self.send(mstr)
             # wait [read] done
-            rstr = self.wait('[0x{:08x}] = 0x'.format(addr))
-            mch_obj = re.search(r' = 0x([a-f0-9]{8})', rstr)
-            if (mch_obj is None) or (mch_obj.group(1) is None):
-                return None
-            else:
-                return int(mch_obj.group(1), 16)
+            mevt = self.event(lambda x: (type(x) is gReadResult) and (x.addr == addr), maxt)
+            return None if mevt is None else mevt.data
         except Exception as err:
             #. traceback.print_exc()
             logger.warning('Exception in gcom.read: {}'.format(repr(err), exc_info=True))
             return None
 
+    def read_many(self, addrs, vwin=8, maxt=3):
+        ''' read a list of addr, keep at most vwin commands in flight
+        :param addrs: list of addr, int or str
+        :param vwin: max commands sent but not answered
+        :param maxt: fail the commands in flight when nothing answered in maxt seconds
+        :return: list of (data, err) by order of addrs, data is None when err
+        '''
+        mlst = [glib.str2int(x, 10) if type(x) is str else x for x in addrs]
+        if self.bin is not None:
+            return self.bin.read_many(mlst, vwin=vwin, maxt=maxt)
+        mcmd = [('r {:x}'.format(x), x, None) for x in mlst]
+        return self.pipeline(mcmd, vwin, maxt)
+
+    def write_many(self, pairs, vwin=8, maxt=3):
+        ''' write a list of (addr, data), keep at most vwin commands in flight
+        :param pairs: list of (addr, data), int or str
+        :param vwin: max commands sent but not answered
+        :param maxt: fail the commands in flight when nothing answered in maxt seconds
+        :return: list of (ok, err) by order of pairs
+        '''
+        mcmd = []
+        for (addr, data) in pairs:
+            addr = glib.str2int(addr, 10) if type(addr) is str else addr
+            data = glib.str2int(data, 10) if type(data) is str else data
+            mcmd.append(('w {:x} {:x}'.format(addr, data), addr, data))
+        if self.bin is not None:
+            return self.bin.write_many([(x[1], x[2]) for x in mcmd], vwin=vwin, maxt=maxt)
+        return [(x[1] is None, x[1]) for x in self.pipeline(mcmd, vwin, maxt)]
+
+    def read_burst(self, addr, vnum, vwin=8, maxt=3):
+        # read vnum words from addr: one frame per burst in binary, read_many in ascii
+        return self.read_many([addr + 4 * k for k in range(vnum)], vwin, maxt)
+
+    def write_burst(self, addr, datas, vwin=8, maxt=3):
+        # write words from addr: one frame per burst in binary, write_many in ascii
+        return self.write_many([(addr + 4 * k, x) for k, x in enumerate(datas)], vwin, maxt)
+
+    def pipeline(self, vcmds, vwin=8, maxt=3):
+        ''' send commands and match the answer events of gFrame by addr
+        answers of the same addr come back in the order of the commands
+        :param vcmds: list of (command, addr, data expected or None)
+        :param vwin: max commands sent but not answered
+        :param maxt: fail the commands in flight when nothing answered in maxt seconds
+        :return: list of (data, err) by order of vcmds
+        '''
+        mres = [(None, 'not open')] * len(vcmds)
+        if not self.ser.is_open:
+            return mres
+        mpend = collections.defaultdict(collections.deque)   # addr: deque of index in flight
+        (knext, nfly, ndone) = (0, 0, 0)
+        tim0 = time.time()
+        try:
+            while ndone < len(vcmds):
+                # fill the window with one write
+                mout = []
+                while (knext < len(vcmds)) and (nfly < vwin):
+                    (mcmd, addr, null) = vcmds[knext]
+                    mout.append(mcmd + '\r\n')
+                    mpend[addr].append(knext)
+                    (knext, nfly) = (knext + 1, nfly + 1)
+                if mout:
+                    self.ser.write(''.join(mout).encode())
+                # block until some bytes or ser.timeout
+                self.fill(min(1, maxt))
+                for kevt in self.frame.parse():
+                    if type(kevt) is not gPrompt:
+                        (addr, data) = kevt
+                        if not mpend.get(addr):
+                            continue    # not ours, or already timeout
+                        kidx = mpend[addr].popleft()
+                        mexp = vcmds[kidx][2]
+                        if (mexp is None) or (mexp == data):
+                            mres[kidx] = (data, None)
+                        else:
+                            mres[kidx] = (data, 'mismatch 0x{:08x}'.format(data))
+                        (nfly, ndone) = (nfly - 1, ndone + 1)
+                        tim0 = time.time()
+                if nfly and (time.time() - tim0 > maxt):
+                    logger.warning('pipeline: {} commands timeout'.format(nfly))
+                    for kque in mpend.values():
+                        for kidx in kque:
+                            mres[kidx] = (None, 'timeout')
+                    mpend.clear()
+                    (nfly, ndone) = (0, ndone + nfly)
+                    tim0 = time.time()
+        except Exception as err:
+            logger.warning('Exception in gcom.pipeline: {}'.format(repr(err), exc_info=True))
+            for kque in mpend.values():
+                for kidx in kque:
+                    mres[kidx] = (None, repr(err))
+            for kidx in range(knext, len(vcmds)):
+                mres[kidx] = (None, repr(err))
+        return mres
+
     def wait(self, vstr='', vnum=10):
         # read serial line until:
-        #  get @vstr or read @vnum times
-        logger.info('wait <{}> for <{}> times'.format(vstr, vnum))
+        #  get @vstr (case insensitive) or @vnum seconds timeout
+        logger.info('wait <{}> for <{}> seconds'.format(vstr, vnum))
         if not self.ser.is_open:
             return None
         try:
-            mstr = ''
-            for k in range(vnum):
-                mstr += self.recv()
-                if vstr in mstr.lower():
-                    return mstr.lower()
-            else:
+            k = self.find(vstr.lower(), vnum, False)
+            if k < 0:
                 return None
-            #n = 1
-            #for k in range(100):
-            #    mline = self.ser.readline().decode().lower().strip()
-            #    logger.info('{}: {}'.format(k, mline))
-            #    if n > vnum:
-            #        break
-            #    elif vstr in mline:
-            #        mstr = mline
-            #        break
-            #    elif len(mline) < 2:
-            #        n += 1
-            #return mstr
+            return self.take(k).lower()
         except Exception as err:
             #. traceback.print_exc()
             logger.warning('Exception in gcom.wait: {}'.format(repr(err), exc_info=True))
             return None
 
-
 if __name__ == '__main__':
     mcom = gCom()
     mlst = mcom.detect()
@@ -0,0 +1,282 @@
+import os
+import re
+import time
+import tty
+import heapq
+import random
+import socket
+import threading
+
+import gbin
+import glink
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+class gDev:
+    ''' simulated register device, for test and benchmark without board
+        the host opens <self.port> by gCom.set(dev.port), as link:
+            pty: a serial port path, tcp: tcp://127.0.0.1:<port>, mem: mem://<name>
+        command: 'r <addr>' / 'w <addr> <data>', hex without 0x, end with \\r\\n
+        answer : echo of the command, '[0x<addr>] = 0x<data>', prompt
+        'bin <version>' answers 'bin ok <version> <max burst>' and switches
+        to gbin frames until OP_EXIT, when binary is enabled
+    faults for test: jitter of latency, noise lines, dropped answers
+    '''
+    def __init__(self, vlat=0.0, vbaud=None, vprompt='aic> ', vjit=0.0, vnoise=0.0, vdrop=0.0, vseed=0, vlink='pty',
+                 vbin=256):
+        ''' init the device, call open() to start it
+        :param vlat: seconds from a command received to its answer sent
+        :param vbaud: emulate the line rate of commands and answers, None: pty speed
+        :param vprompt: prompt sent after each answer
+        :param vjit: add 0 ~ vjit seconds to vlat, answers keep their order
+        :param vnoise: probability of a log line sent before an answer
+        :param vdrop: probability of a command not answered at all
+        :param vseed: seed of the fault random
+        :param vlink: 'pty', 'tcp' (one host at a time) or 'mem' (glink.gLinkMem)
+        :param vbin: max burst words of the binary protocol, 0: ascii only
+        '''
+        self.lat    = vlat
+        self.baud   = vbaud
+        self.prompt = vprompt
+        self.jit    = vjit
+        self.noise  = vnoise
+        self.drop   = vdrop
+        self.rand   = random.Random(vseed)
+        self.last   = 0.0       # due time of the last answer
+        self.regs   = {}        # addr: data, unwritten addr reads 0
+        self.port   = None      # pty slave path
+        self.fd     = None      # pty master fd
+        self.sfd    = None      # pty slave fd, kept open so the pty lives
+        self.link   = vlink
+        self.bin    = vbin
+        self.mode   = 'ascii'   # 'bin' after the 'bin' command
+        self.sock   = None      # tcp: listening socket
+        self.conn   = None      # tcp: connected host / mem: device end gLinkMem
+        self.outq   = []        # heap of (due time, seq, bytes) to send
+        self.seq    = 0
+        self.cond   = threading.Condition()
+        self.thds   = []
+        self.live   = False
+        self.ncmd   = 0         # number of commands answered
+        self.ndrop  = 0         # number of commands dropped
+
+    def open(self):
+        # create the pty / socket / memory link and start the rx/tx threads
+        if self.link == 'tcp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.bind(('127.0.0.1', 0))
+            self.sock.listen(1)
+            self.sock.settimeout(0.2)
+            self.port = 'tcp://127.0.0.1:{}'.format(self.sock.getsockname()[1])
+        elif self.link == 'mem':
+            self.conn = glink.gLinkMem.bind('gdev{}'.format(id(self)))
+            self.conn.timeout = 0.2
+            self.port = self.conn.port
+        else:
+            (self.fd, self.sfd) = os.openpty()
+            tty.setraw(self.sfd)
+            self.port = os.ttyname(self.sfd)
+        self.live = True
+        self.thds = [threading.Thread(target=self.rx_loop, daemon=True),
+                     threading.Thread(target=self.tx_loop, daemon=True)]
+        for x in self.thds:
+            x.start()
+        logger.info('gDev.open: {}'.format(self.port))
+        return self.port
+
+    def close(self):
+        with self.cond:
+            self.live = False
+            self.cond.notify_all()
+        for x in (self.fd, self.sfd):
+            try:
+                if x is not None:
+                    os.close(x)
+            except OSError:
+                pass
+        for x in (self.sock, self.conn):
+            if x is not None:
+                x.close()
+        for x in self.thds:
+            x.join(1)
+        self.thds = []
+        (self.fd, self.sfd, self.sock, self.conn) = (None, None, None, None)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def recv(self):
+        # bytes from the host, None when nothing in 0.2s, raise OSError when closed
+        if self.link == 'mem':
+            return self.conn.read(max(1, self.conn.in_waiting)) or None
+        if self.link != 'tcp':
+            return os.read(self.fd, 4096)
+        if self.conn is None:
+            try:
+                (self.conn, null) = self.sock.accept()
+            except socket.timeout:
+                return None
+            self.conn.settimeout(0.2)
+            self.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            mstr = self.conn.recv(4096)
+        except socket.timeout:
+            return None
+        if not mstr:
+            # host gone, wait for the next one
+            self.conn.close()
+            self.conn = None
+        return mstr
+
+    def xmit(self, vbytes):
+        # bytes to the host, dropped when no host, raise OSError when closed
+        if self.link == 'mem':
+            try:
+                self.conn.write(vbytes)
+            except glink.gLinkError:
+                pass
+        elif self.link == 'tcp':
+            mconn = self.conn
+            if mconn is not None:
+                try:
+                    mconn.sendall(vbytes)
+                except OSError:
+                    pass
+        else:
+            os.write(self.fd, vbytes)
+
+    def rx_loop(self):
+        # read command lines from the host, at <self.baud> if set
+        mbuf = b''
+        mfree = 0.0     # time all bytes received so far are through the line
+        while self.live:
+            try:
+                mstr = self.recv()
+            except (OSError, glink.gLinkError):
+                break
+            if mstr:
+                mbuf += mstr
+                if self.baud:
+                    # a command is executed when its last byte is in, 10 bits per byte
+                    mfree = max(mfree, time.perf_counter()) + len(mstr) * 10 / self.baud
+                    mdly = mfree - time.perf_counter()
+                    if mdly > 0:
+                        time.sleep(mdly)
+            while True:
+                if self.mode == 'bin':
+                    mbin = bytearray(mbuf)
+                    (mfrm, null) = gbin.unpack(mbin, gbin.SOF_REQ)
+                    mbuf = bytes(mbin)
+                    for kfrm in mfrm:
+                        self.answer_bin(kfrm)
+                        if self.mode != 'bin':
+                            break   # OP_EXIT: the bytes left are ascii
+                    else:
+                        break
+                elif b'\n' in mbuf:
+                    (mline, mbuf) = mbuf.split(b'\n', 1)
+                    self.answer(mline.decode(errors='replace').strip())
+                else:
+                    break
+
+    def answer(self, vline):
+        ''' execute one command line and queue its answer
+        :param vline: command line without \\r\\n
+        :return: None
+        '''
+        mstr = vline + '\r\n'
+        if self.noise and (self.rand.random() < self.noise):
+            mstr += '[{:10.6f}] wlan: rx noise rssi={}\r\n'.format(time.perf_counter(), self.rand.randrange(-90, 0))
+        mch_obj = re.match(r'([rw])\s+([0-9a-fA-F]+)(?:\s+([0-9a-fA-F]+))?$', vline)
+        if mch_obj:
+            addr = int(mch_obj.group(2), 16)
+            if (mch_obj.group(1) == 'w') and mch_obj.group(3):
+                self.regs[addr] = int(mch_obj.group(3), 16) & 0xffffffff
+            mstr += '[0x{:08x}] = 0x{:08x}\r\n'.format(addr, self.regs.get(addr, 0))
+        elif self.bin and re.match(r'bin\s+\d+$', vline):
+            # no prompt: the host waits frames from now on
+            self.mode = 'bin'
+            self.ncmd += 1
+            self.send(mstr + 'bin ok {} {}\r\n'.format(gbin.VERSION, self.bin), self.lat)
+            return
+        elif vline:
+            mstr += 'unknown command\r\n'
+        if self.drop and (self.rand.random() < self.drop):
+            self.ndrop += 1     # executed, but the answer is lost
+            return
+        self.ncmd += 1
+        self.send(mstr + self.prompt, self.lat + (self.rand.uniform(0, self.jit) if self.jit else 0))
+
+    def answer_bin(self, vfrm):
+        ''' execute one gbin request frame and queue its answer frame
+        :param vfrm: gbin.gBinFrame
+        :return: None
+        '''
+        mdata = ()
+        if vfrm.op == gbin.OP_HELLO:
+            mdata = (gbin.VERSION, self.bin)
+        elif (vfrm.op in (gbin.OP_READ, gbin.OP_WRITE)) and (0 < vfrm.cnt <= self.bin):
+            if vfrm.op == gbin.OP_WRITE:
+                for k, x in enumerate(vfrm.data):
+                    self.regs[vfrm.addr + 4 * k] = x
+            else:
+                mdata = tuple(self.regs.get(vfrm.addr + 4 * k, 0) for k in range(vfrm.cnt))
+        elif vfrm.op == gbin.OP_EXIT:
+            self.mode = 'ascii'
+        else:
+            vfrm = vfrm._replace(op=gbin.OP_NAK, cnt=0)
+        mbyte = gbin.pack(gbin.SOF_RSP, vfrm.op, vfrm.seq, vfrm.addr, len(mdata) if mdata else vfrm.cnt, mdata)
+        if self.noise and (self.rand.random() < self.noise):
+            mbyte = '[{:10.6f}] wlan: rx noise rssi={}\r\n'.format(time.perf_counter(), self.rand.randrange(-90, 0)).encode() + mbyte
+        if self.drop and (self.rand.random() < self.drop):
+            self.ndrop += 1
+            return
+        self.ncmd += 1
+        self.send(mbyte, self.lat + (self.rand.uniform(0, self.jit) if self.jit else 0))
+
+    def send(self, vstr, vlat=0.0):
+        # queue vstr (str or bytes) to be sent after vlat seconds
+        with self.cond:
+            self.seq += 1
+            self.last = max(self.last, time.perf_counter() + vlat)
+            heapq.heappush(self.outq, (self.last, self.seq, vstr if type(vstr) is bytes else vstr.encode()))
+            self.cond.notify_all()
+
+    def tx_loop(self):
+        # send queued answers when due, at <self.baud> if set
+        while True:
+            with self.cond:
+                while self.live and not self.outq:
+                    self.cond.wait()
+                if not self.live:
+                    break
+                (mdue, null, mbyte) = self.outq[0]
+                mdly = mdue - time.perf_counter()
+                if mdly > 0:
+                    self.cond.wait(mdly)
+                    continue
+                heapq.heappop(self.outq)
+            if self.baud:
+                # 10 bits per byte: start + 8 data + stop
+                time.sleep(len(mbyte) * 10 / self.baud)
+            try:
+                self.xmit(mbyte)
+            except OSError:
+                break
+
+
+if __name__ == '__main__':
+    # run a device and print its port, stop with ctrl-c
+    with gDev(0.001, 921600) as mdev:
+        print(mdev.port)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
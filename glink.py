@@ -0,0 +1,304 @@
+import os
+import time
+import socket
+import select
+import threading
+
+import serial
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+class gLinkError(serial.SerialException):
+    # open / io error of a gLink, caught as serial.SerialException by gCom
+    pass
+
+
+class gLink:
+    ''' byte stream with the part of serial.Serial api used by gCom
+        port/baudrate/timeout/is_open, open(), close(), read(), write(),
+        in_waiting, reset_input_buffer(), reset_output_buffer(), fileno()
+    a backend implements link_open / link_close / pull / push:
+        pull(maxt): wait at most maxt seconds (None: forever) for bytes,
+                    append all bytes ready to <self.buf>
+    '''
+    def __init__(self, vname=''):
+        self.port     = vname
+        self.baudrate = 921600  # kept for the api, not used by non serial link
+        self.timeout  = 1
+        self.is_open  = False
+        self.buf      = bytearray()     # received, not read
+
+    def open(self):
+        if self.is_open:
+            self.close()
+        self.buf.clear()
+        try:
+            self.link_open()
+        except OSError as err:
+            raise gLinkError('open <{}> failed: {}'.format(self.port, repr(err)))
+        self.is_open = True
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self.link_close()
+
+    def read(self, vnum=1):
+        # as serial.Serial.read: vnum bytes, or less when timeout
+        tim0 = time.time()
+        while self.is_open and (len(self.buf) < vnum):
+            if self.timeout is None:
+                mwait = None
+            else:
+                mwait = max(0, self.timeout - (time.time() - tim0))
+            self.pull(mwait)
+            if mwait == 0:
+                break   # timeout 0: non-blocking
+        mstr = bytes(self.buf[:vnum])
+        del self.buf[:vnum]
+        return mstr
+
+    def write(self, vbytes):
+        if not self.is_open:
+            raise gLinkError('<{}> not open'.format(self.port))
+        try:
+            self.push(vbytes)
+        except OSError as err:
+            raise gLinkError('write <{}> failed: {}'.format(self.port, repr(err)))
+        return len(vbytes)
+
+    @property
+    def in_waiting(self):
+        if self.is_open:
+            self.pull(0)
+        return len(self.buf)
+
+    def reset_input_buffer(self):
+        self.in_waiting
+        self.buf.clear()
+
+    def reset_output_buffer(self):
+        # writes are not buffered
+        pass
+
+    def fileno(self):
+        raise gLinkError('<{}> has no fileno'.format(self.port))
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class gLinkFd(gLink):
+    # gLink on a readable/writable file descriptor <self.fd>
+    # recv_fd(): bytes ready, b'' when closed by peer, None when nothing ready
+    def pull(self, maxt):
+        try:
+            if select.select([self.fd], [], [], maxt)[0]:
+                mstr = self.recv_fd()
+                if mstr is None:
+                    return
+                if not mstr:
+                    logger.warning('gLink: <{}> closed by peer'.format(self.port))
+                    self.close()
+                self.buf += mstr
+        except (OSError, ValueError) as err:
+            logger.warning('Exception in glink.pull: {}'.format(repr(err), exc_info=True))
+            self.close()
+
+    def fileno(self):
+        return self.fd
+
+
+class gLinkTcp(gLinkFd):
+    ''' raw tcp socket, as a terminal server port: tcp://<host>:<port>
+        small commands are sent at once (TCP_NODELAY)
+    '''
+    def __init__(self, vname='tcp://127.0.0.1:23'):
+        gLink.__init__(self, vname)
+        self.sock = None
+        self.fd   = -1
+
+    def link_open(self):
+        (mhost, null, mport) = self.port[len('tcp://'):].rpartition(':')
+        self.sock = socket.create_connection((mhost, int(mport)), timeout=3)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 18)
+        self.sock.setblocking(False)
+        self.fd = self.sock.fileno()
+
+    def link_close(self):
+        self.sock.close()
+        (self.sock, self.fd) = (None, -1)
+
+    def recv_fd(self):
+        try:
+            return self.sock.recv(1 << 16)
+        except BlockingIOError:
+            return None
+
+    def push(self, vbytes):
+        self.sock.setblocking(True)
+        try:
+            self.sock.sendall(vbytes)
+        finally:
+            self.sock.setblocking(False)
+
+
+class gLinkPty(gLinkFd):
+    ''' pty / tty device opened raw, without serial settings: pty://<path>
+    '''
+    def __init__(self, vname='pty:///dev/pts/0'):
+        gLink.__init__(self, vname)
+        self.fd = -1
+
+    def link_open(self):
+        import tty      # posix only, not at top: glink is imported on windows
+        self.fd = os.open(self.port[len('pty://'):], os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self.fd)
+
+    def link_close(self):
+        os.close(self.fd)
+        self.fd = -1
+
+    def recv_fd(self):
+        try:
+            return os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return None
+
+    def push(self, vbytes):
+        mview = memoryview(vbytes)
+        while mview:
+            try:
+                mview = mview[os.write(self.fd, mview):]
+            except BlockingIOError:
+                select.select([], [self.fd], [], 1)
+
+
+class gLinkMem(gLink):
+    ''' in-memory loopback: mem://<name>
+        bind(name) makes the device end, open() of mem://<name> connects to it;
+        bytes written to one end are read from the other end
+    '''
+    ends = {}           # name: device end waiting for open
+    lock = threading.Lock()
+
+    def __init__(self, vname='mem://dev'):
+        gLink.__init__(self, vname)
+        self.peer = None
+        self.cond = threading.Condition()
+
+    @classmethod
+    def bind(cls, vname):
+        ''' device end of mem://<vname>
+        :return: open gLinkMem
+        '''
+        mend = cls('mem://' + vname)
+        mend.is_open = True
+        with cls.lock:
+            cls.ends[mend.port] = mend
+        return mend
+
+    def link_open(self):
+        with gLinkMem.lock:
+            mend = gLinkMem.ends.get(self.port)
+        if (mend is None) or not mend.is_open:
+            raise OSError('no device bound')
+        if (mend.peer is not None) and mend.peer.is_open:
+            mend.peer.close()   # one host at a time
+        (self.peer, mend.peer) = (mend, self)
+
+    def link_close(self):
+        with self.cond:
+            self.cond.notify_all()
+        with gLinkMem.lock:
+            if gLinkMem.ends.get(self.port) is self:
+                del gLinkMem.ends[self.port]
+
+    def pull(self, maxt):
+        # bytes are put to <self.buf> by the peer, wait for them
+        with self.cond:
+            mlen = len(self.buf)
+            self.cond.wait_for(lambda: (len(self.buf) != mlen) or not self.is_open, maxt)
+
+    def read(self, vnum=1):
+        with self.cond:
+            return gLink.read(self, vnum)
+
+    def push(self, vbytes):
+        mpeer = self.peer
+        if (mpeer is None) or not mpeer.is_open:
+            raise OSError('peer closed')
+        with mpeer.cond:
+            mpeer.buf += vbytes
+            mpeer.cond.notify_all()
+
+
+def link(vname=''):
+    ''' a closed gLink for a port name, by its prefix:
+        tcp://<host>:<port>, pty://<path>, mem://<name>, else serial port
+    :return: gLink or serial.Serial
+    '''
+    for (kpre, kcls) in (('tcp://', gLinkTcp), ('pty://', gLinkPty), ('mem://', gLinkMem)):
+        if vname.startswith(kpre):
+            return kcls(vname)
+    mser = serial.Serial()
+    mser.port = vname or None
+    return mser
+
+
+class gLinkPool:
+    ''' open links kept for reuse: get() an idle one of the same port, or
+        open a new one; put() it back instead of close
+    '''
+    def __init__(self):
+        self.idle = {}      # port: list of open links
+        self.lock = threading.Lock()
+        self.nopen = 0      # links opened
+        self.nreuse = 0     # links reused
+
+    def get(self, vname, vbaud=921600, vto=1):
+        # an open link of vname, raise serial.SerialException when open failed
+        with self.lock:
+            mlst = self.idle.get(vname, [])
+            while mlst:
+                mlink = mlst.pop()
+                if mlink.is_open:
+                    self.nreuse += 1
+                    break
+            else:
+                mlink = None
+        if mlink is None:
+            mlink = link(vname)
+            mlink.baudrate = vbaud
+            mlink.timeout  = vto
+            mlink.open()
+            self.nopen += 1
+        else:
+            mlink.baudrate = vbaud
+            mlink.timeout  = vto
+            mlink.reset_input_buffer()
+        return mlink
+
+    def put(self, vlink):
+        # give back a link got by get()
+        if vlink.is_open:
+            with self.lock:
+                self.idle.setdefault(vlink.port, []).append(vlink)
+
+    def clear(self):
+        # close all idle links
+        with self.lock:
+            mlst = [x for y in self.idle.values() for x in y]
+            self.idle.clear()
+        for x in mlst:
+            x.close()
+
+
+pool = gLinkPool()  # shared by all gCom with pool enabled
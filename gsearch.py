@@ -0,0 +1,283 @@
+import re
+import heapq
+import bisect
+import itertools
+import functools
+from array import array
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+META = set('.^$*+?{}[]\\|()')   # a pattern without these is a plain substring
+
+
+@functools.lru_cache(maxsize=256)
+def pattern(vprtn):
+    # compiled pattern cache, case insensitive as gXmlParser.filter
+    return re.compile(vprtn, re.I)
+
+
+class gSearchSeg:
+    ''' index of one segment of gSearch.strs, the pairs of one module
+        keys : unique lower case names, by order of 1st appearance
+        refs : index in the segment grouped by key, refs[offr[k]:offr[k+1]] for keys[k]
+        text : all keys joined by '\\n', offs[k] = start of keys[k] in text
+        part : by build_fuzzy, reg part and bit part of keys
+    '''
+    __slots__ = ('keys', 'refs', 'offr', 'text', 'offs', 'part')
+
+    def __init__(self, vstrs):
+        mids = {}
+        mkid = [mids.setdefault(x[0].lower(), len(mids)) for x in vstrs]
+        self.keys = list(mids.keys())
+        self.refs = array('L', sorted(range(len(mkid)), key=mkid.__getitem__))
+        mcnt = [0] * len(self.keys)
+        for k in mkid:
+            mcnt[k] += 1
+        self.offr = array('L', itertools.accumulate(mcnt, initial=0))
+        self.text = '\n'.join(self.keys) + '\n'
+        self.offs = array('L', itertools.accumulate((len(x) + 1 for x in self.keys), initial=0))
+        self.part = None
+
+    def build_fuzzy(self, vregs):
+        # split keys to reg part and bit part, each: (text, offs, key index)
+        # text is '\n' + keys joined by '\n' + '\n', offs[k] = start of its k-th key
+        self.part = []
+        for kreg in (True, False):
+            mids = [k for k, x in enumerate(self.keys) if (x in vregs) == kreg]
+            mkeys = [self.keys[k] for k in mids]
+            mtext = '\n' + '\n'.join(mkeys) + '\n'
+            moffs = array('L', itertools.accumulate((len(x) + 1 for x in mkeys), initial=1))
+            self.part.append((mtext, moffs, mids))
+
+    def match_plain(self, vstr, vmax=None, vlast=None):
+        ''' key index list of keys containing vstr
+        :param vstr: lower case plain substring
+        :param vmax: stop after vmax keys, None: all
+        :param vlast: all key index matched by a query that vstr extends,
+                      None: find in text
+        :return: sorted list of key index, all of them when vlast is given
+        '''
+        if not vstr:
+            return list(range(len(self.keys)))[:vmax]
+        if vlast is not None:
+            # narrow: extending a query only keeps its old matches
+            mkeys = self.keys
+            return [k for k in vlast if vstr in mkeys[k]]
+        mids = []
+        mtext = self.text
+        moffs = self.offs
+        mfind = mtext.find
+        pos = mfind(vstr)
+        while (pos >= 0) and (len(mids) != vmax):
+            k = bisect.bisect_right(moffs, pos) - 1
+            mids.append(k)
+            pos = mfind(vstr, moffs[k+1])
+        return mids
+
+    def match_regex(self, vprtn, vmax=None):
+        # key index list of keys matching pattern vprtn, at most vmax
+        msearch = pattern(vprtn).search
+        mids = (k for k, mkey in enumerate(self.keys) if msearch(mkey))
+        return list(itertools.islice(mids, vmax))
+
+    @staticmethod
+    def match_part(vpart, vkind, vstr):
+        ''' yield the matches of one kind in one part
+        :param vpart: (text, offs, key index) of build_fuzzy
+        :param vkind: 'exact', 'prefix', 'substring',
+                      'close' (subsequence, each gap <= 2 chars), 'subsequence'
+        :param vstr: lower case query
+        :return: generator of (key index, match start in key, match length)
+        '''
+        (mtext, moffs, mids) = vpart
+        if vkind in ('close', 'subsequence'):
+            # x[^\ny]*y: no backtracking, stays inside one key
+            mgap = '{0,2}' if vkind == 'close' else '*'
+            mprtn = ''.join(re.escape(x) + '[^\n{}]'.format(re.escape(y)) + mgap for x, y in zip(vstr, vstr[1:]))
+            for kmch in pattern(mprtn + re.escape(vstr[-1])).finditer(mtext):
+                k = bisect.bisect_right(moffs, kmch.start()) - 1
+                yield (mids[k], kmch.start() - moffs[k], kmch.end() - kmch.start())
+            return
+        mfind = {'exact': '\n{}\n', 'prefix': '\n{}', 'substring': '{}'}[vkind].format(vstr)
+        mskip = 1 if vkind != 'substring' else 0   # hit is at the '\n' before key
+        pos = mtext.find(mfind)
+        while pos >= 0:
+            k = bisect.bisect_right(moffs, pos + mskip) - 1
+            if k + 1 >= len(moffs):
+                break
+            yield (mids[k], pos + mskip - moffs[k], len(vstr))
+            pos = mtext.find(mfind, moffs[k+1] - mskip)
+
+
+class gSearch:
+    ''' incremental search over a list of (name, addr) pair
+    strs is cut to segments (the modules of gXmlParser), each with its own
+    gSearchSeg index; a reload drops / inserts the segments of the changed
+    modules, and the next search indexes only these
+    plain substring query: str.find over the text of each segment, jump to
+        the next key after a hit; or re-check the last result when the query
+        extends the last query
+    regex query: scan keys with the compiled pattern
+    fuzzy query: match kind by kind over reg part then bit part of keys,
+        top-k names of each kind with a heap, stop when k names found
+    results are by order of strs, as one index over the whole strs
+    '''
+    def __init__(self, vstrs=()):
+        self.strs = []
+        self.lens = []              # number of pairs of each segment
+        self.segs = []              # gSearchSeg of each segment, None: built by the next search
+        self.last = (None, None)    # (last plain query, all key index matched of each segment)
+        self.regs = set()           # lower case reg names, ranked before bit names
+        self.load(vstrs)
+
+    def load(self, vstrs, vregs=(), vlens=None):
+        ''' set the list to search, the index is built when needed
+        :param vstrs: list of (name, addr) pair
+        :param vregs: names in vstrs which are reg.name
+        :param vlens: number of pairs of each segment, None: one segment
+        :return: None
+        '''
+        self.strs = vstrs
+        self.lens = [len(vstrs)] if vlens is None else list(vlens)
+        assert sum(self.lens) == len(vstrs)
+        self.segs = [None] * len(self.lens)
+        self.last = (None, None)
+        self.regs = {x.lower() for x in vregs}
+
+    def drop(self, vseg):
+        # remove segment vseg, after its pairs are removed from self.strs
+        del self.lens[vseg]
+        del self.segs[vseg]
+        self.last = (None, None)
+
+    def insert(self, vseg, vnum):
+        # put a segment of vnum pairs before segment vseg, after its pairs
+        # are put to self.strs; it is indexed by the next search
+        self.lens.insert(vseg, vnum)
+        self.segs.insert(vseg, None)
+        self.last = (None, None)
+
+    def reclass(self, vseg):
+        # a name of segment vseg is added to / removed from self.regs
+        if self.segs[vseg] is not None:
+            self.segs[vseg].part = None
+
+    def build(self):
+        # index the segments not indexed yet
+        mbase = 0
+        mnum = 0
+        for k, knum in enumerate(self.lens):
+            if self.segs[k] is None:
+                self.segs[k] = gSearchSeg(self.strs[mbase:mbase+knum])
+                mnum += 1
+            mbase += knum
+        logger.info('gSearch.build: strs = {}, segs = {} / {}'.format(len(self.strs), mnum, len(self.segs)))
+
+    def build_fuzzy(self):
+        # split keys of each segment to reg part and bit part
+        if None in self.segs:
+            self.build()
+        for kseg in self.segs:
+            if kseg.part is None:
+                kseg.build_fuzzy(self.regs)
+
+    @staticmethod
+    def is_plain(vprtn):
+        return not (META & set(vprtn))
+
+    def search(self, vprtn, vmax=None):
+        ''' search names with plain substring or regex pattern, case insensitive
+        :param vprtn: pattern
+        :param vmax: return at most vmax pairs, None: all
+        :return: list of (name, addr) pair, by order of strs
+        '''
+        if None in self.segs:
+            self.build()
+        mstr = vprtn.lower()
+        mplain = self.is_plain(vprtn)
+        (mlast, mlids) = self.last
+        mnarrow = mplain and (mlast is not None) and (mlast in mstr)
+        mfull = True    # no segment stopped at vmax keys: the next query can narrow
+        mall = []
+        mlst = []
+        mbase = 0
+        for k, kseg in enumerate(self.segs):
+            mleft = None if vmax is None else vmax - len(mlst)
+            if mnarrow:
+                mids = kseg.match_plain(mstr, None, mlids[k])
+            elif mleft == 0:
+                break
+            elif mplain:
+                mids = kseg.match_plain(mstr, mleft)
+                mfull &= len(mids) != mleft
+            else:
+                mids = kseg.match_regex(vprtn, mleft)
+            mall.append(mids)
+            if mleft != 0:
+                # key index is by order of 1st appearance in the segment, so
+                # the 1st mleft pairs are all from the 1st mleft keys
+                (mrefs, moffr) = (kseg.refs, kseg.offr)
+                midx = sorted(itertools.chain.from_iterable(mrefs[moffr[j]:moffr[j+1]] for j in mids))
+                mlst.extend(self.strs[mbase + j] for j in midx[:mleft])
+            mbase += self.lens[k]
+        if mstr and mplain and mfull and (len(mall) == len(self.segs)):
+            self.last = (mstr, mall)
+        return mlst
+
+    def fuzzy(self, vprtn, vnum=100):
+        ''' search names containing the chars of vprtn in order, case insensitive
+        :param vprtn: query string, taken as plain chars
+        :param vnum: return at most vnum pairs
+        :return: list of (name, addr) pair, best match first:
+            exact > prefix > substring > close > subsequence, then reg > bit,
+            then shorter match span, earlier match start, shorter name
+        '''
+        self.build_fuzzy()
+        mstr = vprtn.lower().replace('\n', '')
+        if not mstr:
+            return []
+        mseen = set()
+        mnames = []
+        mrefs = {}  # name found: list of (segment, key index), by order of segments
+        # better kind can not be beaten by worse one: stop when vnum names found
+        for kkind in ('exact', 'prefix', 'substring', 'close', 'subsequence'):
+            for kpart in (0, 1):
+                # name: (span, start, len, segment, key index) at its 1st segment,
+                # the same rank order as one index: ties by 1st appearance in strs
+                mbest = {}
+                mmore = {}  # name: list of (segment, key index) at its other segments
+                for j, kseg in enumerate(self.segs):
+                    mkeys = kseg.keys
+                    for (k, pos, span) in kseg.match_part(kseg.part[kpart], kkind, mstr):
+                        mname = mkeys[k]
+                        if mname in mseen:
+                            continue
+                        mold = mbest.get(mname)
+                        if mold is None:
+                            mbest[mname] = (span, pos, len(mname), j, k)
+                        elif mold[3] != j:
+                            mlst = mmore.setdefault(mname, [])
+                            if not mlst or (mlst[-1][0] != j):
+                                mlst.append((j, k))
+                        elif span < mold[0]:
+                            mbest[mname] = (span, pos, len(mname), j, k)
+                mtop = heapq.nsmallest(vnum - len(mnames), mbest.keys(), key=mbest.__getitem__)
+                for kname in mtop:
+                    mrefs[kname] = [mbest[kname][3:]] + mmore.get(kname, [])
+                mnames.extend(mtop)
+                mseen.update(mbest.keys())
+                if len(mnames) >= vnum:
+                    break
+            else:
+                continue
+            break
+        mbase = list(itertools.accumulate(self.lens, initial=0))
+        mlst = []
+        for kname in mnames:
+            for (j, k) in mrefs[kname]:
+                mseg = self.segs[j]
+                mlst.extend(self.strs[mbase[j] + x] for x in mseg.refs[mseg.offr[k]:mseg.offr[k+1]])
+            if len(mlst) >= vnum:
+                break
+        return mlst[:vnum]
@@ -0,0 +1,162 @@
+import heapq
+import itertools
+import threading
+import concurrent.futures
+
+import gcom
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+PRI_UI   = 0    # interactive operation, run before bulk
+PRI_BULK = 10   # script / bulk operation
+
+
+class gOp:
+    ''' an operation queued in gSession
+        func/args/kwargs: run func(*args, **kwargs) in the worker thread
+        futs     : one Future per submitter, coalesced reads share one gOp
+    '''
+    __slots__ = ('func', 'args', 'kwargs', 'pri', 'futs', 'addr', 'started')
+
+    def __init__(self, vfunc, vargs, vpri, vaddr=None, vkwargs=None):
+        self.func = vfunc
+        self.args = vargs
+        self.kwargs = vkwargs or {}
+        self.pri  = vpri
+        self.futs = []
+        self.addr = vaddr       # addr of a coalescable read, else None
+        self.started = False
+
+
+class gSession:
+    ''' own a gCom in a worker thread, run submitted operations by priority
+        every operation returns a concurrent.futures.Future
+        pending reads of the same addr are coalesced into one serial read
+    '''
+    def __init__(self, vcom=None):
+        self.com   = vcom if vcom is not None else gcom.gCom()
+        self.que   = []     # heap of (pri, seq, gOp)
+        self.seq   = itertools.count()
+        self.cond  = threading.Condition()
+        self.reads = {}     # addr: pending read gOp
+        self.thd   = None
+        self.live  = False
+
+    def start(self):
+        if self.thd is None:
+            self.live = True
+            self.thd = threading.Thread(target=self.run, name='gSession', daemon=True)
+            self.thd.start()
+        return self
+
+    def stop(self, vwait=True):
+        ''' stop the worker, pending operations are cancelled
+        :param vwait: wait the running operation done
+        :return: None
+        '''
+        with self.cond:
+            self.live = False
+            for (null, null, mop) in self.que:
+                for kfut in mop.futs:
+                    kfut.cancel()
+            self.que.clear()
+            self.reads.clear()
+            self.cond.notify_all()
+        if vwait and self.thd is not None:
+            self.thd.join()
+        self.thd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def push(self, vop):
+        # cond must be held
+        heapq.heappush(self.que, (vop.pri, next(self.seq), vop))
+        self.cond.notify()
+
+    def submit(self, vfunc, *args, vpri=PRI_BULK, **kwargs):
+        ''' run vfunc(*args, **kwargs) in the worker thread
+        :param vfunc: callable, usually a gCom method
+        :param vpri: PRI_UI / PRI_BULK, smaller runs first
+        :return: Future of vfunc's return
+        '''
+        mfut = concurrent.futures.Future()
+        mop = gOp(vfunc, args, vpri, vkwargs=kwargs)
+        mop.futs.append(mfut)
+        with self.cond:
+            if not self.live:
+                mfut.cancel()
+                return mfut
+            self.push(mop)
+        return mfut
+
+    def read(self, addr, vpri=PRI_BULK):
+        ''' gCom.read in the worker thread, joined to a pending read of addr
+        :return: Future of data or None
+        '''
+        mfut = concurrent.futures.Future()
+        with self.cond:
+            if not self.live:
+                mfut.cancel()
+                return mfut
+            mop = self.reads.get(addr)
+            if mop is None:
+                mop = self.reads[addr] = gOp(self.com.read, (addr,), vpri, addr)
+                self.push(mop)
+            elif vpri < mop.pri:
+                # raise priority: queue it again, the old entry is skipped
+                mop.pri = vpri
+                self.push(mop)
+            mop.futs.append(mfut)
+        return mfut
+
+    def write(self, addr, data, vpri=PRI_BULK):
+        ''' gCom.write in the worker thread
+        reads of addr submitted before are not joined by reads after
+        :return: Future of True/False
+        '''
+        with self.cond:
+            self.reads.pop(addr, None)
+        return self.submit(self.com.write, addr, data, vpri=vpri)
+
+    def read_many(self, addrs, vpri=PRI_BULK, **kwargs):
+        # gCom.read_many in the worker thread, Future of list of (data, err)
+        return self.submit(self.com.read_many, addrs, vpri=vpri, **kwargs)
+
+    def write_many(self, pairs, vpri=PRI_BULK, **kwargs):
+        # gCom.write_many in the worker thread, Future of list of (ok, err)
+        with self.cond:
+            for (addr, null) in pairs:
+                self.reads.pop(addr, None)
+        return self.submit(self.com.write_many, pairs, vpri=vpri, **kwargs)
+
+    def run(self):
+        # worker thread: pop and run operations by (priority, submit order)
+        while True:
+            with self.cond:
+                while self.live and not self.que:
+                    self.cond.wait()
+                if not self.live:
+                    break
+                (null, null, mop) = heapq.heappop(self.que)
+                if mop.started:
+                    continue    # queued again with higher priority
+                mop.started = True
+                if (mop.addr is not None) and (self.reads.get(mop.addr) is mop):
+                    del self.reads[mop.addr]
+                mfuts = [x for x in mop.futs if x.set_running_or_notify_cancel()]
+            if not mfuts:
+                continue        # all cancelled
+            try:
+                mres = mop.func(*mop.args, **mop.kwargs)
+            except Exception as err:
+                logger.warning('Exception in gsession.run: {}'.format(repr(err), exc_info=True))
+                for kfut in mfuts:
+                    kfut.set_exception(err)
+            else:
+                for kfut in mfuts:
+                    kfut.set_result(mres)
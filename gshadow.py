@@ -0,0 +1,182 @@
+import time
+import collections
+
+import glib
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+class gShadow:
+    ''' shadow of the device regs in front of a gCom, same read/write api
+        vals : dict <key> addr <val> (data, time of read/write)
+        vols : set of volatile addr, always read from the device
+        age  : max seconds a shadow value is used, None: until invalidated
+        stat : Counter of hit / miss / stale / volatile / refresh / fail
+    a read is served from the shadow when the addr is not volatile and its
+    value is not older than age; a write drops the shadow value of its addr,
+    and keeps the data the device answered when the write succeeded
+    '''
+    def __init__(self, vcom, vxml=None, vage=None):
+        self.com  = vcom
+        self.xml  = vxml    # gXmlParser, to set volatile by module / reg name
+        self.age  = vage
+        self.en   = True    # False: pass through, shadow is not used nor updated
+        self.vals = {}
+        self.vols = set()
+        self.stat = collections.Counter()
+
+    def __getattr__(self, vname):
+        # set/open/close/... of the gCom
+        return getattr(self.com, vname)
+
+    def addrs(self, vname):
+        ''' addr list of a name
+        :param vname: int addr, module name, reg name or bit name (its reg) in self.xml
+        :return: list of integer addr
+        '''
+        if type(vname) is int:
+            return [vname]
+        if self.xml is not None:
+            if vname in self.xml.mods:
+                return [x.addr for x in self.xml.mods[vname].regs.values()]
+            mref = self.xml.find_name(vname)
+            if mref:
+                return sorted({self.xml.mods[x[0]].regs[x[1]].addr for x in mref})
+        logger.warning('gShadow: <{}> not found'.format(vname))
+        return []
+
+    def set_volatile(self, vname, vflag=True):
+        ''' set module / reg / addr always read from the device, as status regs
+        :param vname: int addr, module name or reg name
+        :param vflag: True: volatile, False: cacheable
+        :return: None
+        '''
+        for addr in self.addrs(vname):
+            if vflag:
+                self.vols.add(addr)
+                self.vals.pop(addr, None)
+            else:
+                self.vols.discard(addr)
+
+    def invalidate(self, vnames=None):
+        ''' drop shadow values
+        :param vnames: list of int addr / module name / reg name, None: all
+        :return: None
+        '''
+        if vnames is None:
+            self.vals.clear()
+            return
+        for kname in vnames:
+            for addr in self.addrs(kname):
+                self.vals.pop(addr, None)
+
+    def lookup(self, addr):
+        # shadow value of addr or None, count the reason of a miss
+        if addr in self.vols:
+            self.stat['volatile'] += 1
+            return None
+        mval = self.vals.get(addr)
+        if mval is None:
+            self.stat['miss'] += 1
+            return None
+        if (self.age is not None) and (time.time() - mval[1] > self.age):
+            self.stat['stale'] += 1
+            return None
+        self.stat['hit'] += 1
+        return mval[0]
+
+    def store(self, addr, data):
+        if data is None:
+            self.stat['fail'] += 1
+            self.vals.pop(addr, None)
+        elif addr not in self.vols:
+            self.vals[addr] = (data, time.time())
+
+    def read(self, addr, vfresh=False):
+        ''' read from the shadow, or from the device when not usable
+        :param addr: int or str addr
+        :param vfresh: True: always read the device and update the shadow
+        :return: data or None
+        '''
+        if type(addr) is str:
+            addr = glib.str2int(addr, 10)
+        if not self.en:
+            return self.com.read(addr)
+        if vfresh:
+            self.stat['refresh'] += 1
+        else:
+            data = self.lookup(addr)
+            if data is not None:
+                return data
+        data = self.com.read(addr)
+        self.store(addr, data)
+        return data
+
+    def write(self, addr, data):
+        # gCom.write, shadow keeps data when the device answered it
+        if type(addr) is str:
+            addr = glib.str2int(addr, 10)
+        if type(data) is str:
+            data = glib.str2int(data, 10)
+        if not self.en:
+            return self.com.write(addr, data)
+        self.vals.pop(addr, None)
+        ok = self.com.write(addr, data)
+        if ok:
+            self.store(addr, data)
+        return ok
+
+    def read_many(self, addrs, vwin=8, maxt=3, vfresh=False):
+        ''' gCom.read_many of the addrs not usable in the shadow
+        :return: list of (data, err) by order of addrs
+        '''
+        mlst = [glib.str2int(x, 10) if type(x) is str else x for x in addrs]
+        if not self.en:
+            return self.com.read_many(mlst, vwin=vwin, maxt=maxt)
+        if vfresh:
+            self.stat['refresh'] += len(mlst)
+            mres = [None] * len(mlst)
+        else:
+            mres = [self.lookup(x) for x in mlst]
+        mmiss = [k for k, x in enumerate(mres) if x is None]
+        mres = [(x, None) for x in mres]
+        if mmiss:
+            for k, kres in zip(mmiss, self.com.read_many([mlst[x] for x in mmiss], vwin=vwin, maxt=maxt)):
+                self.store(mlst[k], kres[0])
+                mres[k] = kres
+        return mres
+
+    def write_many(self, pairs, vwin=8, maxt=3):
+        # gCom.write_many, shadow as write()
+        mlst = [tuple(glib.str2int(x, 10) if type(x) is str else x for x in y) for y in pairs]
+        if not self.en:
+            return self.com.write_many(mlst, vwin=vwin, maxt=maxt)
+        for (addr, null) in mlst:
+            self.vals.pop(addr, None)
+        mres = self.com.write_many(mlst, vwin=vwin, maxt=maxt)
+        for (addr, data), (ok, null) in zip(mlst, mres):
+            if ok:
+                self.store(addr, data)
+        return mres
+
+    def refresh(self, vnames=None, vwin=8, maxt=3):
+        ''' read again from the device
+        :param vnames: list of int addr / module name / reg name, None: all in shadow
+        :return: list of (data, err) by order of the addrs
+        '''
+        if vnames is None:
+            maddrs = sorted(self.vals.keys())
+        else:
+            maddrs = [x for y in vnames for x in self.addrs(y)]
+        return self.read_many(maddrs, vwin=vwin, maxt=maxt, vfresh=True)
+
+    def stats(self):
+        ''' hit/miss statistic
+        :return: dict of counters, 'reads': reads asked, 'saved': serial reads
+            saved (= hit), 'ratio': hit / reads
+        '''
+        mdict = {x: self.stat[x] for x in ('hit', 'miss', 'stale', 'volatile', 'refresh', 'fail')}
+        mread = sum(self.stat[x] for x in ('hit', 'miss', 'stale', 'volatile', 'refresh'))
+        mdict.update(reads=mread, saved=self.stat['hit'], ratio=self.stat['hit'] / mread if mread else 0.0)
+        return mdict
@@ -0,0 +1,206 @@
+import time
+import bisect
+import collections
+import urllib.parse
+from array import array
+
+import logging
+try:
+    import numpy as np
+except ImportError:
+    np = None   # diff() falls back to a loop over regs
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+gDiff = collections.namedtuple('gDiff', 'addr mod reg bit old new')    # one field differs
+
+
+class gSnap:
+    ''' values of a set of regs at one time
+        addrs: array of reg addr, sorted
+        vals : array of reg value, vals[k] is the value of addrs[k]
+        oks  : bytearray, oks[k] = 0 when addrs[k] read failed
+    '''
+    def __init__(self, vname='', vtime=None):
+        self.name  = vname
+        self.time  = time.time() if vtime is None else vtime
+        self.addrs = array('L')
+        self.vals  = array('L')
+        self.oks   = bytearray()
+
+    def __len__(self):
+        return len(self.addrs)
+
+    @staticmethod
+    def regs(vxml, vmods=None):
+        ''' regs to snapshot, sorted by addr
+        :param vxml: loaded gXmlParser
+        :param vmods: module name, list of module name, None: whole chip
+        :return: list of gXmlReg
+        '''
+        if vmods is None:
+            vmods = vxml.mods.keys()
+        elif type(vmods) is str:
+            vmods = [vmods]
+        mregs = {}
+        for kmod in vmods:
+            for kreg in vxml.mods[kmod].regs.values():
+                mregs.setdefault(kreg.addr, kreg)
+        return [mregs[x] for x in sorted(mregs.keys())]
+
+    def set(self, vlst):
+        ''' set from a list of (addr, data), data None when read failed
+        :param vlst: list of (addr, data), any order
+        :return: self
+        '''
+        vlst = sorted(vlst, key=lambda x: x[0])
+        self.addrs = array('L', (x[0] for x in vlst))
+        self.vals  = array('L', (x[1] or 0 for x in vlst))
+        self.oks   = bytearray(x[1] is not None for x in vlst)
+        return self
+
+    @classmethod
+    def capture(cls, vcom, vxml, vmods=None, vname='', vwin=8):
+        ''' bulk read regs from the device
+        :param vcom: gCom (read_many)
+        :param vxml: loaded gXmlParser
+        :param vmods: module name, list of module name, None: whole chip
+        :return: gSnap
+        '''
+        maddrs = [x.addr for x in cls.regs(vxml, vmods)]
+        tim0 = time.time()
+        mres = vcom.read_many(maddrs, vwin=vwin)
+        mfail = sum(1 for x in mres if x[1] is not None)
+        logger.info('gSnap.capture: {} regs, {} failed, {:.3f}s'.format(len(maddrs), mfail, time.time() - tim0))
+        return cls(vname, tim0).set(zip(maddrs, (x[0] if x[1] is None else None for x in mres)))
+
+    @classmethod
+    def reset(cls, vxml, vmods=None, vname='reset'):
+        # snapshot of reset values, gXmlReg.rst
+        return cls(vname, 0).set((x.addr, x.rst) for x in cls.regs(vxml, vmods))
+
+    def get(self, vaddr):
+        # value of vaddr, None when not in snapshot or read failed
+        k = bisect.bisect_left(self.addrs, vaddr)
+        if (k < len(self.addrs)) and (self.addrs[k] == vaddr) and self.oks[k]:
+            return self.vals[k]
+        return None
+
+    def items(self):
+        # list of (addr, data), data None when read failed
+        return [(x, y if z else None) for x, y, z in zip(self.addrs, self.vals, self.oks)]
+
+    def diff(self, vother, vxml):
+        ''' field level diff from vother to self
+        only regs in both snapshots and read ok in both are compared
+        with numpy the regs are compared as arrays and the fields of the
+        changed regs are compared by gXmlLayout.decode, all regs of a
+        layout (field positions) at once; without numpy by diff_loop()
+        :param vother: gSnap, the old one
+        :param vxml: loaded gXmlParser, for reg layout
+        :return: list of gDiff by addr then msb high -> low, addr without
+            reg in vxml is one gDiff with reg None
+        '''
+        if np is None:
+            return self.diff_loop(vother, vxml)
+        (mnew, mold) = (self.arrays(), vother.arrays())
+        (maddr, knew, kold) = np.intersect1d(mnew[0], mold[0], return_indices=True)
+        (vnew, vold) = (mnew[1][knew], mold[1][kold])
+        mchg = (vnew != vold) & mnew[2][knew] & mold[2][kold]
+        (maddr, vnew, vold) = (maddr[mchg].tolist(), vnew[mchg], vold[mchg])
+        mlst = []   # gDiff of addr without reg
+        mgrp = {}   # layout: (index in maddr, (mod name, reg name), gXmlReg)
+        for k, addr in enumerate(maddr):
+            mref = vxml.find_reg(addr)
+            if mref is None:
+                mlst.append(gDiff(addr, None, None, None, int(vold[k]), int(vnew[k])))
+                continue
+            mreg = vxml.mods[mref[0]].regs[mref[1]]
+            mgrp.setdefault(mreg.layout, ([], [], []))
+            for (x, y) in zip(mgrp[mreg.layout], (k, mref, mreg)):
+                x.append(y)
+        mcol = []   # per group: (index in maddr, -msb, old, new, (mod name, reg name, field name))
+        for (mlay, (midx, mrefs, mregs)) in mgrp.items():
+            (mfo, mfn) = (mlay.decode(vold[midx]), mlay.decode(vnew[midx]))    # (fields, regs)
+            (kbits, kregs) = np.nonzero(mfo != mfn)
+            mname = [(mrefs[x][0], mrefs[x][1], mregs[x].names[y]) for (y, x) in zip(kbits.tolist(), kregs.tolist())]
+            mcol.append((np.asarray(midx)[kregs], -np.asarray(mlay.msb)[kbits],
+                         mfo[kbits, kregs], mfn[kbits, kregs], mname))
+        if mcol:
+            (midx, mrank, mfo, mfn) = (np.concatenate([x[i] for x in mcol]) for i in range(4))
+            mname = [y for x in mcol for y in x[4]]
+            korder = np.lexsort((mrank, midx)).tolist()   # by addr then msb high -> low
+            (midx, mfo, mfn) = (midx.tolist(), mfo.tolist(), mfn.tolist())
+            mlst.extend(gDiff(maddr[midx[k]], *mname[k], mfo[k], mfn[k]) for k in korder)
+            mlst.sort(key=lambda x: x.addr)     # stable, only places addr without reg
+        return mlst
+
+    def arrays(self):
+        # numpy views of addrs, vals, oks (as bool)
+        return (np.frombuffer(self.addrs, dtype=self.addrs.typecode),
+                np.frombuffer(self.vals, dtype=self.vals.typecode),
+                np.frombuffer(self.oks, dtype=np.uint8).astype(bool))
+
+    def diff_loop(self, vother, vxml):
+        # diff() by a merge walk over regs, field by field
+        mlst = []
+        (mold, mnew) = (vother, self)
+        j = 0
+        for k, addr in enumerate(mnew.addrs):
+            # merge walk, both sorted by addr
+            while (j < len(mold.addrs)) and (mold.addrs[j] < addr):
+                j += 1
+            if (j == len(mold.addrs)) or (mold.addrs[j] != addr):
+                continue
+            (vold, vnew) = (mold.vals[j], mnew.vals[k])
+            if (vold == vnew) or not (mold.oks[j] and mnew.oks[k]):
+                continue
+            mref = vxml.find_reg(addr)
+            if mref is None:
+                mlst.append(gDiff(addr, None, None, None, vold, vnew))
+                continue
+            mreg = vxml.mods[mref[0]].regs[mref[1]]
+            mlay = mreg.layout
+            mxor = vold ^ vnew
+            for kbit in mlay.order:
+                if mxor & mlay.mask[kbit]:
+                    lsb = mlay.lsb[kbit]
+                    mmsk = mlay.mask[kbit]
+                    mlst.append(gDiff(addr, mref[0], mref[1], mreg.names[kbit],
+                                      (vold & mmsk) >> lsb, (vnew & mmsk) >> lsb))
+        return mlst
+
+    def diff_reset(self, vxml):
+        # fields not at reset value
+        return self.diff(gSnap.reset(vxml), vxml)
+
+    def save(self, vfile):
+        ''' save as text: header line, then '<addr> <data>' per reg in hex,
+        data is 'x' when read failed, name is %-quoted in the header
+        :param vfile: file path
+        :return: None
+        '''
+        with open(vfile, 'w') as fw:
+            fw.write('# gsnap name={} time={:.3f} regs={}\n'.format(urllib.parse.quote(self.name), self.time, len(self)))
+            for (addr, data, ok) in zip(self.addrs, self.vals, self.oks):
+                fw.write('{:08x} {}\n'.format(addr, format(data, '08x') if ok else 'x'))
+
+    @classmethod
+    def load(cls, vfile):
+        # load a file saved by save()
+        mobj = cls()
+        mlst = []
+        with open(vfile, 'r') as fr:
+            for mline in fr:
+                if mline.startswith('#'):
+                    for kitem in mline[1:].split()[1:]:
+                        (mkey, null, mval) = kitem.partition('=')
+                        if mkey == 'name':
+                            mobj.name = urllib.parse.unquote(mval)
+                        elif mkey == 'time':
+                            mobj.time = float(mval)
+                    continue
+                mitem = mline.split()
+                if len(mitem) == 2:
+                    mlst.append((int(mitem[0], 16), None if mitem[1] == 'x' else int(mitem[1], 16)))
+        return mobj.set(mlst)
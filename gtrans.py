@@ -0,0 +1,122 @@
+import threading
+import collections.abc
+
+import gshadow
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+class gTrans:
+    ''' write-back transaction of gXmlReg edits
+        begin(), set fields of any regs, commit(): one write per changed reg
+        pend: dict <key> addr <val> [gXmlReg, value before the 1st edit]
+    the edits go to gXmlReg.val at once as gXmlReg.set, commit() writes the
+    final values which differ from the value before, in addr order by one
+    write_many, rollback() puts the value before back to gXmlReg.val
+    '''
+    def __init__(self, vcom, vxml=None):
+        self.com  = vcom    # gCom or gShadow
+        self.xml  = vxml    # gXmlParser, to set by reg / bit name
+        self.pend = {}
+        self.lock = threading.Lock()
+        self.nset = 0       # field edits since begin
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, vtype, vval, vtb):
+        # commit when the block is done, rollback on exception
+        if vtype is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def __len__(self):
+        return len(self.pend)
+
+    def begin(self):
+        # drop edits not committed, gXmlReg.val keeps them
+        with self.lock:
+            self.pend = {}
+            self.nset = 0
+        return self
+
+    def find(self, vname):
+        ''' reg of a name
+        :param vname: gXmlReg, or reg name / bit name (its reg) in self.xml
+        :return: gXmlReg
+        '''
+        if type(vname) is not str:
+            return vname
+        (mod_name, reg_name) = self.xml.get_modreg(vname)
+        assert reg_name is not None, 'gTrans: <{}> not found'.format(vname)
+        return self.xml.mods[mod_name].regs[reg_name]
+
+    def set(self, vreg, vval):
+        ''' edit a reg in the transaction
+        :param vreg: gXmlReg or reg name
+        :param vval: int reg value, or dict of fields: {name: val} or
+            {name: {'val': val}} as gXmlReg.set
+        :return: None
+        '''
+        mreg = self.find(vreg)
+        if isinstance(vval, collections.abc.Mapping):
+            vval = {x: y if isinstance(y, collections.abc.Mapping) else {'val': y} for x, y in vval.items()}
+        with self.lock:
+            if mreg.addr not in self.pend:
+                self.pend[mreg.addr] = [mreg, mreg.val]
+            mreg.set(vval)
+            self.nset += len(vval) if type(vval) is dict else 1
+
+    def set_bit(self, vname, vval):
+        # edit one field by its bit name, the 1st place found as gXmlParser.get_modreg
+        self.set(self.find(vname), {vname: vval})
+
+    def pairs(self):
+        # (addr, data) to write, in addr order, no-op edits dropped
+        with self.lock:
+            return [(x, self.pend[x][0].val) for x in sorted(self.pend.keys()) if self.pend[x][0].val != self.pend[x][1]]
+
+    def commit(self, vreadback=False, vwin=8, maxt=3):
+        ''' write the changed regs
+        :param vreadback: read the written regs from the device and compare
+        :param vwin: window of write_many / read_many
+        :return: list of (addr, data, err) of failed regs, [] when all done;
+            failed regs stay in the transaction, the others are removed
+        '''
+        mpairs = self.pairs()
+        mfail = []
+        if mpairs:
+            mres = self.com.write_many(mpairs, vwin=vwin, maxt=maxt)
+            mfail = [(x[0], x[1], y[1] or 'failed') for x, y in zip(mpairs, mres) if not y[0]]
+            if vreadback:
+                mdone = [x for x, y in zip(mpairs, mres) if y[0]]
+                maddrs = [x[0] for x in mdone]
+                if isinstance(self.com, gshadow.gShadow):
+                    mread = self.com.refresh(maddrs, vwin, maxt)
+                else:
+                    mread = self.com.read_many(maddrs, vwin=vwin, maxt=maxt)
+                mfail += [(x[0], x[1], 'readback {}'.format(y[1] or '0x{:08x}'.format(y[0])))
+                          for x, y in zip(mdone, mread) if y[0] != x[1]]
+        logger.info('gTrans.commit: edits = {}, regs = {}, writes = {}, failed = {}'.format(
+            self.nset, len(self.pend), len(mpairs), len(mfail)))
+        with self.lock:
+            mkeep = {x[0] for x in mfail}
+            for (addr, data) in mpairs:
+                if (addr not in mkeep) and (addr in self.pend):
+                    self.pend[addr][1] = data   # the device has it now
+            for addr in [x for x in self.pend.keys() if self.pend[x][0].val == self.pend[x][1]]:
+                del self.pend[addr]             # written, or no-op
+            self.nset = 0
+        for kfail in mfail:
+            logger.warning('gTrans.commit: {:08x} = {:08x} {}'.format(*kfail))
+        return mfail
+
+    def rollback(self):
+        # put the value before the 1st edit back to each reg
+        with self.lock:
+            for (mreg, mval) in self.pend.values():
+                mreg.set(mval)
+            self.pend = {}
+            self.nset = 0
@@ -0,0 +1,166 @@
+import time
+import threading
+from array import array
+
+import gsession
+import gshadow
+import logging
+
+logger = logging.getLogger(__name__)    # logger for inner thread message
+
+
+class gWatch:
+    ''' poll a set of addr at a fixed rate in a background thread
+        addrs: watched addr, all read by one read_many per sample
+        tims : ring of sample time, tims[k] is the time of vals[*][k]
+        vals : dict <key> addr <val> ring of data
+        oks  : dict <key> addr <val> ring of read ok flag
+    the rings are allocated by start(), memory does not grow with run time;
+    a sample which can not start before the next deadline is dropped
+    '''
+    def __init__(self, vcom, vxml=None, vrate=100.0, vdepth=1024):
+        ''' init the watch, add() addr then start()
+        :param vcom: gCom / gShadow, or gSession to share its worker
+        :param vxml: gXmlParser, to add by name and decode fields
+        :param vrate: samples per second
+        :param vdepth: samples kept per addr
+        '''
+        self.com   = vcom
+        self.xml   = vxml
+        self.rate  = vrate
+        self.depth = vdepth
+        self.addrs = []
+        self.tims  = array('d')
+        self.vals  = {}
+        self.oks   = {}
+        self.head  = 0      # samples taken, next slot is head % depth
+        self.drop  = 0      # deadlines missed
+        self.fail  = 0      # samples with a failed read
+        self.tim0  = 0.0
+        self.lock  = threading.Lock()
+        self.evt   = threading.Event()
+        self.thd   = None
+
+    def add(self, vname):
+        ''' watch a reg
+        :param vname: int addr, reg name or bit name (its reg), or module name
+        :return: None
+        '''
+        if type(vname) is int:
+            mlst = [vname]
+        elif vname in self.xml.mods:
+            mlst = [x.addr for x in self.xml.mods[vname].regs.values()]
+        else:
+            (mod_name, reg_name) = self.xml.get_modreg(vname)
+            assert reg_name is not None, 'gWatch: <{}> not found'.format(vname)
+            mlst = [self.xml.mods[mod_name].regs[reg_name].addr]
+        assert self.thd is None, 'gWatch: add() when running'
+        self.addrs.extend(x for x in mlst if x not in self.addrs)
+
+    def start(self):
+        if self.thd is None:
+            self.tims = array('d', bytes(8 * self.depth))
+            self.vals = {x: array('L', bytes(array('L').itemsize * self.depth)) for x in self.addrs}
+            self.oks  = {x: bytearray(self.depth) for x in self.addrs}
+            (self.head, self.drop, self.fail) = (0, 0, 0)
+            self.evt.clear()
+            self.thd = threading.Thread(target=self.run, name='gWatch', daemon=True)
+            self.thd.start()
+        return self
+
+    def stop(self):
+        self.evt.set()
+        if self.thd is not None:
+            self.thd.join()
+        self.thd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def read(self):
+        # one sample of all addrs: list of (data, err), never from a gShadow
+        mwin = max(1, len(self.addrs))
+        if isinstance(self.com, gsession.gSession):
+            mkw = {'vfresh': True} if isinstance(self.com.com, gshadow.gShadow) else {}
+            return self.com.read_many(self.addrs, gsession.PRI_BULK, vwin=mwin, **mkw).result()
+        if isinstance(self.com, gshadow.gShadow):
+            return self.com.read_many(self.addrs, vwin=mwin, vfresh=True)
+        return self.com.read_many(self.addrs, vwin=mwin)
+
+    def run(self):
+        # poll thread: sample at each deadline, skip deadlines already passed
+        mprd = 1.0 / self.rate
+        self.tim0 = time.perf_counter()
+        mdue = self.tim0
+        while not self.evt.is_set():
+            mnow = time.perf_counter()
+            if mnow < mdue:
+                self.evt.wait(mdue - mnow)
+                continue
+            mmiss = int((mnow - mdue) / mprd)
+            if mmiss:
+                self.drop += mmiss
+                mdue += mmiss * mprd
+            try:
+                mres = self.read()
+            except Exception as err:
+                logger.warning('Exception in gwatch.run: {}'.format(repr(err), exc_info=True))
+                mres = [(None, repr(err))] * len(self.addrs)
+            with self.lock:
+                k = self.head % self.depth
+                self.tims[k] = time.time()
+                for addr, (data, err) in zip(self.addrs, mres):
+                    self.vals[addr][k] = data if err is None else 0
+                    self.oks[addr][k] = err is None
+                self.fail += any(x[1] is not None for x in mres)
+                self.head += 1
+            mdue += mprd
+
+    def history(self, vaddr, vnum=None):
+        ''' samples kept of vaddr, oldest first
+        :param vaddr: watched addr
+        :param vnum: the last vnum samples, None: all kept
+        :return: list of (time, data), data None when read failed
+        '''
+        with self.lock:
+            mcnt = min(self.head, self.depth)
+            mcnt = mcnt if vnum is None else min(mcnt, vnum)
+            (mtim, mval, mok) = (self.tims, self.vals[vaddr], self.oks[vaddr])
+            mlst = [(self.head - mcnt + k) % self.depth for k in range(mcnt)]
+            return [(mtim[k], mval[k] if mok[k] else None) for k in mlst]
+
+    def changes(self, vaddr, vnum=None):
+        # history() of vaddr where the data differs from the sample before
+        mlst = []
+        for (mtim, data) in self.history(vaddr, vnum):
+            if (not mlst) or (data != mlst[-1][1]):
+                mlst.append((mtim, data))
+        return mlst
+
+    def fields(self, vaddr, vbit=None, vnum=None):
+        ''' decode history() of vaddr by its gXmlReg layout
+        :param vbit: field name, None: all fields
+        :return: list of (time, val) for vbit, else (time, {field name: val})
+        '''
+        (mod_name, reg_name) = self.xml.get_modreg(vaddr)
+        mreg = self.xml.mods[mod_name].regs[reg_name]
+        mlay = mreg.layout
+        mlst = self.history(vaddr, vnum)
+        if vbit is not None:
+            k = mreg.field(vbit)
+            (mmsk, lsb) = (mlay.mask[k], mlay.lsb[k])
+            return [(x, None if y is None else (y & mmsk) >> lsb) for x, y in mlst]
+        mbit = [(mreg.names[k], mlay.mask[k], mlay.lsb[k]) for k in mlay.order]
+        return [(x, None if y is None else {n: (y & m) >> l for n, m, l in mbit}) for x, y in mlst]
+
+    def stats(self):
+        ''' polling statistic
+        :return: dict: samples, dropped deadlines, failed samples,
+            rate = achieved samples per second, ask = requested rate
+        '''
+        mrun = time.perf_counter() - self.tim0 if self.head else 0.0
+        return {'samples': self.head, 'dropped': self.drop, 'failed': self.fail,
+                'rate': self.head / mrun if mrun else 0.0, 'ask': self.rate}
@@ -1,14 +1,30 @@
 import os
-import re
+import gc
+import time
+import pickle
+import hashlib
+import bisect
+import itertools
+import threading
+import weakref
+import collections.abc
+import concurrent.futures
 import xml.etree.ElementTree as ET
 import glib
+import gsearch
 import logging
+try:
+    import numpy as np
+except ImportError:
+    np = None   # only the bulk decode / encode need numpy
 
 logger = logging.getLogger(__name__)    # logger for inner thread message
 
+CACHE_VERSION = 7   # bump when gXmlMod/gXmlReg layout or cache content changes
+
 
 class gXmlMod:
-    ''' a module which contain: name, addr, regs, regs_byaddr
+    ''' a module which contain: name, addr, size, regs, regs_byaddr
         regs/regs_byaddr is an dict:
             key: name/addr which val is the same gXmlReg object
             val: gXmlReg object
@@ -20,6 +36,7 @@ class gXmlMod:
         '''
         self.name = vname
         self.addr = vaddr
+        self.size = 0       # bytes of all regs + holes
         self.regs = {}
         self.regs_byaddr = {}
 
@@ -65,6 +82,43 @@ class gXmlMod:
             mlst.append((mname, maddr))
         return sorted(mlst, key=lambda x:x[1])
 
+    def decode(self, vvals, vregs=None):
+        ''' decode many regs at once, needs numpy; regs with the same layout
+        (field positions) are decoded together by one array operation, the
+        field names are taken per reg after it
+        :param vvals: array like, shape (regs,) for a dump or (samples, regs)
+            for a trace, column k is the value of vregs[k]
+        :param vregs: list of reg name / addr, None: all regs by get_lst() order
+        :return: dict <key> reg name <val> dict <key> field name <val>
+            uint32 array, shape () for a dump or (samples,) for a trace
+        '''
+        if vregs is None:
+            vregs = [x[0] for x in self.get_lst()]
+        mregs = [self.get_reg(x) for x in vregs]
+        mvals = np.asarray(vvals)
+        assert mvals.shape[-1] == len(mregs), 'gXmlMod.decode: {} columns for {} regs'.format(mvals.shape[-1], len(mregs))
+        mgrp = {}   # layout: column index of its regs
+        for k, kreg in enumerate(mregs):
+            mgrp.setdefault(kreg.layout, []).append(k)
+        mres = {}
+        for (mlay, mcol) in mgrp.items():
+            mfld = mlay.decode(mvals[..., mcol])    # (fields, [samples,] cols)
+            for j, k in enumerate(mcol):
+                mres[mregs[k].name] = dict(zip(mregs[k].names, mfld[..., j]))
+        return {x.name: mres[x.name] for x in mregs}
+
+    def encode(self, vfields):
+        ''' build values of many regs from field arrays, the reverse of decode()
+        :param vfields: dict <key> reg name / addr <val> dict of field arrays,
+            as gXmlReg.encode, fields not given keep gXmlReg.val
+        :return: dict <key> reg name <val> uint32 array
+        '''
+        mres = {}
+        for (kreg, kfld) in vfields.items():
+            mreg = self.get_reg(kreg)
+            mres[mreg.name] = mreg.encode(kfld)
+        return mres
+
     def set_reg(self, vreg, vval):
         ''' modify an <self.regs> object's value
         set gXmlReg.bits's field value, gXmlReg is an <self.regs>'s val
@@ -76,11 +130,156 @@ class gXmlMod:
         mobj.set(vval)
 
 
+class gXmlLayout:
+    ''' an immutable field layout shared by all gXmlReg with the same field
+        positions, the field names are kept by each gXmlReg
+        msb/lsb/n/pos/mask are tuples indexed by field number
+        order: field numbers sorted by msb with high -> low
+    get a layout by gXmlLayout.get(), equal layouts are the same object while
+    a reg uses it
+    '''
+    __slots__ = ('msb', 'lsb', 'n', 'pos', 'mask', 'order', 'vecs', '__weakref__')
+    pool = weakref.WeakValueDictionary()    # (msb, lsb) -> gXmlLayout, dropped with its last reg
+
+    def __init__(self, vmsb, vlsb):
+        self.msb    = vmsb
+        self.lsb    = vlsb
+        self.n      = tuple(x - y + 1 for x, y in zip(vmsb, vlsb))
+        self.pos    = tuple('{:2d}:{:2d}'.format(x, y) if x != y else '{:5d}'.format(y) for x, y in zip(vmsb, vlsb))
+        self.mask   = tuple(((1 << x) - 1) << y for x, y in zip(self.n, vlsb))
+        self.order  = tuple(sorted(range(len(vmsb)), key=lambda k: vmsb[k], reverse=True))
+        self.vecs   = None  # by vectors(): numpy (lsb, width mask) column vectors
+
+    @classmethod
+    def get(cls, vmsb=(), vlsb=()):
+        ''' return the shared layout of fields
+        :param vmsb: tuple of field high bit location
+        :param vlsb: tuple of field low  bit location
+        :return: gXmlLayout object
+        '''
+        mkey = (vmsb, vlsb)
+        mobj = cls.pool.get(mkey)
+        if mobj is None:
+            mobj = cls(vmsb, vlsb)
+            cls.pool[mkey] = mobj
+        return mobj
+
+    def __reduce__(self):
+        # unpickle (cache, process pool) also share the layout
+        return (gXmlLayout.get, (self.msb, self.lsb))
+
+    def __len__(self):
+        return len(self.msb)
+
+    def vectors(self):
+        ''' shift / mask of all fields as numpy column vectors, made once
+        :return: (lsb, width mask), uint32 arrays of shape (fields, 1)
+        '''
+        if self.vecs is None:
+            if np is None:
+                raise ImportError('gXmlLayout: bulk decode / encode need numpy')
+            mlsb = np.array(self.lsb, dtype=np.uint32).reshape(-1, 1)
+            mmsk = np.array([(1 << x) - 1 for x in self.n], dtype=np.uint32).reshape(-1, 1)
+            self.vecs = (mlsb, mmsk)
+        return self.vecs
+
+    def decode(self, vvals):
+        ''' fields of many values at once
+        :param vvals: array like of reg values, any shape
+        :return: uint32 array of shape (fields,) + shape of vvals,
+            row k is field k (by order of names)
+        '''
+        (mlsb, mmsk) = self.vectors()
+        mvals = np.asarray(vvals).astype(np.uint32, copy=False)
+        mshape = (-1,) + (1,) * mvals.ndim
+        return (mvals[np.newaxis] >> mlsb.reshape(mshape)) & mmsk.reshape(mshape)
+
+    def encode(self, vfields, vbase=0):
+        ''' values from field arrays, the reverse of decode()
+        :param vfields: dict <key> field number <val> array like / int,
+            fields not given are taken from vbase
+        :param vbase: array like / int of the values before
+        :return: uint32 array, broadcast shape of vbase and all fields
+        '''
+        (mlsb, mmsk) = self.vectors()
+        mvals = np.array(vbase, dtype=np.uint64).astype(np.uint32)
+        for (k, kval) in vfields.items():
+            (lsb, msk) = (mlsb[k, 0], mmsk[k, 0])
+            mfld = (np.asarray(kval).astype(np.uint32, copy=False) & msk) << lsb
+            mvals = (mvals & ~(msk << lsb)) | mfld
+        return mvals
+
+
+class gXmlBit(dict):
+    ''' dict of one field of a gXmlReg, taken when made (copy / json as a dict)
+        keys: name, val, pos, msb, lsb, n; only 'val' can be set, which
+        sets the field of the reg too
+    '''
+    __slots__ = ('reg', 'k')
+    keys_all = ('name', 'val', 'pos', 'msb', 'lsb', 'n')
+
+    def __init__(self, vreg, vk):
+        mlay = vreg.layout
+        dict.__init__(self, name=vreg.names[vk], val=(vreg.val >> mlay.lsb[vk]) & ((1 << mlay.n[vk]) - 1),
+                      pos=mlay.pos[vk], msb=mlay.msb[vk], lsb=mlay.lsb[vk], n=mlay.n[vk])
+        self.reg = vreg
+        self.k   = vk
+
+    def __setitem__(self, vkey, vval):
+        if vkey != 'val':
+            raise KeyError(vkey)
+        self.reg.set({self['name']: {'val': vval}})
+        mlay = self.reg.layout
+        dict.__setitem__(self, 'val', (self.reg.val >> mlay.lsb[self.k]) & ((1 << mlay.n[self.k]) - 1))
+
+
+class gXmlBits:
+    ''' dict like view of gXmlReg.bits: <key> field name, <val> gXmlBit
+    '''
+    __slots__ = ('reg',)
+
+    def __init__(self, vreg):
+        self.reg = vreg
+
+    def __getitem__(self, vname):
+        return gXmlBit(self.reg, self.reg.field(vname))
+
+    def __contains__(self, vname):
+        return vname in self.reg.names
+
+    def __iter__(self):
+        return iter(self.reg.names)
+
+    def __len__(self):
+        return len(self.reg.names)
+
+    def __repr__(self):
+        return repr({x: self[x] for x in self})
+
+    def get(self, vname, vdef=None):
+        return self[vname] if vname in self else vdef
+
+    def keys(self):
+        return self.reg.names
+
+    def values(self):
+        return [gXmlBit(self.reg, k) for k in range(len(self.reg.names))]
+
+    def items(self):
+        return [(x, gXmlBit(self.reg, k)) for k, x in enumerate(self.reg.names)]
+
+
+collections.abc.Mapping.register(gXmlBits)     # gXmlReg.set(reg.bits)
+
+
 class gXmlReg:
-    ''' a reg which contain: name, addr, val, bits
-        bits is an 2 stage dict:
+    ''' a reg which contain: name, addr, val, rst, layout, names
+        layout is a gXmlLayout shared by regs with the same field positions,
+        names is the tuple of field names by field number of the layout,
+        each field's value is decoded from <val> on access
+        bits is a 2 stage dict like view (gXmlBits) for compatibility:
             the 1st stage dict <key> is each field's name
-                               <val> is an 2nd stage dict
+                               <val> is an 2nd stage dict (gXmlBit)
             the 2nd stage dict <key>:
                 name: <name-field>'s name
                 val : <name-field>'s value
@@ -89,6 +288,8 @@ class gXmlReg:
                 lsb : <name-field>'s low  bit location
                 n   : <name-field>'s bit number
     '''
+    __slots__ = ('name', 'addr', 'val', 'rst', 'layout', 'names')
+
     def __init__(self, vname='reg', vaddr=0):
         ''' init class member: name + addr
         :param vname: string  name
@@ -97,16 +298,28 @@ class gXmlReg:
         self.name = vname
         self.addr = vaddr
         self.val  = 0
-        self.bits = {}
-        # {name: dict{name, val, pos, msb, lsb, n}}
+        self.rst  = 0       # reset value set by init
+        self.layout = gXmlLayout.get()
+        self.names  = ()
+
+    @property
+    def bits(self):
+        return gXmlBits(self)
+
+    def field(self, vname):
+        # field number of field vname, KeyError if not a field of the reg
+        try:
+            return self.names.index(vname)
+        except ValueError:
+            raise KeyError(vname) from None
 
     def init(self, vlstdict_bit):
-        ''' init(clear + set) class member <bits>
+        ''' init(clear + set) class member <layout>, <val> and <rst>
         :param vlstdict_bit: an dict list
             dict keys: 'name, pos, rst', rst <-> bits[*]['val']
         :return: None
         '''
-        self.bits.clear()
+        mdict = {}  # name: (msb, lsb)
         mval = 0
         for vdict_bit in vlstdict_bit:
             assert 'name' in vdict_bit.keys()
@@ -114,78 +327,154 @@ class gXmlReg:
             assert 'rst'  in vdict_bit.keys()
             # print('{}'.format(vdict_bit))
 
-            mdict = {}
-            mdict['name']   = vdict_bit['name']
-            mdict['val']    = glib.str2int(vdict_bit['rst'])
             mpos = vdict_bit['pos']
             if ':' in mpos:
                 k   = mpos.index(':')
                 msb = int(mpos[0:k])
                 lsb = int(mpos[k+1:])
-                n   = msb - lsb + 1
-                gpos = '{:2d}:{:2d}'.format(msb, lsb)
             else:
                 msb = int(mpos)
                 lsb = msb
-                n   = 1
-                gpos = '{:5d}'.format(lsb)
-            mdict['msb']    = msb
-            mdict['lsb']    = lsb
-            mdict['n']      = n
-            mdict['pos']    = gpos
-            self.bits[vdict_bit['name']] = mdict
-            mval += (mdict['val'] << lsb)
+            mdict[vdict_bit['name']] = (msb, lsb)
+            mval += (glib.str2int(vdict_bit['rst']) << lsb)
+        self.names  = tuple(mdict.keys())
+        self.layout = gXmlLayout.get(tuple(x[0] for x in mdict.values()),
+                                     tuple(x[1] for x in mdict.values()))
         self.val = mval
+        self.rst = mval
 
     def __set_bit(self, vbits):
-        ''' set class member <self.bits[]['val']> & <self.val>
+        ''' set class member <self.val> by fields
         :param vbits: 2 stage dict similar with <self.bits>
                vbits can be a subset of <self.bits>
         :return: None
         '''
         mval = self.val
+        mlay = self.layout
         for mkey in vbits.keys():
-            assert mkey  in self.bits.keys()
+            assert mkey  in self.names
             assert 'val' in vbits[mkey].keys()
 
-            kval = vbits[mkey]['val']
-            self.bits[mkey]['val'] = kval
-            msb = self.bits[mkey]['msb']
-            lsb = self.bits[mkey]['lsb']
-            mval = glib.hset(mval, msb, lsb, kval)
+            k = self.field(mkey)
+            mval = glib.hset(mval, mlay.msb[k], mlay.lsb[k], vbits[mkey]['val'])
         self.val = mval
 
     def __set_val(self, vval):
-        ''' set class member <self.bits[]['val']> & <self.val>
+        ''' set class member <self.val>, fields are decoded from it
         :param vval: integer number
         :return: None
         '''
         self.val = vval
-        for mkey in self.bits.keys():
-            lsb = self.bits[mkey]['lsb']
-            n   = self.bits[mkey]['n']
-            kval = int(vval >> lsb) & ((1 << n) - 1)
-            self.bits[mkey]['val'] = kval
 
     def get(self):
         ''' get <self.val> & <self.bits>
-        :return:
+        :return: (val, dict of field name: dict of the field), a copy which
+            does not change with later set()
         '''
-        return self.val, self.bits
+        return self.val, {x: dict(y) for x, y in self.bits.items()}
 
     def set(self, vval):
-        ''' set class member <self.bits[]['val']> & <self.val>
-        :param vval: type int or self.bits
+        ''' set class member <self.val>
+        :param vval: type int or self.bits (any mapping of the same form)
         :return: None
         '''
-        assert (type(vval) is int) or (type(vval) is dict)
-        if type(vval) is int : self.__set_val(vval)
-        if type(vval) is dict: self.__set_bit(vval)
+        assert (type(vval) is int) or isinstance(vval, collections.abc.Mapping)
+        if type(vval) is int: self.__set_val(vval)
+        else                : self.__set_bit(vval)
 
     def get_lst(self):
         # lst: item = (<dict>bit), sorted by msb with high -> low
-        mlst = self.bits.values()
-        return sorted(mlst, key=lambda x:int(x['msb']), reverse=True)
+        return [gXmlBit(self, k) for k in self.layout.order]
+
+    def decode(self, vvals):
+        ''' decode many values of this reg at once (a trace), needs numpy
+        :param vvals: array like of reg values
+        :return: dict <key> field name <val> uint32 array, shape of vvals
+        '''
+        mfld = self.layout.decode(vvals)
+        return dict(zip(self.names, mfld))
+
+    def encode(self, vfields, vbase=None):
+        ''' build values from field arrays, the reverse of decode()
+        :param vfields: dict <key> field name <val> array like / int
+        :param vbase: values of the fields not given, None: <self.val>
+        :return: uint32 array
+        '''
+        mfld = {self.field(x): y for x, y in vfields.items()}
+        return self.layout.encode(mfld, self.val if vbase is None else vbase)
+
+
+class gXmlMods(collections.abc.Mapping):
+    ''' lazy gXmlParser.mods: each gXmlMod is parsed on first access
+        files: dict <key> mod name <val> module xml file, by order of mods_file,
+            or the pickled gXmlMod of a cache load (parse_modu_blob)
+        done : dict <key> mod name <val> gXmlMod, None when it has no reg
+    keys are all modules found in files, as listed before they are parsed; a
+    module without reg is an empty gXmlMod, loaded() drops it as an eager load
+    does; values()/items() parse all
+    '''
+    def __init__(self, vfiles, vdict_modu, vparse):
+        self.files = vfiles
+        self.modu  = vdict_modu
+        self.parse = vparse     # gXmlParser.parse_modu_xml / parse_modu_iter
+        self.done  = {}
+        self.busy  = {}         # mod name: Future of the parse running
+        self.lock  = threading.Lock()
+
+    def load(self, vname):
+        ''' parse module vname once, wait if another thread is parsing it
+        :return: gXmlMod or None
+        '''
+        with self.lock:
+            if vname in self.done:
+                return self.done[vname]
+            mfut = self.busy.get(vname)
+            mown = mfut is None
+            if mown:
+                mfut = self.busy[vname] = concurrent.futures.Future()
+        if not mown:
+            return mfut.result()
+        mmod = None
+        try:
+            mmod = self.parse(self.files[vname], self.modu)
+            if mmod and not len(mmod.regs):
+                mmod = None
+        except Exception as err:
+            logger.warning('Exception in gxml.load: {}'.format(repr(err), exc_info=True))
+        with self.lock:
+            self.done[vname] = mmod
+            del self.busy[vname]
+        mfut.set_result(mmod)
+        return mmod
+
+    def __getitem__(self, vname):
+        if vname not in self.files:
+            raise KeyError(vname)
+        mmod = self.done.get(vname) or self.load(vname)
+        if mmod is None:
+            return gXmlMod(vname, self.modu.get(vname, 0))
+        return mmod
+
+    def __iter__(self):
+        return iter(list(self.files))
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, vname):
+        return vname in self.files
+
+    def loaded(self):
+        # dict of the parsed modules with regs, by order of files
+        for x in self.files:
+            self.load(x)
+        return {x: self.done[x] for x in self.files if self.done[x] is not None}
+
+    def values(self):
+        return self.loaded().values()
+
+    def items(self):
+        return self.loaded().items()
 
 
 class gXmlParser:
@@ -200,6 +489,27 @@ class gXmlParser:
         self.mods_name  = {}    # by once   parse_root_xml: 'modu_name': modu_addr
         self.mods       = {}    # by itered parse_modu_xml: 'modu_name': gXmlMod
         self.strs       = []    # by once   collect       : list of (name, addr) pair, name = all reg.name, bit.name
+        self.mods_path  = {}    # by itered trav_modu_lst : 'file_name': found file path
+        self.cache_en   = True  # load/save the parsed database from/to cache_file()
+        self.search     = []    # extra dirs searched for module xml after self.path
+        self.files_idx  = None  # by once   index_file    : 'file_name': file path
+        self.jobs       = 0     # parse module xml in <jobs> processes, 0: serial, None: cpu count
+        self.stream     = False # parse xml with iterparse instead of the whole DOM
+        self.addr_regs  = []    # by once   index_addr    : sorted reg.addr
+        self.addr_refs  = []    # by once   index_addr    : (mod_name, reg_name) of addr_regs
+        self.addr_mods  = []    # by once   index_addr    : sorted mod.addr
+        self.addr_ends  = []    # by once   index_addr    : (mod end addr, mod_name) of addr_mods
+        self.addr_reach = []    # by once   index_addr    : max mod end addr of addr_ends[0:k+1]
+        self.name_idx   = {}    # by once   index_name    : 'name': list of (mod_name, reg_name, bit_name)
+        self.finder     = gsearch.gSearch()     # by once index: search engine over self.strs
+        self.strs_num   = {}    # by once   index         : 'modu_name': number of its pairs in self.strs
+        self.lazy       = False # load: parse the root xml only, modules on access + prefetch thread
+        self.prefetch   = None  # by lazy load: thread parsing all modules, None when done
+        self.notify     = None  # lazy load: called by the prefetch thread when done, e.g. a Qt signal emit
+        self.lock       = threading.Lock()  # lazy load: swap of mods / indexes by prefetch
+        self.mods_src   = {}    # by itered trav_modu_lst : found file path: 'modu_name' parsed from it
+        self.prints     = {}    # by load / reload        : file path: fingerprint of root xml + found module xml
+        self.blobs      = {}    # by load_cache           : 'strs'/'name_idx'/'regs': pickled, unpickled by wait()
 
     def set(self, vfilepath):
         logger.info('gXmlParser.set: vfilepath = {}'.format(vfilepath))
@@ -208,9 +518,396 @@ class gXmlParser:
     def load(self):
         mfile = os.path.join(self.path, self.file)
         assert os.path.exists(mfile)
+        self.blobs = {}
+        self.wait()
+        if self.cache_en and self.load_cache():
+            return      # indexes are in the cache too
         self.parse_root_xml(mfile)
+        if self.lazy:
+            self.load_lazy()
+            return
         self.trav_modu_lst()
         self.collect()
+        self.prints = self.take_prints()
+        self.index()
+        if self.cache_en:
+            self.save_cache()
+
+    def load_lazy(self):
+        ''' after parse_root_xml: map module names to files, set self.mods to a
+        gXmlMods and start the prefetch thread, which parses the modules by
+        address order, then collect / index / save_cache as load()
+        until then: get_modreg(int) finds the module by the root address table,
+        name lookups (get_modreg(str), find_name, filter, fuzzy) wait for it;
+        a UI checks self.prefetch and queues them until self.notify is called
+        :return: None
+        '''
+        self.mods_path.clear()
+        self.index_file()
+        mfiles = {}
+        for x in self.mods_file:
+            mfile = self.find_file(x)
+            if mfile:
+                self.mods_path[x] = mfile
+                mname = self.peek_modu_name(mfile, self.mods_name)
+                if mname is not None:
+                    mfiles[mname] = mfile   # as trav_modu_lst: the last file of a name wins
+        mparse = self.parse_modu_iter if self.stream else self.parse_modu_xml
+        self.mods = gXmlMods(mfiles, self.mods_name, mparse)
+        self.mods_src = {y: x for x, y in mfiles.items()}
+        self.prints = self.take_prints()
+        self.strs.clear()
+        # module ranges of the root table: a module reaches the next one
+        maddr = sorted((self.mods_name[x], x) for x in mfiles)
+        self.addr_regs  = []
+        self.addr_refs  = []
+        self.addr_mods  = [x[0] for x in maddr]
+        self.addr_ends  = [(y[0], x[1]) for x, y in zip(maddr, maddr[1:] + [(1 << 32, None)])]
+        self.addr_reach = [x[0] for x in self.addr_ends]
+        self.name_idx   = {}
+        self.finder.load([])
+        self.prefetch = threading.Thread(target=self.run_prefetch, args=([x[1] for x in maddr],),
+                                         name='gXmlParser.prefetch', daemon=True)
+        self.prefetch.start()
+
+    def run_prefetch(self, vnames):
+        # prefetch thread: parse vnames in order, then build all as load()
+        tim0 = time.time()
+        try:
+            for x in vnames:
+                self.mods.load(x)
+            with self.lock:
+                self.mods = self.mods.loaded()
+                self.collect()
+                self.index()
+            if self.cache_en:
+                self.save_cache()
+            logger.info('prefetch: mods = {}, {:.3f}s'.format(len(self.mods), time.time() - tim0))
+        except Exception as err:
+            logger.warning('Exception in gxml.run_prefetch: {}'.format(repr(err), exc_info=True))
+        finally:
+            self.prefetch = None
+            if self.notify is not None:
+                self.notify()
+
+    def wait(self):
+        # wait the prefetch thread of lazy load done, unpickle strs / name_idx
+        # of a cache load: name lookups need them, a start or addr lookup not
+        mthd = self.prefetch
+        if mthd is not None:
+            mthd.join()
+        if self.blobs:
+            with self.lock:
+                if self.blobs:
+                    mgc = gc.isenabled()
+                    gc.disable()    # many small objects, no cycle: gc passes are waste
+                    try:
+                        self.strs = pickle.loads(self.blobs.pop('strs'))
+                        self.name_idx = pickle.loads(self.blobs.pop('name_idx'))
+                        self.finder.load(self.strs, pickle.loads(self.blobs.pop('regs')),
+                                         [self.strs_num[x] for x in self.mods])
+                    finally:
+                        if mgc:
+                            gc.enable()
+
+    def take_prints(self):
+        # fingerprint of the root xml and all found module xml
+        mfiles = [os.path.join(self.path, self.file)] + list(self.mods_path.values())
+        return {x: self.fingerprint(x) for x in mfiles}
+
+    def changed(self):
+        ''' files changed since the last load / reload, by check_fingerprint
+        :return: list of file path, the root xml 1st when it changed
+        '''
+        return [x for x, y in list(self.prints.items()) if not self.check_fingerprint(x, y)]
+
+    def reload(self):
+        ''' reparse the module xml changed since the last load / reload only,
+        patch mods, strs and the indexes in place; the time is by the changed
+        files, not by the whole chip; a changed root xml is a full load()
+        mods / strs keep the order of a fresh load (by mods_file), and a reg
+        at the same addr keeps its value (a reload is not a reset)
+        the search index of self.finder is patched by module: the next search
+        indexes the changed modules only
+        :return: list of mod names removed / reparsed, None when full load
+        '''
+        self.wait()
+        mfiles = self.changed()
+        if os.path.join(self.path, self.file) in mfiles:
+            logger.info('reload: root xml changed, full load')
+            self.load()
+            return None
+        if mfiles and isinstance(self.mods, gXmlMods):
+            self.mods = self.mods.loaded()  # of a cache load, patched in place below
+        mparse = self.parse_modu_iter if self.stream else self.parse_modu_xml
+        mrank = {y: k for k, y in enumerate(self.mods_path.values())}
+        mnames = []
+        for kfile in mfiles:
+            mprint = self.fingerprint(kfile)
+            mmod = None
+            if mprint is not None:
+                try:
+                    mmod = mparse(kfile, self.mods_name)
+                except Exception as err:
+                    logger.warning('Exception in gxml.reload: {}'.format(repr(err), exc_info=True))
+                    continue    # half written file: keep the old one, retry next reload
+            if (mmod is not None) and not len(mmod.regs):
+                mmod = None
+            mold = self.mods_src.pop(kfile, None)
+            mvals = {x.addr: x.val for x in self.mods[mold].regs.values()} if mold in self.mods else {}
+            if mold in self.mods:
+                self.drop_mod(mold)
+            if (mmod is not None) and (mmod.name in self.mods):
+                self.drop_mod(mmod.name)    # moved here from another file
+            if mmod is not None:
+                for kreg in mmod.regs.values():
+                    if kreg.addr in mvals:
+                        kreg.set(mvals[kreg.addr])
+                # place of a fresh load: after the modules of the files before
+                msrc = {y: x for x, y in self.mods_src.items()}
+                mpos = sum(1 for x in self.mods if mrank.get(msrc.get(x), -1) < mrank[kfile])
+                self.add_mod(mmod, mpos)
+                self.mods_src[kfile] = mmod.name
+            self.prints[kfile] = mprint
+            mnames.extend(x for x in (mold, mmod and mmod.name) if (x is not None) and (x not in mnames))
+        if mnames:
+            if self.cache_en:
+                self.save_cache()
+        logger.info('reload: files = {}, mods = {}'.format(len(mfiles), mnames))
+        return mnames
+
+    def drop_mod(self, vname):
+        ''' remove a module from mods, strs and the indexes
+        :return: list of its pairs removed from strs
+        '''
+        mmod = self.mods[vname]
+        mkeys = list(self.mods.keys())
+        mpos = mkeys.index(vname)
+        k = sum(self.strs_num[x] for x in mkeys[:mpos])
+        mnum = self.strs_num.pop(vname)
+        mstrs = self.strs[k:k+mnum]
+        del self.mods[vname]
+        del self.strs[k:k+mnum]
+        self.finder.drop(mpos)
+        if mmod.regs:
+            # the regs of a module are one addr range of the index
+            maddr = [x.addr for x in mmod.regs.values()]
+            lo = bisect.bisect_left(self.addr_regs, min(maddr))
+            hi = bisect.bisect_right(self.addr_regs, max(maddr))
+            mkeep = [j for j in range(lo, hi) if self.addr_refs[j][0] != vname]
+            self.addr_regs[lo:hi] = [self.addr_regs[j] for j in mkeep]
+            self.addr_refs[lo:hi] = [self.addr_refs[j] for j in mkeep]
+        j = bisect.bisect_left(self.addr_mods, mmod.addr)
+        if (j < len(self.addr_mods)) and (self.addr_ends[j][1] == vname):
+            del self.addr_mods[j]
+            del self.addr_ends[j]
+        self.addr_reach = list(itertools.accumulate((x[0] for x in self.addr_ends), max))
+        mrank = {x: k for k, x in enumerate(self.mods.keys())}
+        for (kname, null) in mstrs:
+            mlst = [x for x in self.name_idx.get(kname, []) if x[0] != vname]
+            if mlst:
+                self.name_idx[kname] = mlst
+            else:
+                self.name_idx.pop(kname, None)
+            if (kname.lower() in self.finder.regs) and not any(x[2] is None for x in mlst):
+                # a bit name of the other modules is no more a reg name
+                self.finder.regs.discard(kname.lower())
+                for x in mlst:
+                    self.finder.reclass(mrank[x[0]])
+        return mstrs
+
+    def add_mod(self, vmod, vpos=None):
+        ''' put a module to mods, strs and the indexes, as index() would
+        :param vpos: index in mods, None: at the end
+        :return: list of its pairs put to strs
+        '''
+        mitems = list(self.mods.items())
+        mpos = len(mitems) if vpos is None else vpos
+        k = sum(self.strs_num[x] for x, null in mitems[:mpos])
+        mitems.insert(mpos, (vmod.name, vmod))
+        self.mods.clear()
+        self.mods.update(mitems)
+        mstrs = self.mod_strs(vmod)
+        self.strs[k:k] = mstrs
+        self.strs_num[vmod.name] = len(mstrs)
+        self.finder.insert(mpos, len(mstrs))
+        mregs = {}
+        for kreg in vmod.regs.values():
+            mregs.setdefault(kreg.addr, (vmod.name, kreg.name))
+        mend = max([vmod.addr + vmod.size] + [x + 4 for x in mregs])
+        if mregs:
+            # merge into the addr range, an addr already indexed keeps its reg
+            lo = bisect.bisect_left(self.addr_regs, min(mregs))
+            hi = bisect.bisect_right(self.addr_regs, max(mregs))
+            for j in range(lo, hi):
+                mregs[self.addr_regs[j]] = self.addr_refs[j]
+            maddr = sorted(mregs.keys())
+            self.addr_regs[lo:hi] = maddr
+            self.addr_refs[lo:hi] = [mregs[x] for x in maddr]
+        j = bisect.bisect_left(self.addr_mods, vmod.addr)
+        if (j == len(self.addr_mods)) or (self.addr_mods[j] != vmod.addr):
+            self.addr_mods.insert(j, vmod.addr)
+            self.addr_ends.insert(j, (mend, vmod.name))
+        self.addr_reach = list(itertools.accumulate((x[0] for x in self.addr_ends), max))
+        # name places are by module order, regs of a module before its bits
+        mrank = {x: k for k, x in enumerate(self.mods.keys())}
+        mplace = [(x.name, (vmod.name, x.name, None)) for x in vmod.regs.values()]
+        mplace += [(y, (vmod.name, x.name, y)) for x in vmod.regs.values() for y in x.bits.keys()]
+        mnames = set()
+        for (kname, kref) in mplace:
+            self.name_idx.setdefault(kname, []).append(kref)
+            mnames.add(kname)
+        for kname in mnames:
+            self.name_idx[kname].sort(key=lambda x: (mrank[x[0]], x[2] is not None))
+        for kreg in vmod.regs.values():
+            if kreg.name.lower() not in self.finder.regs:
+                # a bit name of the other modules is now a reg name too
+                self.finder.regs.add(kreg.name.lower())
+                for x in self.name_idx[kreg.name]:
+                    if x[0] != vmod.name:
+                        self.finder.reclass(mrank[x[0]])
+        return mstrs
+
+    @staticmethod
+    def mod_strs(vmod):
+        # the part of self.strs of a module, as collect()
+        mlst = []
+        for kreg in vmod.regs.values():
+            mlst.append((kreg.name, kreg.addr))
+            for kbit in kreg.bits.keys():
+                mlst.append((kbit, kreg.addr))
+        return mlst
+
+    @staticmethod
+    def cache_dir():
+        # per user cache dir: the cache is a pickle, never load one another user can write
+        mbase = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(mbase, 'gxml')
+
+    def cache_file(self):
+        # cache file of the root xml, in cache_dir(), named by the root xml path
+        mroot = os.path.abspath(os.path.join(self.path, self.file))
+        mhash = hashlib.sha1(os.path.normcase(mroot).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir(), '{}.{}.cache'.format(self.file, mhash))
+
+    def fingerprint(self, vfile):
+        ''' fingerprint of a xml file used to validate the cache
+        :param vfile: file path
+        :return: (mtime_ns, size, sha1) or None if file not exists
+        '''
+        try:
+            mstat = os.stat(vfile)
+            with open(vfile, 'rb') as fr:
+                mhash = hashlib.sha1(fr.read()).hexdigest()
+        except OSError:
+            return None
+        return (mstat.st_mtime_ns, mstat.st_size, mhash)
+
+    def check_fingerprint(self, vfile, vprint):
+        ''' check vfile is unchanged since vprint was taken
+        mtime+size equal -> unchanged, else size equal -> compare sha1
+        :param vfile: file path
+        :param vprint: (mtime_ns, size, sha1) or None
+        :return: True if unchanged
+        '''
+        try:
+            mstat = os.stat(vfile)
+        except OSError:
+            return vprint is None
+        if vprint is None:
+            return False
+        if (mstat.st_mtime_ns == vprint[0]) and (mstat.st_size == vprint[1]):
+            return True
+        if mstat.st_size != vprint[1]:
+            return False
+        mprint = self.fingerprint(vfile)
+        return (mprint is not None) and (mprint[2] == vprint[2])
+
+    def load_cache(self):
+        ''' load mods/mods_name/strs and the indexes from cache_file()
+        each gXmlMod is unpickled on 1st access (gXmlMods), strs and name_idx
+        by the 1st name lookup (wait()), so a start costs the file read only
+        :return: True if the cache is valid and loaded, else False
+        '''
+        mcache = self.cache_file()
+        if not os.path.isfile(mcache):
+            return False
+        try:
+            with open(mcache, 'rb') as fr:
+                mdata = pickle.load(fr)
+            if mdata.get('version') != CACHE_VERSION:
+                logger.info('load_cache: version {} != {}'.format(mdata.get('version'), CACHE_VERSION))
+                return False
+            mroot = os.path.join(self.path, self.file)
+            if not self.check_fingerprint(mroot, mdata['root']):
+                logger.info('load_cache: {} changed'.format(mroot))
+                return False
+            for kfile, kprint in mdata['files'].items():
+                if not self.check_fingerprint(kfile, kprint):
+                    logger.info('load_cache: {} changed'.format(kfile))
+                    return False
+            if mdata['missing']:
+                # an include not found at save time may be there now
+                self.index_file()
+                for kname in mdata['missing']:
+                    if self.files_idx.get(kname):
+                        logger.info('load_cache: {} found'.format(kname))
+                        return False
+        except Exception as err:
+            logger.warning('Exception in gxml.load_cache: {}'.format(repr(err), exc_info=True))
+            return False
+        self.mods_file  = mdata['mods_file']
+        self.mods_name  = mdata['mods_name']
+        self.mods_path  = mdata['mods_path']
+        self.mods       = gXmlMods(mdata['mods'], self.mods_name, self.parse_modu_blob)
+        self.strs       = []
+        self.name_idx   = {}
+        self.blobs      = {x: mdata[x] for x in ('strs', 'name_idx', 'regs')}
+        self.strs_num   = mdata['strs_num']
+        (self.addr_regs, self.addr_refs, self.addr_mods, self.addr_ends, self.addr_reach) = mdata['addr']
+        self.finder.load([])
+        self.mods_src   = mdata['mods_src']
+        self.prints     = dict(mdata['files'])
+        self.prints[mroot] = mdata['root']
+        logger.info('load_cache: {}, mods = {}'.format(mcache, len(self.mods)))
+        return True
+
+    def save_cache(self):
+        ''' save mods/mods_name/strs and the indexes to cache_file() with
+        fingerprints of the root xml and all found module xml files
+        each gXmlMod, strs and name_idx are pickled apart, see load_cache()
+        :return: True if saved
+        '''
+        mcache = self.cache_file()
+        mdump = lambda x: pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
+        mdata = {
+            'version'   : CACHE_VERSION,
+            'root'      : self.prints.get(os.path.join(self.path, self.file)),
+            'files'     : {x: self.prints.get(x) for x in self.mods_path.values()},
+            'missing'   : [x for x in self.mods_file if x not in self.mods_path],
+            'mods_file' : self.mods_file,
+            'mods_name' : self.mods_name,
+            'mods_path' : self.mods_path,
+            'mods_src'  : self.mods_src,
+            'mods'      : {x: mdump(y) for x, y in self.mods.items()},
+            'strs'      : mdump(self.strs),
+            'name_idx'  : mdump(self.name_idx),
+            'regs'      : mdump(sorted(self.finder.regs)),
+            'strs_num'  : self.strs_num,
+            'addr'      : (self.addr_regs, self.addr_refs, self.addr_mods, self.addr_ends, self.addr_reach),
+        }
+        try:
+            os.makedirs(os.path.dirname(mcache), exist_ok=True)
+            mtemp = mcache + '.tmp'
+            with open(mtemp, 'wb') as fw:
+                pickle.dump(mdata, fw, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(mtemp, mcache)
+        except OSError as err:
+            # cache dir may be read only, just parse xml next time
+            logger.warning('save_cache: {} failed, {}'.format(mcache, repr(err)))
+            return False
+        logger.info('save_cache: {}'.format(mcache))
+        return True
 
     def parse_root_xml(self, vfile):
         # archive
@@ -219,8 +916,11 @@ class gXmlParser:
         self.mods_file.clear()
         self.mods_name.clear()
 
-        mtree = ET.parse(vfile)
-        mroot = mtree.getroot()
+        if self.stream:
+            mroot = self.iter_root_child(vfile)
+        else:
+            mtree = ET.parse(vfile)
+            mroot = mtree.getroot()
         for x in mroot:
             if 'include' in x.tag:
                 assert 'file' in x.attrib.keys()
@@ -235,7 +935,8 @@ class gXmlParser:
                 self.mods_name[name] = int(addr, 16)
                 logger.info('parse_root modu: {} = {}'.format(name, addr))
 
-    def parse_modu_xml(self, vfile, vdict_modu):
+    @staticmethod
+    def parse_modu_xml(vfile, vdict_modu):
         # archive
         # -> module
         #    -> reg
@@ -275,27 +976,175 @@ class gXmlParser:
             elif 'hole' in x.tag:
                 assert 'size' in x.attrib.keys()
                 reg_addr += int(eval(x.attrib['size'])/8)
+        mmod.size = reg_addr - mod_addr
+        return mmod
+
+    @staticmethod
+    def parse_modu_blob(vblob, vdict_modu):
+        # gXmlMod pickled by save_cache, as parse_modu_xml for gXmlMods
+        return pickle.loads(vblob)
+
+    @staticmethod
+    def peek_modu_name(vfile, vdict_modu):
+        ''' name of the module in vfile which is in vdict_modu, stop parsing
+        at its <module> start tag
+        :return: mod name or None
+        '''
+        mparser = ET.XMLPullParser(events=('start', 'end'))
+        depth = 0
+        with open(vfile, 'rb') as fr:
+            # small chunks: the <module> tag is near the head of the file
+            for mbyte in iter(lambda: fr.read(1024), b''):
+                mparser.feed(mbyte)
+                for event, elem in mparser.read_events():
+                    if event == 'end':
+                        depth -= 1
+                        continue
+                    depth += 1
+                    if (depth == 2) and (elem.tag == 'module') and elem.attrib.get('name'):
+                        if elem.attrib['name'].lower() in vdict_modu.keys():
+                            return elem.attrib['name'].lower()
+        return None
+
+    @staticmethod
+    def iter_root_child(vfile):
+        ''' yield each child of the root element when it is closed,
+        the child is cleared after yield to bound the memory
+        :param vfile: xml file
+        :return: generator of Element
+        '''
+        with open(vfile, 'rb') as fr:
+            depth = 0
+            mroot = None
+            for event, elem in ET.iterparse(fr, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        mroot = elem
+                    continue
+                depth -= 1
+                if depth == 1:
+                    yield elem
+                    mroot.clear()
+
+    @staticmethod
+    def parse_modu_iter(vfile, vdict_modu):
+        ''' same as parse_modu_xml, but build gXmlReg when </reg> closes and
+        clear the processed elements, so the whole DOM is never in memory
+        :param vfile: module xml file
+        :param vdict_modu: 'modu_name': modu_addr
+        :return: gXmlMod or None
+        '''
+        logger.info('{}'.format(vfile))
+        mmod = None
+        with open(vfile, 'rb') as fr:
+            depth = 0
+            xmod = None     # the matched <module> element
+            for event, elem in ET.iterparse(fr, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if (depth == 2) and (mmod is None) and (elem.tag == 'module') and elem.attrib.get('name'):
+                        mod_name = elem.attrib.get('name').lower()
+                        if mod_name in vdict_modu.keys():
+                            xmod = elem
+                            mmod = gXmlMod(mod_name, vdict_modu[mod_name])
+                            reg_addr = mmod.addr
+                    continue
+                depth -= 1
+                if xmod is None:
+                    if depth >= 1:
+                        elem.clear()
+                elif depth == 1:
+                    break   # </module> closed
+                elif depth == 2:
+                    x = elem
+                    if 'reg' in x.tag:
+                        lst_bit = []
+                        for y in x:
+                            if 'bits' == y.tag.lower():
+                                assert 'name' in y.attrib.keys()
+                                assert 'pos' in y.attrib.keys()
+                                assert 'rst' in y.attrib.keys()
+                                lst_bit.append(y.attrib)
+                        mXmlReg = gXmlReg(x.attrib['name'], reg_addr)
+                        mXmlReg.init(lst_bit)
+                        mmod.insert(mXmlReg)
+                        reg_addr += 4
+                    elif 'hole' in x.tag:
+                        assert 'size' in x.attrib.keys()
+                        reg_addr += int(eval(x.attrib['size'])/8)
+                    xmod.clear()
+                    mmod.size = reg_addr - mmod.addr
+                elif depth == 3 and 'bits' == elem.tag.lower():
+                    # keep attrib for </reg>, drop <comment> etc
+                    del elem[:]
+                    elem.text = None
+                elif depth >= 3:
+                    elem.clear()
+        if mmod is None:
+            logger.warning('{}\n\tmodule name not in top file'.format(vfile))
         return mmod
 
     def trav_modu_lst(self):
-        self.mods.clear()
+        self.mods = {}
+        self.mods_path.clear()
+        self.index_file()
         for x in self.mods_file:
             #. mfile = os.path.join(self.path, 'module_xml', x)
             mfile = self.find_file(x)
             if mfile:   #os.path.exists(mfile):
-                mmod = self.parse_modu_xml(mfile, self.mods_name)
-                if mmod and len(mmod.regs):
-                    logger.info('mod: {}'.format(mmod.name))
-                    self.mods[mmod.name] = mmod
+                self.mods_path[x] = mfile
+        mjobs = os.cpu_count() if self.jobs is None else self.jobs
+        mfiles = list(self.mods_path.values())
+        mparse = self.parse_modu_iter if self.stream else self.parse_modu_xml
+        if (mjobs > 1) and (len(mfiles) > 1):
+            # parse in process pool, map keep the order of self.mods_file
+            with concurrent.futures.ProcessPoolExecutor(min(mjobs, len(mfiles))) as mpool:
+                mchunk = max(1, len(mfiles) // (mjobs * 4))
+                mlst = list(mpool.map(mparse, mfiles, [self.mods_name] * len(mfiles), chunksize=mchunk))
+        else:
+            mlst = [mparse(x, self.mods_name) for x in mfiles]
+        self.mods_src.clear()
+        for mfile, mmod in zip(mfiles, mlst):
+            if mmod and len(mmod.regs):
+                logger.info('mod: {}'.format(mmod.name))
+                self.mods[mmod.name] = mmod
+                self.mods_src[mfile] = mmod.name
+
+    def index_file(self):
+        ''' walk self.path and self.search once, set self.files_idx
+        duplicate file name: 1st dir in [self.path] + self.search wins,
+            inside one dir the shallowest one wins, then sorted by path
+        :return: dict 'file_name': file path
+        '''
+        self.files_idx = {}
+        mdups = {}
+        for kdir in [self.path] + [x for x in self.search if x != self.path]:
+            mlvl = {}   # 'file_name': [(depth, file path)]
+            for root, dirs, files in os.walk(kdir):
+                depth = root[len(kdir):].count(os.sep)
+                for kname in files:
+                    mlvl.setdefault(kname, []).append((depth, os.path.join(root, kname)))
+            for kname, klst in mlvl.items():
+                klst.sort()
+                if kname not in self.files_idx:
+                    self.files_idx[kname] = klst[0][1]
+                if len(klst) > 1 or self.files_idx[kname] != klst[0][1]:
+                    mdups.setdefault(kname, {self.files_idx[kname]}).update(x[1] for x in klst)
+        for kname, klst in mdups.items():
+            if kname in self.mods_file:
+                logger.warning('mod file: {} duplicated, use {}\n\t{}'.format(kname, self.files_idx[kname], sorted(klst)))
+        return self.files_idx
 
     def find_file(self, vname):
-        for root, dirs, files in os.walk(self.path):
-            if vname in files:
-                logger.info('mod file: {}, -> {}'.format(vname, root))
-                return os.path.join(root, vname)
+        if self.files_idx is None:
+            self.index_file()
+        mfile = self.files_idx.get(vname)
+        if mfile:
+            logger.info('mod file: {}, -> {}'.format(vname, os.path.dirname(mfile)))
         else:
             logger.info('mod file: {} not found'.format(vname))
-            return None
+        return mfile
 
     def collect(self):
         ''' set self.strs with all regs.name and all bits.name
@@ -308,50 +1157,233 @@ class gXmlParser:
                 for kbit in kreg.bits.keys():
                     self.strs.append((kbit, kreg.addr))
 
-    def filter(self, vprtn):
+    def filter(self, vprtn, vmax=None):
         ''' filter self.strs with partern
-        :param vprtn: patern
+        :param vprtn: patern, plain substring or regex
+        :param vmax: return at most vmax strs, None: all
         :return: list strs
         '''
         mlst = []
+        self.wait()
         try:
-            for kstr in self.strs:
-                if re.search(vprtn, kstr[0], re.I):
-                    mlst.append(kstr)
+            mlst = self.finder.search(vprtn, vmax)
             logger.info('filter: {}, pre = {}, pst = {}'.format(vprtn, len(self.strs), len(mlst)))
         except Exception as err:
             logger.warning('Exception in gxml.filter: {}'.format(repr(err), exc_info=True))
         return mlst
 
+    def fuzzy(self, vprtn, vnum=100):
+        ''' rank self.strs by fuzzy match with vprtn
+        :param vprtn: query, chars in order
+        :param vnum: return the best vnum strs
+        :return: list strs, best first
+        '''
+        mlst = []
+        self.wait()
+        try:
+            mlst = self.finder.fuzzy(vprtn, vnum)
+            logger.info('fuzzy: {}, pre = {}, pst = {}'.format(vprtn, len(self.strs), len(mlst)))
+        except Exception as err:
+            logger.warning('Exception in gxml.fuzzy: {}'.format(repr(err), exc_info=True))
+        return mlst
+
+    def get_mod(self, vname):
+        ''' module vname of get_lst, a module without reg is an empty gXmlMod:
+        a lazy load lists it before it is parsed
+        :return: gXmlMod
+        '''
+        mmod = self.mods.get(vname)
+        return mmod if mmod is not None else gXmlMod(vname, self.mods_name.get(vname, 0))
+
     def get_lst(self):
         # lst: item = (modu_name, modu_addr), sorted by addr
+        # the addr of the root xml, so a lazy load does not parse the modules
         mlst = []
         for name in self.mods:
-            mlst.append((name, self.mods[name].addr))
+            mlst.append((name, self.mods_name[name]))
         return sorted(mlst, key=lambda x:x[1])
 
+    def index(self):
+        # build lookup indexes after self.mods is loaded
+        self.index_addr()
+        self.index_name()
+        self.strs_num = {x.name: sum(1 + len(y.layout) for y in x.regs.values()) for x in self.mods.values()}
+        self.finder.load(self.strs, (y.name for x in self.mods.values() for y in x.regs.values()),
+                         [self.strs_num[x] for x in self.mods])
+
+    def index_addr(self):
+        ''' build sorted address index of regs and module ranges
+        same addr in several modules: the 1st module in self.mods wins
+        :return: None
+        '''
+        mregs = {}
+        mmods = {}
+        for kmod in self.mods.values():
+            mend = kmod.addr + kmod.size
+            for kreg in kmod.regs.values():
+                mregs.setdefault(kreg.addr, (kmod.name, kreg.name))
+                mend = max(mend, kreg.addr + 4)
+            mmods.setdefault(kmod.addr, (mend, kmod.name))
+        self.addr_regs = sorted(mregs.keys())
+        self.addr_refs = [mregs[x] for x in self.addr_regs]
+        self.addr_mods = sorted(mmods.keys())
+        self.addr_ends = [mmods[x] for x in self.addr_mods]
+        self.addr_reach = list(itertools.accumulate((x[0] for x in self.addr_ends), max))
+
+    def index_name(self):
+        ''' build name index of reg.name and bit.name
+        each name maps to all its places, ordered as get_modreg(str) searches:
+            by module, the regs of a module before the bits of the module
+        :return: None
+        '''
+        self.name_idx = {}
+        for kmod in self.mods.values():
+            for kreg in kmod.regs.values():
+                self.name_idx.setdefault(kreg.name, []).append((kmod.name, kreg.name, None))
+            for kreg in kmod.regs.values():
+                for kbit in kreg.bits.keys():
+                    self.name_idx.setdefault(kbit, []).append((kmod.name, kreg.name, kbit))
+
+    def find_name(self, vname):
+        ''' search all reg.name or bit.name equals vname
+        :param vname: string name
+        :return: list of (mod_name, reg_name, bit_name), bit_name is None for reg
+        '''
+        self.wait()
+        return self.name_idx.get(vname, [])
+
+    def find_reg(self, vaddr):
+        ''' search reg.addr equals vaddr
+        :param vaddr: integer addr
+        :return: (mod_name, reg_name) or None
+        '''
+        k = bisect.bisect_left(self.addr_regs, vaddr)
+        if (k < len(self.addr_regs)) and (self.addr_regs[k] == vaddr):
+            return self.addr_refs[k]
+        return None
+
+    def find_mod(self, vaddr):
+        ''' search the module whose [addr, addr + size) contains vaddr
+        :param vaddr: integer addr
+        :return: mod_name or None
+        '''
+        k = bisect.bisect_right(self.addr_mods, vaddr) - 1
+        # overlapped modules: step back while an earlier module can reach vaddr
+        while (k >= 0) and (vaddr < self.addr_reach[k]):
+            if vaddr < self.addr_ends[k][0]:
+                return self.addr_ends[k][1]
+            k -= 1
+        return None
+
+    def find_near(self, vaddr):
+        ''' search the reg nearest to vaddr, the lower one when tie
+        :param vaddr: integer addr
+        :return: (mod_name, reg_name) or None
+        '''
+        k = bisect.bisect_left(self.addr_regs, vaddr)
+        if k == len(self.addr_regs):
+            k -= 1
+        elif (k > 0) and (vaddr - self.addr_regs[k-1] <= self.addr_regs[k] - vaddr):
+            k -= 1
+        return self.addr_refs[k] if k >= 0 else None
+
     def get_modreg(self, vstr):
         ''' search reg.name or bit.name equals vstr
         :param vstr:
             type(str): reg.name or bit.name
             type(int): reg.addr
         :return: (mod_name, reg_name)
+            type(int) in a module but not at a reg: (mod_name, None)
         '''
         if type(vstr) is str:
-            for kmod in self.mods.values():
-                if vstr in kmod.regs.keys():
-                    return (kmod.name, vstr)
-                for kreg in kmod.regs.values():
-                    if vstr in kreg.bits.keys():
-                        return (kmod.name, kreg.name)
+            mlst = self.find_name(vstr)
+            if mlst:
+                return mlst[0][0:2]
+        elif (type(vstr) is int) and (self.prefetch is not None):
+            # lazy load: module by the root addr table, parse it if not yet
+            with self.lock:
+                mmods = self.mods
+                mname = self.find_mod(vstr) if isinstance(mmods, gXmlMods) else None
+            if mname is None:
+                self.wait()
+                return self.get_modreg(vstr)
+            mmod = mmods.get(mname)
+            mreg = mmod.regs_byaddr.get(vstr) if mmod is not None else None
+            if (mreg is None) and ((mmod is None) or (vstr >= mmod.addr + mmod.size)):
+                self.wait()     # past the module end: need the whole index
+                return self.get_modreg(vstr)
+            return (mname, mreg.name if mreg is not None else None)
         elif type(vstr) is int:
-            for kmod in self.mods.values():
-                for kreg in kmod.regs.values():
-                    if vstr == kreg.addr:
-                        return (kmod.name, kreg.name)
+            mref = self.find_reg(vstr)
+            if mref is not None:
+                return mref
+            return (self.find_mod(vstr), None)
         return (None, None)
 
 
+class gXmlWatch:
+    ''' poll the files of a loaded gXmlParser in a background thread, call
+        vcall(list of changed file path) when the changed files stay the same
+        for one period, so a file still being written is not reloaded
+    vcall runs in the watch thread; a UI passes one that queues the reload to
+    its own thread, the default is gXmlParser.reload
+    '''
+    def __init__(self, vxml, vcall=None, vperiod=1.0):
+        self.xml    = vxml
+        self.call   = vcall if vcall is not None else (lambda x: vxml.reload())
+        self.period = vperiod   # seconds between polls
+        self.nfire  = 0         # calls done
+        self.evt    = threading.Event()
+        self.thd    = None
+
+    def start(self):
+        if self.thd is None:
+            self.evt.clear()
+            self.thd = threading.Thread(target=self.run, name='gXmlWatch', daemon=True)
+            self.thd.start()
+        return self
+
+    def stop(self):
+        self.evt.set()
+        if self.thd is not None:
+            self.thd.join()
+        self.thd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def poll(self):
+        # changed files: {file path: (mtime_ns, size) or None when removed}
+        mstat = {}
+        for kfile in self.xml.changed():
+            try:
+                mst = os.stat(kfile)
+                mstat[kfile] = (mst.st_mtime_ns, mst.st_size)
+            except OSError:
+                mstat[kfile] = None
+        return mstat
+
+    def run(self):
+        # watch thread: fire once per set of stable changes
+        (mlast, mdone) = ({}, {})
+        while not self.evt.wait(self.period):
+            try:
+                mstat = self.poll()
+                if mstat and (mstat == mlast) and (mstat != mdone):
+                    logger.info('gXmlWatch: changed {}'.format(list(mstat.keys())))
+                    mdone = mstat
+                    self.nfire += 1
+                    self.call(list(mstat.keys()))
+                elif not mstat:
+                    mdone = {}
+                mlast = mstat
+            except Exception as err:
+                logger.warning('Exception in gxml.watch: {}'.format(repr(err), exc_info=True))
+
+
 # print('root-tag:', root.tag, ', root-attrib: ', root.attrib, ', root-text: ', root.text)
 # for child in root:
 #     print('child-tag:', child.tag, ', child-attrib: ', child.attrib, ', child-text: ', child.text)
@@ -5,16 +5,23 @@ import glib
 from PyQt5 import QtWidgets, QtGui
 from PyQt5.QtGui import QRegExpValidator
 from PyQt5.QtWidgets import QAbstractItemView, QHeaderView, QFileDialog
-from PyQt5.QtCore import Qt, QStringListModel, QRegExp
+from PyQt5.QtCore import Qt, QStringListModel, QRegExp, pyqtSignal
 
 import gcom
 import gxml
+import gsession
+import gshadow
+import gtrans
 import logging
 
 logger = logging.getLogger(__name__)    # logger for inner thread message
 
 
 class gXmlTable(QtWidgets.QWidget):
+    sig_io = pyqtSignal(str, int, object)   # (kind, addr, Future) from gSession worker
+    sig_xml = pyqtSignal(object)            # changed xml files from gXmlWatch thread
+    sig_ready = pyqtSignal()                # lazy load done, from gXmlParser prefetch thread
+
     def __init__(self):
         super().__init__()
         self.file_open = QtWidgets.QPushButton('Xml')
@@ -23,12 +30,15 @@ class gXmlTable(QtWidgets.QWidget):
         self.uart_list = QtWidgets.QComboBox()
         self.uart_list.setPlaceholderText('COM')
         self.uart_baud = QtWidgets.QLineEdit('921600')
+        self.xml_watch = QtWidgets.QPushButton('Watch')
+        self.xml_watch.setCheckable(True)  # opt-in: reload module xml changed on disk
         self.file_disp = QtWidgets.QLineEdit('')
         self.file_disp.setReadOnly(True)
         self.qtw_mods = QtWidgets.QTableWidget()
         self.qtw_regs = QtWidgets.QTableWidget()
         self.uart_lay = QtWidgets.QHBoxLayout()
         self.uart_lay.addWidget(self.file_open, 1)
+        self.uart_lay.addWidget(self.xml_watch, 1)
         self.uart_lay.addWidget(self.uart_dtct, 1)
         self.uart_lay.addWidget(self.uart_list, 1)
         self.uart_lay.addWidget(self.uart_baud, 1)
@@ -88,11 +98,18 @@ class gXmlTable(QtWidgets.QWidget):
         self.slm = QStringListModel()
         self.flt_lsv.setModel(self.slm)
         self.lst_flt = []   # list of filtered (name, addr)
+        self.flt_num = 200  # show at most flt_num filtered items
 
         self.mxml = gxml.gXmlParser()
+        self.mxml.lazy = True   # list modules at once, parse each on click + prefetch
+        self.mxml.notify = self.sig_ready.emit  # filter queries wait for it
         self.omod = None    # object select gXmlMod
         self.oreg = None    # object select gXmlReg
+        self.fwatch = gxml.gXmlWatch(self.mxml, self.sig_xml.emit)     # by xml_watch: reload module xml changed on disk
         self.mcom = gcom.gCom()
+        self.shadow = gshadow.gShadow(self.mcom, self.mxml)     # last read/written value of each addr
+        self.sess = gsession.gSession(self.shadow).start()     # all mcom access in its worker thread
+        self.trans = gtrans.gTrans(self.shadow, self.mxml)      # field edits not written yet
         self.conn = False   # com connected status
         self.top_xml = 'gxml.ini'
 
@@ -108,6 +125,7 @@ class gXmlTable(QtWidgets.QWidget):
 
     def init_action(self):
         self.file_open.clicked.connect(self.slot_file_open)
+        self.xml_watch.toggled.connect(self.slot_xml_watch)
         self.uart_dtct.clicked.connect(self.slot_uart_detect)
         self.uart_conn.clicked.connect(self.slot_uart_connect)
         self.qtw_mods.cellClicked.connect(self.slot_click_mod)
@@ -119,6 +137,9 @@ class gXmlTable(QtWidgets.QWidget):
         self.reg_write.clicked.connect(self.slot_data_retn)
         self.reg_addr.returnPressed.connect(self.slot_addr_retn)
         self.reg_data.returnPressed.connect(self.slot_data_retn)
+        self.sig_io.connect(self.slot_io_done)
+        self.sig_xml.connect(self.slot_xml_changed)
+        self.sig_ready.connect(self.slot_xml_ready)
 
     def slot_click_mod(self, rmod, cmod):
         # when clicked <QTableWidget>-mods, select a module
@@ -127,9 +148,12 @@ class gXmlTable(QtWidgets.QWidget):
         self.qtw_mods.setCurrentCell(rmod, cmod)
         mod_name = self.qtw_mods.item(rmod, 1).text()
         if (self.omod is None) or (mod_name != self.omod.name):
-            self.omod = self.mxml.mods[mod_name]
+            self.omod = self.mxml.get_mod(mod_name)
             self.set_qtw_regs()
-            self.slot_click_reg(0, 1)
+            if self.qtw_regs.rowCount():
+                self.slot_click_reg(0, 1)
+            else:
+                self.qtw_bits.setRowCount(0)    # a module without reg
 
     def slot_click_reg(self, rreg, creg):
         # when clicked <QTableWidget>-regs, select a reg
@@ -149,15 +173,23 @@ class gXmlTable(QtWidgets.QWidget):
         bit_name = self.qtw_bits.item(rbit, 2).text()
         mval = glib.str2int(bit_data, 16)
         bit_dict = {bit_name: {'val': mval}}
-        self.oreg.set(bit_dict)
+        self.trans.set(self.oreg, bit_dict)     # written by the next [write]
         self.set_qtw_bits()
 
     def slot_edit_flt(self, vtxt=r'.*'):
         # when input filter text
         # do: update <QListView> filter out
         logger.info('slot_edit_flt: {}'.format(vtxt))
-        if vtxt:
-            self.lst_flt = self.mxml.filter(vtxt)
+        if vtxt and (self.mxml.prefetch is not None):
+            # names are not indexed yet: slot_xml_ready runs the query again
+            self.lst_flt = []
+            mlst = ['loading...']
+        elif vtxt:
+            # plain text: ranked fuzzy match, else: regex filter
+            if self.mxml.finder.is_plain(vtxt):
+                self.lst_flt = self.mxml.fuzzy(vtxt, self.flt_num)
+            else:
+                self.lst_flt = self.mxml.filter(vtxt, self.flt_num)
             mlst = [x[0] for x in self.lst_flt]
         else:
             mlst = []
@@ -166,6 +198,8 @@ class gXmlTable(QtWidgets.QWidget):
     def slot_click_flt(self, idx):
         # when clicked a filter item
         # do: update <QTableWidget>-regs & <QTableWidget>-bits
+        if idx.row() >= len(self.lst_flt):
+            return      # 'loading...'
         item = self.lst_flt[idx.row()]
         logger.info('slot_click_flt: ({}, 0x{:08x})'.format(item[0], item[1]))
         self.update_reg(item[1])
@@ -192,12 +226,22 @@ class gXmlTable(QtWidgets.QWidget):
     def slot_uart_connect(self):
         logger.info('slot_uart_connect')
         if self.conn:
-            self.set_uart_conn(self.mcom.close())
+            self.com_close()
         else:
             com_name = self.uart_list.currentText()
             com_baud = int(self.uart_baud.text())
-            self.mcom.set(com_name, com_baud, 1)
-            self.set_uart_conn(self.mcom.open())
+            self.sess.submit(self.mcom.set, com_name, com_baud, 1, vpri=gsession.PRI_UI)
+            self.sess.submit(self.shadow.invalidate, vpri=gsession.PRI_UI)
+            # result goes to slot_io_done in GUI thread
+            mfut = self.sess.submit(self.mcom.open, vpri=gsession.PRI_UI)
+            mfut.add_done_callback(lambda x: self.sig_io.emit('open', 0, x))
+
+    def com_close(self):
+        # close mcom in the session worker, result goes to slot_io_done
+        # disconnected at once: io results still queued are dropped
+        self.set_uart_conn(False)
+        mfut = self.sess.submit(self.mcom.close, vpri=gsession.PRI_UI)
+        mfut.add_done_callback(lambda x: self.sig_io.emit('close', 0, x))
 
     def set_uart_conn(self, ok):
         if ok:
@@ -211,24 +255,18 @@ class gXmlTable(QtWidgets.QWidget):
 
     def slot_addr_retn(self):
         # when reg_addr edit done: Return or Lose Focus
-        # do: [read] and update <QLineEdit>-reg and <QTableWidget>-bits
+        # do: [read] in session worker, slot_io_done update <QLineEdit>-reg and <QTableWidget>-bits
         reg_addr = self.reg_addr.text()
         logger.info('slot_addr_retn: addr = {}'.format(reg_addr))
         reg_addr = glib.str2int(reg_addr, 16)
-        read_val = self.read(reg_addr)
-        if read_val is not None:
-            # update <QLineEdit>-reg @even if [reg_addr not in mxml]
-            self.reg_addr.setText(format(reg_addr, '08x'))
-            self.reg_data.setText(format(read_val, '08x'))
-            # update self.oreg & <QTableWidget>-bits
-            self.update_reg(reg_addr, read_val)
+        if not self.conn:
+            self.update_reg(reg_addr, None)
         else:
-            self.set_uart_conn(self.mcom.close())
-            self.update_reg(reg_addr, read_val)
+            self.read_async(reg_addr, True)
 
     def slot_data_retn(self):
         # when reg_addr edit done: Return or Lose Focus
-        # do: [write] [read] and update <QLineEdit>-reg and <QTableWidget>-bits
+        # do: [write] [read] in session worker and update <QLineEdit>-reg and <QTableWidget>-bits
         reg_addr = self.reg_addr.text()
         reg_data = self.reg_data.text()
         logger.info('slot_data_retn: addr = {}, data = {}'.format(reg_addr, reg_data))
@@ -239,10 +277,65 @@ class gXmlTable(QtWidgets.QWidget):
         # do write & read & check
         if not self.conn:
             self.update_reg(reg_addr, reg_data)
-        elif self.write(reg_addr, reg_data):
-            self.slot_addr_retn()
+        elif len(self.trans) and (self.mxml.get_modreg(reg_addr)[1] is not None):
+            # edited fields of all regs and this one: one write per changed reg
+            (mod_name, reg_name) = self.mxml.get_modreg(reg_addr)
+            self.trans.set(self.mxml.mods[mod_name].regs[reg_name], reg_data)
+            self.commit_async(reg_addr)
+        else:
+            self.write_async(reg_addr, reg_data)
+
+    def read_async(self, vaddr, vfresh=False):
+        # submit [read], result goes to slot_io_done in GUI thread
+        # vfresh: read the device, else the shadow value is used if any
+        if vfresh:
+            mfut = self.sess.submit(self.shadow.read, vaddr, True, vpri=gsession.PRI_UI)
+        else:
+            mfut = self.sess.read(vaddr, gsession.PRI_UI)
+        mfut.add_done_callback(lambda x: self.sig_io.emit('read', vaddr, x))
+
+    def write_async(self, vaddr, vdata):
+        # submit [write], result goes to slot_io_done in GUI thread
+        if vaddr != self.oreg.addr:
+            logger.warning('self.oreg.addr({:08x}) != vaddr({:08x})'.format(self.oreg.addr, vaddr))
+        logger.info('write: {:08x} = {:08x}'.format(vaddr, vdata))
+        mfut = self.sess.write(vaddr, vdata, gsession.PRI_UI)
+        mfut.add_done_callback(lambda x: self.sig_io.emit('write', vaddr, x))
+
+    def commit_async(self, vaddr):
+        # submit [commit] of self.trans, then [read] vaddr in slot_io_done
+        logger.info('commit: {} regs'.format(len(self.trans)))
+        mfut = self.sess.submit(self.trans.commit, vpri=gsession.PRI_UI)
+        mfut.add_done_callback(lambda x: self.sig_io.emit('commit', vaddr, x))
+
+    def slot_io_done(self, kind, vaddr, vfut):
+        # [open]/[close]/[read]/[write]/[commit] done in session worker
+        if vfut.cancelled():
+            return
+        mres = None if vfut.exception() else vfut.result()
+        if kind in ('open', 'close'):
+            self.set_uart_conn(bool(mres))     # mcom.open: ok, mcom.close: ser.is_open
+            return
+        if not self.conn:
+            return
+        if kind == 'commit':
+            (kind, mres) = ('write', mres == [])   # no failed reg
+        if kind == 'write':
+            if mres:
+                self.read_async(vaddr)
+            else:
+                self.com_close()
+        elif mres is not None:
+            logger.info('read: {:08x} = {:08x}'.format(vaddr, mres))
+            # update <QLineEdit>-reg @even if [reg_addr not in mxml]
+            self.reg_addr.setText(format(vaddr, '08x'))
+            self.reg_data.setText(format(mres, '08x'))
+            # update self.oreg & <QTableWidget>-bits
+            self.update_reg(vaddr, mres)
         else:
-            self.set_uart_conn(self.mcom.close())
+            logger.warning('read: {:08x} failed'.format(vaddr))
+            self.com_close()
+            self.update_reg(vaddr, None)
 
     def update_reg(self, vsel=None, vval=None):
         # search reg with @vsel, and set reg with @vval
@@ -262,30 +355,6 @@ class gXmlTable(QtWidgets.QWidget):
                     self.oreg.set(vval)
                 self.set_qtw_bits()
 
-    def read(self, vaddr=0):
-        # read dut addr
-        # return read data or None
-        #reg_data = random.randint(0, 2**32-1)
-        if not self.conn:
-            return None
-        reg_data = self.mcom.read(vaddr)
-        if reg_data is not None:
-            logger.info('read: {:08x} = {:08x}'.format(vaddr, reg_data))
-        else:
-            logger.warning('read: {:08x} failed'.format(vaddr))
-        return reg_data
-
-    def write(self, vaddr=0, vdata=0):
-        # write dut addr = data
-        # return True or False
-        if not self.conn:
-            return False
-        if vaddr != self.oreg.addr:
-            logger.warning('self.oreg.addr({:08x}) != vaddr({:08x})'.format(self.oreg.addr, vaddr))
-            logger.warning('\tyou neet update self.oreg outside')
-        logger.info('write: {:08x} = {:08x}'.format(vaddr, vdata))
-        return self.mcom.write(vaddr, vdata)
-
     def init_xml(self, vfilepath):
         # when get a valid top xml file path, init the whole content
         self.file_disp.setText(vfilepath)
@@ -296,6 +365,43 @@ class gXmlTable(QtWidgets.QWidget):
         self.flt_txt.clear()
         self.slm.setStringList([])
 
+    def slot_xml_watch(self, checked):
+        # when toggled self.xml_watch: start / stop polling the xml files
+        logger.info('slot_xml_watch: {}'.format(checked))
+        if checked:
+            self.fwatch.start()
+        else:
+            self.fwatch.stop()
+
+    def closeEvent(self, event):
+        # stop the watch thread before the parser it polls goes away
+        self.fwatch.stop()
+        super().closeEvent(event)
+
+    def slot_xml_ready(self):
+        # lazy load done: run the filter query queued while loading
+        logger.info('slot_xml_ready')
+        if self.flt_txt.text():
+            self.slot_edit_flt(self.flt_txt.text())
+
+    def slot_xml_changed(self, vfiles):
+        # xml files changed on disk: reparse them only, keep the selected
+        # module / reg and the filter text
+        logger.info('slot_xml_changed: {}'.format(vfiles))
+        mnames = self.mxml.reload()
+        if mnames == []:
+            return
+        mmod = self.omod.name if self.omod is not None else None
+        mreg = self.oreg.name if self.oreg is not None else None
+        (self.omod, self.oreg) = (None, None)
+        self.set_qtw_mods()
+        if mmod in self.mxml.mods:
+            mrow = [x[0] for x in self.mxml.get_lst()].index(mmod)
+            self.slot_click_mod(mrow, 1)
+            if mreg in self.omod.regs:
+                self.slot_click_reg([x[0] for x in self.omod.get_lst()].index(mreg), 1)
+        self.slot_edit_flt(self.flt_txt.text())
+
     def init_qtw(self):
         self.set_qtw_mods()
         for mobj in (self.qtw_mods, self.qtw_regs, self.qtw_bits):
@@ -1,8 +1,18 @@
 import sys
 import os
+import multiprocessing
 from PyQt5 import QtWidgets, QtGui
 
 import gcom
+import gsearch
+import gsession
+import gsnap
+import gshadow
+import gtrans
+import gwatch
+import glink
+import gboard
+import gbin
 import gxml
 import gxml_ui
 import logging
@@ -14,6 +24,7 @@ logger = logging.getLogger(__name__)    # logger for inner thread message
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()    # gXmlParser.jobs process pool in pyinstaller exe
     try:
         # glogging.log2stdout(logger, logging.WARNING)
         # glogging.log2stdout(logger, logging.INFO)
@@ -22,6 +33,15 @@ if __name__ == '__main__':
         gxml.logger    = logger
         gxml_ui.logger = logger
         gcom.logger    = logger
+        gsearch.logger  = logger
+        gsession.logger = logger
+        gsnap.logger    = logger
+        gshadow.logger  = logger
+        gtrans.logger   = logger
+        gwatch.logger   = logger
+        glink.logger    = logger
+        gboard.logger   = logger
+        gbin.logger     = logger
 
         app = QtWidgets.QApplication(sys.argv)
         font = QtGui.QFont()